@@ -0,0 +1,287 @@
+"""
+Benchmark of the collection profiles.
+This script loads the same random vectors into one collection per profile and reports
+the RAM it takes, the recall against exact search and the search latency of each.
+
+The RAM is measured as the growth of the memory the server reports on its /metrics
+endpoint while the collection is loaded and searched, next to the estimate of the
+profile. Run it against an otherwise idle Qdrant server, since the local mode
+ignores quantization and HNSW:
+
+    python -m fastapi_backend.benchmarks.collection_profiles --url http://localhost:6333
+"""
+
+import argparse
+import asyncio
+import time
+import uuid
+from typing import Optional
+
+import httpx
+import numpy as np
+from qdrant_client import AsyncQdrantClient
+from qdrant_client.models import (
+    CollectionStatus,
+    Distance,
+    PointStruct,
+    SearchParams,
+    VectorParams,
+)
+
+from fastapi_backend.src.db.profiles import PROFILES, CollectionProfile
+
+VECTOR_NAME = "benchmark"
+
+# Memory gauges of the Qdrant /metrics endpoint: the bytes allocated by the server,
+# and its resident set, which includes the pages of memory-mapped files it touched
+MEMORY_METRICS = ("memory_allocated_bytes", "memory_resident_bytes")
+
+
+def make_vectors(
+    points: int, dimensions: int, clusters: int, seed: int
+) -> tuple[np.ndarray, np.ndarray]:
+    """Generate clustered unit vectors, which resemble text embeddings better than
+    uniform noise.
+
+    Args:
+        points (int): The number of stored vectors.
+        dimensions (int): The number of dimensions.
+        clusters (int): The number of clusters.
+        seed (int): The random seed.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: The stored vectors and 100 query vectors.
+    """
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dimensions))
+
+    def sample(count: int) -> np.ndarray:
+        vectors = centers[rng.integers(clusters, size=count)] + rng.normal(
+            scale=0.5, size=(count, dimensions)
+        )
+        return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(
+            np.float32
+        )
+
+    return sample(points), sample(100)
+
+
+async def load(
+    client: AsyncQdrantClient,
+    collection_name: str,
+    profile: CollectionProfile,
+    vectors: np.ndarray,
+    batch_size: int = 1000,
+):
+    """Create a collection with a profile, upload the vectors and wait for indexing.
+
+    Args:
+        client (AsyncQdrantClient): The Qdrant client.
+        collection_name (str): The name of the collection.
+        profile (CollectionProfile): The profile of the collection.
+        vectors (np.ndarray): The vectors to upload.
+        batch_size (int): The number of points per upsert. Defaults to 1000.
+    """
+    await client.create_collection(
+        collection_name=collection_name,
+        vectors_config=profile.vectors_config(
+            {VECTOR_NAME: VectorParams(size=vectors.shape[1], distance=Distance.COSINE)}
+        ),
+        on_disk_payload=profile.on_disk_payload,
+        hnsw_config=profile.hnsw_config(),
+        quantization_config=profile.quantization_config(),
+    )
+    for start in range(0, len(vectors), batch_size):
+        await client.upsert(
+            collection_name=collection_name,
+            points=[
+                PointStruct(id=index, vector={VECTOR_NAME: vector.tolist()})
+                for index, vector in enumerate(
+                    vectors[start : start + batch_size], start=start
+                )
+            ],
+        )
+    while (
+        await client.get_collection(collection_name)
+    ).status != CollectionStatus.GREEN:
+        await asyncio.sleep(0.5)
+
+
+async def read_memory(http: httpx.AsyncClient) -> Optional[dict[str, float]]:
+    """Read the memory gauges of the Qdrant server.
+
+    Args:
+        http (httpx.AsyncClient): A client with the URL of the server as base URL.
+
+    Returns:
+        Optional[dict[str, float]]: The value of each of MEMORY_METRICS, or None if
+            the server does not report them.
+    """
+    try:
+        response = await http.get("/metrics")
+        response.raise_for_status()
+    except httpx.HTTPError:
+        return None
+    memory = {}
+    for line in response.text.splitlines():
+        name, _, value = line.partition(" ")
+        if name in MEMORY_METRICS:
+            memory[name] = float(value)
+    return memory if len(memory) == len(MEMORY_METRICS) else None
+
+
+def memory_growth_mb(
+    before: Optional[dict[str, float]], after: Optional[dict[str, float]], name: str
+) -> Optional[float]:
+    """Get the growth of a memory gauge in MiB.
+
+    Args:
+        before (dict[str, float], optional): The gauges before the collection loaded.
+        after (dict[str, float], optional): The gauges once it was searched.
+        name (str): The gauge.
+
+    Returns:
+        Optional[float]: The growth, or None if it was not measured.
+    """
+    if before is None or after is None:
+        return None
+    return (after[name] - before[name]) / 2**20
+
+
+async def search(
+    client: AsyncQdrantClient,
+    collection_name: str,
+    queries: np.ndarray,
+    limit: int,
+    params: Optional[SearchParams] = None,
+) -> tuple[list[set[int]], list[float]]:
+    """Run every query and time it.
+
+    Args:
+        client (AsyncQdrantClient): The Qdrant client.
+        collection_name (str): The name of the collection.
+        queries (np.ndarray): The query vectors.
+        limit (int): The number of results per query.
+        params (SearchParams, optional): The search params. Defaults to None.
+
+    Returns:
+        tuple[list[set[int]], list[float]]: The IDs found and the latency in seconds
+            of each query.
+    """
+    found, latencies = [], []
+    for query in queries:
+        started = time.perf_counter()
+        response = await client.query_points(
+            collection_name=collection_name,
+            query=query.tolist(),
+            using=VECTOR_NAME,
+            limit=limit,
+            search_params=params,
+        )
+        latencies.append(time.perf_counter() - started)
+        found.append({point.id for point in response.points})
+    return found, latencies
+
+
+async def benchmark(args: argparse.Namespace) -> list[dict]:
+    """Benchmark each selected profile on the same data.
+
+    Args:
+        args (argparse.Namespace): The command line arguments.
+
+    Returns:
+        list[dict]: One report per profile.
+    """
+    client = AsyncQdrantClient(location=args.url)
+    http = httpx.AsyncClient(base_url=args.url, timeout=10.0)
+    vectors, queries = make_vectors(
+        args.points, args.dimensions, args.clusters, args.seed
+    )
+    reports = []
+    try:
+        for name in args.profiles:
+            profile = PROFILES[name]
+            collection_name = f"profile_benchmark_{name}_{uuid.uuid4().hex[:8]}"
+            memory_before = await read_memory(http)
+            started = time.perf_counter()
+            await load(client, collection_name, profile, vectors)
+            load_seconds = time.perf_counter() - started
+            try:
+                exact, _ = await search(
+                    client,
+                    collection_name,
+                    queries,
+                    args.limit,
+                    SearchParams(exact=True),
+                )
+                # Warm up the caches before timing
+                await search(client, collection_name, queries[:10], args.limit)
+                found, latencies = await search(
+                    client,
+                    collection_name,
+                    queries,
+                    args.limit,
+                    profile.search_params(),
+                )
+                # Measured once searched, so the vectors a search reads from disk
+                # are resident
+                memory_after = await read_memory(http)
+            finally:
+                await client.delete_collection(collection_name)
+
+            recall = np.mean([len(a & b) / len(b) for a, b in zip(found, exact) if b])
+            reports.append(
+                {
+                    "profile": name,
+                    "estimated_ram_mb": profile.estimated_ram_bytes(
+                        args.points, args.dimensions
+                    )
+                    / 2**20,
+                    "allocated_mb": memory_growth_mb(
+                        memory_before, memory_after, "memory_allocated_bytes"
+                    ),
+                    "resident_mb": memory_growth_mb(
+                        memory_before, memory_after, "memory_resident_bytes"
+                    ),
+                    f"recall@{args.limit}": float(recall),
+                    "p50_ms": float(np.percentile(latencies, 50)) * 1000,
+                    "p95_ms": float(np.percentile(latencies, 95)) * 1000,
+                    "load_seconds": load_seconds,
+                }
+            )
+    finally:
+        await client.close()
+        await http.aclose()
+    return reports
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--url", default="http://localhost:6333")
+    parser.add_argument("--points", type=int, default=20000)
+    parser.add_argument("--dimensions", type=int, default=384)
+    parser.add_argument("--clusters", type=int, default=50)
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--profiles", nargs="+", choices=list(PROFILES), default=list(PROFILES)
+    )
+    reports = asyncio.run(benchmark(parser.parse_args()))
+    if any(report["allocated_mb"] is None for report in reports):
+        print("The server does not report its memory, only the estimate is shown")
+
+    columns = list(reports[0])
+    print(" | ".join(f"{column:>16}" for column in columns))
+    for report in reports:
+        print(
+            " | ".join(
+                f"{value:>16.3f}"
+                if isinstance(value, float)
+                else f"{'-' if value is None else value:>16}"
+                for value in report.values()
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
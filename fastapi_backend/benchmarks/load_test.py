@@ -0,0 +1,507 @@
+"""
+Load test of the backend with local stand-ins.
+This script runs the backend with an in-memory Qdrant, a hash embedder, a fake chat
+model and a fake Firecrawl API, drives the chat, search and crawl endpoints at a fixed
+concurrency, and reports the latency percentiles, time to first token, throughput and
+RSS growth of each scenario.
+
+    python -m fastapi_backend.benchmarks.load_test --scenarios chat search crawl \\
+        --concurrency 16 --requests 200 --json after.json --baseline before.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import resource
+import socket
+import time
+import uuid
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Optional
+
+import httpx
+import numpy as np
+import uvicorn
+import websockets
+
+COLLECTION_NAME = "benchmark"
+
+
+@dataclass
+class Sample:
+    """The outcome of a single request."""
+
+    seconds: float
+    first_event_seconds: Optional[float] = None
+    ok: bool = True
+    items: int = 1
+
+
+def rss_bytes() -> int:
+    """Get the resident set size of this process.
+
+    Returns:
+        int: The current RSS, or the peak RSS where /proc is not available.
+    """
+    try:
+        with open("/proc/self/statm") as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@asynccontextmanager
+async def serve(app):
+    """Serve an app on a free local port for the duration of the context.
+
+    Args:
+        app: The ASGI app.
+
+    Yields:
+        str: The base URL of the server.
+    """
+    port = free_port()
+    server = uvicorn.Server(
+        uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning")
+    )
+    task = asyncio.create_task(server.serve())
+    while not server.started:
+        if task.done():
+            task.result()
+        await asyncio.sleep(0.01)
+    try:
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        server.should_exit = True
+        await task
+
+
+def create_backend(args: argparse.Namespace, firecrawl_url: str):
+    """Create the backend app with the production settings and the stand-ins.
+
+    Args:
+        args (argparse.Namespace): The command line arguments.
+        firecrawl_url (str): The URL of the fake Firecrawl API.
+
+    Returns:
+        FastAPI: The app.
+    """
+    from fastapi import FastAPI
+    from qdrant_client import AsyncQdrantClient
+
+    from fastapi_backend.benchmarks.stand_ins import FakeModelRegistry, HashEmbedder
+    from fastapi_backend.src.askthedocs_agent.agent import create_graph
+    from fastapi_backend.src.askthedocs_agent.utils.checkpointers import (
+        create_checkpointer,
+    )
+    from fastapi_backend.src.askthedocs_agent.utils.context import ContextBudget
+    from fastapi_backend.src.askthedocs_agent.utils.history import HistoryPolicy
+    from fastapi_backend.src.askthedocs_agent.utils.rerankers import create_reranker
+    from fastapi_backend.src.askthedocs_agent.utils.retrievers import (
+        FanOutRetriever,
+        LocalRetriever,
+    )
+    from fastapi_backend.src.config import get_settings
+    from fastapi_backend.src.db.embeddings import create_embedder
+    from fastapi_backend.src.db.ingestion import IngestionPipeline
+    from fastapi_backend.src.db.vector_store import VectorStore
+    from fastapi_backend.src.firecrawler.firecrawler import FirecrawlService
+    from fastapi_backend.src.firecrawler.jobs import CrawlJobManager
+    from fastapi_backend.src.routers.agent.router import router as agent_router
+    from fastapi_backend.src.routers.firecrawler.router import (
+        router as firecrawl_router,
+    )
+    from fastapi_backend.src.routers.metrics.router import router as metrics_router
+    from fastapi_backend.src.routers.vector_store.router import (
+        router as vector_store_router,
+    )
+
+    settings = get_settings()
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        embedder = (
+            create_embedder("fastembed", model_name=settings.embedding_model)
+            if args.embedder == "fastembed"
+            else HashEmbedder(batch_latency=args.embedding_latency)
+        )
+        app.state.vector_store = VectorStore(
+            AsyncQdrantClient(location=":memory:"),
+            embedder=embedder,
+            hybrid=args.hybrid,
+            profile=settings.collection_profile,
+        )
+        app.state.ingestion_pipeline = IngestionPipeline(
+            app.state.vector_store,
+            chunk_size=settings.ingest_chunk_size,
+            chunk_overlap=settings.ingest_chunk_overlap,
+            batch_size=settings.ingest_batch_size,
+            flush_interval=settings.ingest_flush_interval,
+            max_attempts=settings.ingest_max_attempts,
+            max_buffered_chunks=settings.ingest_max_buffered_chunks,
+        )
+        await app.state.ingestion_pipeline.start()
+        app.state.firecrawl_service = FirecrawlService(
+            firecrawl_url,
+            app.state.ingestion_pipeline,
+            queue_size=settings.crawl_queue_size,
+            workers=settings.crawl_ingest_workers,
+        )
+        await app.state.firecrawl_service.start()
+        app.state.crawl_jobs = CrawlJobManager(
+            app.state.firecrawl_service,
+            max_concurrent_crawls=settings.max_concurrent_crawls,
+        )
+        app.state.retriever = LocalRetriever(
+            app.state.vector_store,
+            limit=settings.retrieval_top_k,
+            score_threshold=settings.retrieval_score_threshold,
+            max_document_chars=settings.retrieval_max_document_chars,
+        )
+        # Without web search, which has no local stand-in
+        app.state.fanout_retriever = FanOutRetriever(
+            app.state.retriever,
+            timeout=settings.fanout_timeout,
+            enough_results=settings.fanout_enough_results or None,
+            min_score=settings.fanout_min_score,
+            source_top_k=settings.retrieval_top_k,
+        )
+        app.state.reranker = create_reranker(
+            args.reranker,
+            candidates=settings.reranker_candidates,
+            top_n=settings.retrieval_top_k,
+            high_confidence=settings.reranker_high_confidence,
+            low_confidence=settings.reranker_low_confidence,
+        )
+        app.state.context_budget = (
+            ContextBudget(
+                max_tokens=settings.context_max_tokens,
+                max_passage_tokens=settings.context_max_passage_tokens,
+                grader_max_tokens=settings.context_grader_max_tokens,
+            )
+            if settings.context_budget_enabled
+            else None
+        )
+        app.state.history_policy = (
+            HistoryPolicy(
+                max_tokens=settings.history_max_tokens,
+                window_turns=settings.history_window_turns,
+                summary_batch_turns=settings.history_summary_batch_turns,
+                summarize=settings.history_summarize,
+            )
+            if settings.history_policy_enabled
+            else None
+        )
+        app.state.models = FakeModelRegistry(
+            latency=args.llm_latency,
+            tokens_per_second=args.llm_tokens_per_second,
+            answer_tokens=args.answer_tokens,
+        )
+        app.state.answer_cache = None
+        app.state.checkpointer = create_checkpointer(
+            backend="memory",
+            max_threads=settings.checkpointer_max_threads,
+            max_checkpoints_per_thread=settings.checkpointer_max_checkpoints,
+            max_messages_per_thread=settings.checkpointer_max_messages,
+        )
+        app.state.graph = create_graph(checkpointer=app.state.checkpointer)
+
+        yield
+
+        await app.state.crawl_jobs.close()
+        await app.state.firecrawl_service.stop()
+        await app.state.checkpointer.aclose()
+        await app.state.ingestion_pipeline.stop()
+        await app.state.vector_store.close()
+
+    app = FastAPI(lifespan=lifespan)
+    app.include_router(vector_store_router)
+    app.include_router(firecrawl_router)
+    app.include_router(agent_router)
+    app.include_router(metrics_router)
+    return app
+
+
+async def seed(app, documents: int, words: int):
+    """Ingest generated documents into the benchmark collection.
+
+    Args:
+        app: The backend app.
+        documents (int): The number of documents.
+        words (int): The number of words per document.
+    """
+    from fastapi_backend.benchmarks.stand_ins import generate_text
+
+    pipeline = app.state.ingestion_pipeline
+    for index in range(documents):
+        await pipeline.add_document(
+            collection_name=COLLECTION_NAME,
+            document=f"# Document {index}\n\n" + generate_text(index, words),
+            metadata={"title": f"Document {index}"},
+            source=f"https://docs.example.com/document-{index}",
+        )
+    await pipeline.flush(COLLECTION_NAME)
+
+
+def question(index: int) -> str:
+    from fastapi_backend.benchmarks.stand_ins import generate_text
+
+    return f"How does {generate_text(index, 4)} work? ({index})"
+
+
+async def chat(client: httpx.AsyncClient, index: int) -> Sample:
+    """Ask a question on a new thread and stream the answer as typed events.
+
+    The first event is the first answer token.
+    """
+    started = time.perf_counter()
+    first_token = None
+    final = False
+    async with client.stream(
+        "POST",
+        f"/agent/chat/benchmark-{uuid.uuid4().hex}",
+        params={"stream_mode": "events"},
+        json={"message": question(index), "collection_name": COLLECTION_NAME},
+    ) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if not line.startswith("data: "):
+                continue
+            event = json.loads(line[len("data: ") :])
+            if event["event"] == "token" and first_token is None:
+                first_token = time.perf_counter() - started
+            elif event["event"] == "final":
+                final = True
+            elif event["event"] == "error":
+                return Sample(time.perf_counter() - started, first_token, ok=False)
+    return Sample(time.perf_counter() - started, first_token, ok=final)
+
+
+async def search(client: httpx.AsyncClient, index: int) -> Sample:
+    """Search the benchmark collection."""
+    started = time.perf_counter()
+    response = await client.post(
+        "/vector-store/search",
+        json={"collection_name": COLLECTION_NAME, "query": question(index), "limit": 5},
+    )
+    return Sample(time.perf_counter() - started, ok=response.status_code == 200)
+
+
+async def crawl(client: httpx.AsyncClient, index: int, pages: int) -> Sample:
+    """Submit a crawl of a new site and follow its events until it is done.
+
+    The first event is the first page received from Firecrawl.
+    """
+    started = time.perf_counter()
+    response = await client.post(
+        "/firecrawl/jobs",
+        json={"url": f"https://site-{index}.example.com", "limit": pages},
+    )
+    if response.status_code != 202:
+        return Sample(time.perf_counter() - started, ok=False)
+    job_id = response.json()["id"]
+    first_document = None
+    status = None
+    url = str(client.base_url).replace("http", "ws") + f"/firecrawl/ws/jobs/{job_id}"
+    async with websockets.connect(url) as websocket:
+        async for message in websocket:
+            if not message:
+                continue
+            event = json.loads(message)
+            if event["event"] == "document" and first_document is None:
+                first_document = time.perf_counter() - started
+            elif event["event"] == "done":
+                status = event["status"]
+                break
+    job = (await client.get(f"/firecrawl/jobs/{job_id}")).json()
+    return Sample(
+        time.perf_counter() - started,
+        first_document,
+        ok=status == "completed",
+        items=job["processed"],
+    )
+
+
+async def run_scenario(name: str, request, requests: int, concurrency: int) -> dict:
+    """Send requests from a fixed number of concurrent clients and summarize them.
+
+    Args:
+        name (str): The name of the scenario.
+        request: An async function sending request number i and returning a Sample.
+        requests (int): The total number of requests.
+        concurrency (int): The number of requests in flight.
+
+    Returns:
+        dict: The report of the scenario.
+    """
+    samples: list[Sample] = []
+    errors = 0
+    next_index = 0
+
+    async def client():
+        nonlocal next_index, errors
+        while next_index < requests:
+            index = next_index
+            next_index += 1
+            try:
+                samples.append(await request(index))
+            except Exception:
+                errors += 1
+
+    rss_start = peak = rss_bytes()
+    started = time.perf_counter()
+    clients = [asyncio.create_task(client()) for _ in range(concurrency)]
+    done = asyncio.gather(*clients)
+    while not done.done():
+        peak = max(peak, rss_bytes())
+        await asyncio.wait({done}, timeout=0.1)
+    seconds = time.perf_counter() - started
+    rss_end = rss_bytes()
+
+    latencies = [sample.seconds for sample in samples]
+    first_events = [
+        sample.first_event_seconds
+        for sample in samples
+        if sample.first_event_seconds is not None
+    ]
+
+    def percentile(values: list[float], q: int) -> float:
+        return float(np.percentile(values, q)) * 1000 if values else 0.0
+
+    return {
+        "scenario": name,
+        "requests": requests,
+        "concurrency": concurrency,
+        "errors": errors + sum(not sample.ok for sample in samples),
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "p99_ms": percentile(latencies, 99),
+        "first_event_p50_ms": percentile(first_events, 50),
+        "first_event_p95_ms": percentile(first_events, 95),
+        "requests_per_second": len(samples) / seconds,
+        "items_per_second": sum(sample.items for sample in samples) / seconds,
+        "rss_start_mb": rss_start / 2**20,
+        "rss_peak_mb": peak / 2**20,
+        "rss_growth_mb": (rss_end - rss_start) / 2**20,
+    }
+
+
+async def benchmark(args: argparse.Namespace) -> list[dict]:
+    """Start the stand-ins and the backend, then run each selected scenario.
+
+    Args:
+        args (argparse.Namespace): The command line arguments.
+
+    Returns:
+        list[dict]: One report per scenario.
+    """
+    from fastapi_backend.benchmarks.stand_ins import create_fake_firecrawl
+
+    firecrawl = create_fake_firecrawl(args.pages_per_second, args.page_words)
+    async with serve(firecrawl) as firecrawl_url:
+        app = create_backend(args, firecrawl_url)
+        async with serve(app) as backend_url:
+            await seed(app, args.documents, args.page_words)
+            limits = httpx.Limits(max_connections=args.concurrency * 2)
+            async with httpx.AsyncClient(
+                base_url=backend_url, limits=limits, timeout=args.timeout
+            ) as client:
+                scenarios = {
+                    "chat": lambda index: chat(client, index),
+                    "search": lambda index: search(client, index),
+                    "crawl": lambda index: crawl(client, index, args.pages),
+                }
+                reports = []
+                for name in args.scenarios:
+                    # Crawls are long, so they run fewer times
+                    requests = args.crawls if name == "crawl" else args.requests
+                    reports.append(
+                        await run_scenario(
+                            name, scenarios[name], requests, args.concurrency
+                        )
+                    )
+    return reports
+
+
+def compare(reports: list[dict], baseline: list[dict]) -> list[str]:
+    """Describe the change of each scenario against a baseline run.
+
+    Args:
+        reports (list[dict]): The reports of this run.
+        baseline (list[dict]): The reports of the baseline run.
+
+    Returns:
+        list[str]: One line per scenario found in both runs.
+    """
+    previous = {report["scenario"]: report for report in baseline}
+    lines = []
+    for report in reports:
+        before = previous.get(report["scenario"])
+        if before is None:
+            continue
+        changes = []
+        for key in ("p50_ms", "p95_ms", "first_event_p50_ms", "requests_per_second"):
+            if before[key]:
+                changes.append(f"{key} {(report[key] / before[key] - 1) * 100:+.1f}%")
+        lines.append(f"{report['scenario']:>8}: " + ", ".join(changes))
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--scenarios",
+        nargs="+",
+        choices=["chat", "search", "crawl"],
+        default=["chat", "search", "crawl"],
+    )
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--crawls", type=int, default=8)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--llm-latency", type=float, default=0.2)
+    parser.add_argument("--llm-tokens-per-second", type=float, default=50.0)
+    parser.add_argument("--answer-tokens", type=int, default=64)
+    parser.add_argument("--embedder", choices=["hash", "fastembed"], default="hash")
+    parser.add_argument("--embedding-latency", type=float, default=0.0)
+    parser.add_argument("--reranker", default="none")
+    parser.add_argument("--hybrid", action="store_true")
+    parser.add_argument("--documents", type=int, default=500)
+    parser.add_argument("--pages", type=int, default=50)
+    parser.add_argument("--pages-per-second", type=float, default=50.0)
+    parser.add_argument("--page-words", type=int, default=400)
+    parser.add_argument("--json", help="Write the reports to this file")
+    parser.add_argument("--baseline", help="Compare with the reports in this file")
+    args = parser.parse_args()
+
+    # The web search tool checks for its API key when the agent is imported
+    os.environ.setdefault("TAVILY_API_KEY", "benchmark")
+    reports = asyncio.run(benchmark(args))
+
+    columns = list(reports[0])
+    print(" | ".join(f"{column:>20}" for column in columns))
+    for report in reports:
+        print(
+            " | ".join(
+                f"{value:>20.3f}" if isinstance(value, float) else f"{value:>20}"
+                for value in report.values()
+            )
+        )
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(reports, file, indent=2)
+    if args.baseline:
+        with open(args.baseline) as file:
+            print("\n".join(compare(reports, json.load(file))))
+
+
+if __name__ == "__main__":
+    main()
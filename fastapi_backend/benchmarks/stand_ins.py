@@ -0,0 +1,342 @@
+"""
+Local stand-ins for the external services of the backend.
+This module contains a chat model with configurable latency and token rate, a model
+registry built from it, a hash-based embedder, and a fake Firecrawl API that streams
+generated pages over its crawl websocket, so the backend can be benchmarked offline.
+"""
+
+import asyncio
+import hashlib
+import json
+import re
+import time
+import uuid
+from typing import Any, Optional
+
+import numpy as np
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import (
+    AIMessage,
+    AIMessageChunk,
+    BaseMessage,
+    HumanMessage,
+    SystemMessage,
+    ToolMessage,
+)
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.runnables import RunnableLambda
+from langchain_core.utils.function_calling import convert_to_openai_tool
+from pydantic import Field
+
+from fastapi_backend.src.askthedocs_agent.utils.llms import Grade
+from fastapi_backend.src.askthedocs_agent.utils.prompts import (
+    GENERATE_PROMPT,
+    GRADE_PROMPT,
+    SUMMARY_PROMPT,
+)
+from fastapi_backend.src.askthedocs_agent.utils.tools import tools
+from fastapi_backend.src.db.embeddings import Embedder
+
+WORDS = (
+    "the collection stores each page as chunks with metadata so the agent can cite "
+    "its sources when it answers questions about the documentation of a project"
+).split()
+
+
+def generate_text(seed: int, words: int) -> str:
+    """Generate deterministic filler text.
+
+    Args:
+        seed (int): Selects the text.
+        words (int): The number of words.
+
+    Returns:
+        str: The text.
+    """
+    return " ".join(
+        WORDS[(seed * 7 + index * 13) % len(WORDS)] for index in range(words)
+    )
+
+
+class FakeChatModel(BaseChatModel):
+    """A chat model that answers after a fixed latency at a fixed token rate.
+
+    With tools bound, it calls the search_vector_store tool, or search_collections
+    for several collections, unless the last message is a tool result, like the
+    agent node does for documentation questions.
+    """
+
+    latency: float = 0.2
+    tokens_per_second: float = 50.0
+    answer_tokens: int = 64
+    structured_output: dict = Field(default_factory=lambda: {"binary_score": "yes"})
+
+    @property
+    def _llm_type(self) -> str:
+        return "benchmark-fake"
+
+    def bind_tools(self, tools, **kwargs):
+        return self.bind(tools=[convert_to_openai_tool(tool) for tool in tools])
+
+    def with_structured_output(self, schema, **kwargs):
+        async def respond(_):
+            await asyncio.sleep(self.latency)
+            return schema.model_validate(self.structured_output)
+
+        return RunnableLambda(respond)
+
+    def _tool_call(self, messages: list[BaseMessage], **kwargs) -> Optional[dict]:
+        if not kwargs.get("tools") or isinstance(messages[-1], ToolMessage):
+            return None
+        system = next(
+            (message for message in messages if isinstance(message, SystemMessage)),
+            None,
+        )
+        # The quoted names before "collection" in the system prompt of the router
+        collections = (
+            re.findall(r"'([^']+)'", system.content.split(" collection")[0])
+            if system
+            else []
+        ) or ["benchmark"]
+        question = next(
+            (m for m in reversed(messages) if isinstance(m, HumanMessage)), messages[-1]
+        )
+        if len(collections) > 1:
+            name = "search_collections"
+            args = {"collection_names": collections, "query": question.content}
+        else:
+            name = "search_vector_store"
+            args = {"collection_name": collections[0], "query": question.content}
+        return {"name": name, "args": args, "id": f"call_{uuid.uuid4().hex[:12]}"}
+
+    def _usage(self, messages: list[BaseMessage], output_tokens: int) -> dict:
+        input_tokens = sum(len(str(message.content).split()) for message in messages)
+        return {
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "total_tokens": input_tokens + output_tokens,
+        }
+
+    def _tokens(self, messages: list[BaseMessage]) -> list[str]:
+        seed = sum(len(message.content) for message in messages)
+        return [f" {word}" for word in generate_text(seed, self.answer_tokens).split()]
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        raise NotImplementedError("FakeChatModel only runs asynchronously")
+
+    async def _agenerate(
+        self,
+        messages: list[BaseMessage],
+        stop: Optional[list[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        await asyncio.sleep(self.latency)
+        tool_call = self._tool_call(messages, **kwargs)
+        if tool_call is not None:
+            message = AIMessage(
+                content="",
+                tool_calls=[tool_call],
+                usage_metadata=self._usage(messages, 1),
+            )
+        else:
+            tokens = self._tokens(messages)
+            await asyncio.sleep(len(tokens) / self.tokens_per_second)
+            message = AIMessage(
+                content="".join(tokens).strip(),
+                usage_metadata=self._usage(messages, len(tokens)),
+            )
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _astream(
+        self,
+        messages: list[BaseMessage],
+        stop: Optional[list[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ):
+        await asyncio.sleep(self.latency)
+        tool_call = self._tool_call(messages, **kwargs)
+        if tool_call is not None:
+            yield ChatGenerationChunk(
+                message=AIMessageChunk(
+                    content="",
+                    tool_call_chunks=[
+                        {
+                            "name": tool_call["name"],
+                            "args": json.dumps(tool_call["args"]),
+                            "id": tool_call["id"],
+                            "index": 0,
+                        }
+                    ],
+                    usage_metadata=self._usage(messages, 1),
+                )
+            )
+            return
+        tokens = self._tokens(messages)
+        for index, token in enumerate(tokens):
+            if index:
+                await asyncio.sleep(1 / self.tokens_per_second)
+            chunk = ChatGenerationChunk(
+                message=AIMessageChunk(
+                    content=token,
+                    # Reported on the last chunk, like OpenAI does
+                    usage_metadata=(
+                        self._usage(messages, len(tokens))
+                        if index == len(tokens) - 1
+                        else None
+                    ),
+                )
+            )
+            if run_manager is not None:
+                await run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+
+
+class FakeModelRegistry:
+    def __init__(
+        self,
+        latency: float = 0.2,
+        tokens_per_second: float = 50.0,
+        answer_tokens: int = 64,
+    ):
+        """Initialize a model registry with the same chains as ModelRegistry, backed
+        by FakeChatModel.
+
+        Args:
+            latency (float): The seconds before the first token of every call.
+                Defaults to 0.2.
+            tokens_per_second (float): The rate tokens are streamed at. Defaults to
+                50.0.
+            answer_tokens (int): The number of tokens of an answer. Defaults to 64.
+        """
+        model = FakeChatModel(
+            latency=latency,
+            tokens_per_second=tokens_per_second,
+            answer_tokens=answer_tokens,
+        )
+        self.agent = model.bind_tools(tools)
+        self.rewriter = model
+        self.generate_chain = GENERATE_PROMPT | model
+        self.grade_chain = GRADE_PROMPT | model.with_structured_output(Grade)
+        self.summarizer = SUMMARY_PROMPT | model
+
+    async def aclose(self):
+        pass
+
+
+class HashEmbedder(Embedder):
+    def __init__(self, dimension: int = 384, batch_latency: float = 0.0, **kwargs):
+        """Initialize an embedder that derives unit vectors from the hash of the text.
+
+        Identical texts get identical vectors, so searches for the text of a stored
+        chunk find it, but similar texts are not close.
+
+        Args:
+            dimension (int): The number of dimensions. Defaults to 384.
+            batch_latency (float): The seconds each batch takes, to stand in for the
+                cost of a model. Defaults to 0.0.
+            **kwargs: The arguments of Embedder.
+        """
+        super().__init__("benchmark/hash-embedder", **kwargs)
+        self._dimension = dimension
+        self.batch_latency = batch_latency
+
+    def _model_dimension(self) -> int:
+        return self._dimension
+
+    def _embed(self, text: str) -> list[float]:
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8])
+        vector = np.random.default_rng(seed).normal(size=self._dimension)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+    def _embed_batch(self, documents: list[str]) -> list[list[float]]:
+        if self.batch_latency:
+            time.sleep(self.batch_latency)
+        return [self._embed(document) for document in documents]
+
+    def _embed_query(self, query: str) -> list[float]:
+        return self._embed(query)
+
+
+def create_fake_firecrawl(pages_per_second: float = 50.0, page_words: int = 400):
+    """Create an app that serves the crawl endpoints of the Firecrawl API.
+
+    Every crawl generates `limit` pages below its URL and streams them over the
+    crawl websocket at a fixed rate, followed by a "done" message.
+
+    Args:
+        pages_per_second (float): The rate pages are streamed at. Defaults to 50.0.
+        page_words (int): The number of words of a page. Defaults to 400.
+
+    Returns:
+        FastAPI: The app.
+    """
+    app = FastAPI()
+    crawls: dict[str, dict] = {}
+
+    @app.post("/v1/crawl")
+    async def start_crawl(body: dict):
+        crawl_id = uuid.uuid4().hex
+        crawls[crawl_id] = {
+            "url": body["url"].rstrip("/"),
+            "limit": body.get("limit", 10),
+            "status": "scraping",
+            "completed": 0,
+        }
+        return {"success": True, "id": crawl_id, "url": f"/v1/crawl/{crawl_id}"}
+
+    @app.get("/v1/crawl/{crawl_id}")
+    async def get_crawl(crawl_id: str):
+        crawl = crawls[crawl_id]
+        return {
+            "success": True,
+            "status": crawl["status"],
+            "completed": crawl["completed"],
+            "total": crawl["limit"],
+            "data": [],
+        }
+
+    @app.delete("/v1/crawl/{crawl_id}")
+    async def cancel_crawl(crawl_id: str):
+        crawls[crawl_id]["status"] = "cancelled"
+        return {"status": "cancelled"}
+
+    @app.websocket("/v1/crawl/{crawl_id}")
+    async def watch_crawl(websocket: WebSocket, crawl_id: str):
+        await websocket.accept()
+        crawl = crawls[crawl_id]
+        try:
+            while crawl["completed"] < crawl["limit"]:
+                if crawl["status"] == "cancelled":
+                    break
+                index = crawl["completed"]
+                url = f"{crawl['url']}/page-{index}"
+                await websocket.send_json(
+                    {
+                        "type": "document",
+                        "data": {
+                            "markdown": f"# Page {index}\n\n"
+                            + generate_text(index, page_words),
+                            "metadata": {
+                                "url": url,
+                                "sourceURL": url,
+                                "title": f"Page {index}",
+                            },
+                        },
+                    }
+                )
+                crawl["completed"] += 1
+                await asyncio.sleep(1 / pages_per_second)
+            if crawl["status"] == "scraping":
+                crawl["status"] = "completed"
+            await websocket.send_json(
+                {"type": "done", "data": {"status": crawl["status"]}}
+            )
+            await websocket.close()
+        except WebSocketDisconnect:
+            pass
+
+    return app
@@ -10,16 +10,21 @@ from langgraph.graph import StateGraph
 from dotenv import load_dotenv
 from langgraph.prebuilt import ToolNode, tools_condition
 from fastapi_backend.src.askthedocs_agent.utils.tools import tools
+from langgraph.checkpoint.base import BaseCheckpointSaver
 from langgraph.checkpoint.memory import MemorySaver
 from langgraph.graph import END, START
 
 load_dotenv()
 
 
-def create_graph():
+def create_graph(checkpointer: BaseCheckpointSaver | None = None):
     """
     Create a new graph for the agent. This function initializes the graph and adds
     nodes and edges to define the workflow of the agent.
+
+    Args:
+        checkpointer (BaseCheckpointSaver, optional): The checkpointer that persists
+            the threads. Defaults to an unbounded MemorySaver.
     """
     # Define a new graph
     workflow = StateGraph(AgentState)
@@ -56,5 +61,5 @@ def create_graph():
     workflow.add_edge("generate", END)
     workflow.add_edge("rewrite", "agent")
 
-    graph = workflow.compile(checkpointer=MemorySaver())
+    graph = workflow.compile(checkpointer=checkpointer or MemorySaver())
     return graph
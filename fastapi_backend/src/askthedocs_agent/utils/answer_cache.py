@@ -0,0 +1,257 @@
+"""
+This script defines the answer cache of the agent workflow.
+This module contains a cache of final answers keyed by collection and normalized question,
+which is checked before the graph runs and matches repeated questions exactly or, when
+a threshold is set, by embedding similarity.
+"""
+
+import re
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+from loguru import logger
+
+from fastapi_backend.src.cache import TTLCache
+
+
+def normalize_question(question: str) -> str:
+    """Normalize a question for exact matching.
+
+    Args:
+        question (str): The question.
+
+    Returns:
+        str: The question in lower case with collapsed whitespace and without
+            trailing punctuation.
+    """
+    return re.sub(r"\s+", " ", question).strip().lower().rstrip("?!. ")
+
+
+# Rows allocated for the question vectors of a collection at first, doubled when full
+INITIAL_INDEX_ROWS = 64
+
+
+@dataclass
+class CachedAnswer:
+    """A cached answer."""
+
+    answer: str
+
+
+class QuestionIndex:
+    def __init__(self, dimension: int, rows: int = INITIAL_INDEX_ROWS):
+        """Initialize the QuestionIndex.
+
+        Holds the unit vectors of the cached questions of one collection in a
+        preallocated matrix, so a lookup is a single matrix-vector product. Rows of
+        removed questions are reused.
+
+        Args:
+            dimension (int): The number of dimensions of the vectors.
+            rows (int): The number of rows allocated at first. Defaults to
+                INITIAL_INDEX_ROWS.
+        """
+        self.vectors = np.zeros((rows, dimension), dtype=np.float32)
+        self.questions: list[Optional[str]] = [None] * rows
+        self.rows: dict[str, int] = {}
+        self._free = list(range(rows - 1, -1, -1))
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def add(self, question: str, vector: np.ndarray):
+        """Add or replace the vector of a question.
+
+        Args:
+            question (str): The normalized question.
+            vector (np.ndarray): Its unit vector.
+        """
+        row = self.rows.get(question)
+        if row is None:
+            if not self._free:
+                self._grow()
+            row = self._free.pop()
+            self.rows[question] = row
+            self.questions[row] = question
+        self.vectors[row] = vector
+
+    def _grow(self):
+        rows = len(self.questions)
+        self.vectors = np.concatenate([self.vectors, np.zeros_like(self.vectors)])
+        self.questions.extend([None] * rows)
+        self._free.extend(range(2 * rows - 1, rows - 1, -1))
+
+    def remove(self, question: str):
+        """Remove the vector of a question, if it is held.
+
+        Args:
+            question (str): The normalized question.
+        """
+        row = self.rows.pop(question, None)
+        if row is not None:
+            self.vectors[row] = 0.0
+            self.questions[row] = None
+            self._free.append(row)
+
+    def nearest(self, vector: np.ndarray) -> tuple[Optional[str], float]:
+        """Find the question most similar to a vector.
+
+        Args:
+            vector (np.ndarray): A unit vector.
+
+        Returns:
+            tuple[Optional[str], float]: The question, or None if the index is
+                empty, and its cosine similarity. Free rows are zero, so they never
+                match a positive threshold.
+        """
+        if not self.rows:
+            return None, 0.0
+        similarities = self.vectors @ vector
+        row = int(np.argmax(similarities))
+        return self.questions[row], float(similarities[row])
+
+
+class AnswerCache:
+    def __init__(
+        self,
+        embed: Optional[Callable[[str], Awaitable[list[float]]]] = None,
+        max_entries: int = 1000,
+        ttl_seconds: float = 3600.0,
+        similarity_threshold: Optional[float] = None,
+    ):
+        """Initialize the AnswerCache.
+
+        Questions are first matched exactly, after normalization. Matching by
+        embedding similarity is opt-in: questions that differ in a single word, such
+        as "how do I enable X" and "how do I disable X", can be closer than any
+        generic threshold, so it needs a threshold measured on the embedding model.
+
+        Args:
+            embed: An async function that embeds a question. Without it only exact
+                matches are served. Defaults to None.
+            max_entries (int): The maximum number of cached answers. Defaults to 1000.
+            ttl_seconds (float): The lifetime of a cached answer. Defaults to 3600.0.
+            similarity_threshold (float, optional): The cosine similarity above which
+                a cached question counts as the same question. Defaults to None,
+                which only serves exact matches.
+        """
+        self.embed = embed if similarity_threshold is not None else None
+        self.max_entries = max_entries
+        self.similarity_threshold = similarity_threshold
+        self._cache = TTLCache(max_entries=max_entries, ttl_seconds=ttl_seconds)
+        # The question vectors of each collection. Answers evicted from the cache
+        # are removed from them when a lookup matches them, or by _prune.
+        self._indexes: dict[str, QuestionIndex] = {}
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    async def _embed(self, question: str) -> Optional[np.ndarray]:
+        if self.embed is None:
+            return None
+        try:
+            vector = np.asarray(await self.embed(question), dtype=np.float32)
+        except Exception as e:
+            logger.error(f"Failed to embed question for the answer cache: {e}")
+            return None
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    async def get(self, collection_name: str, question: str) -> Optional[str]:
+        """Look up the answer to a question asked before against the same collection.
+
+        Args:
+            collection_name (str): The name of the collection the question is about.
+            question (str): The question.
+
+        Returns:
+            Optional[str]: The cached answer, or None on a miss.
+        """
+        normalized = normalize_question(question)
+        if (entry := self._cache.get((collection_name, normalized))) is not None:
+            self.exact_hits += 1
+            return entry.answer
+
+        index = self._indexes.get(collection_name)
+        vector = await self._embed(question) if index else None
+        while vector is not None and index:
+            match, similarity = index.nearest(vector)
+            if similarity < self.similarity_threshold:
+                break
+            entry = self._cache.get((collection_name, match))
+            if entry is not None:
+                self.semantic_hits += 1
+                return entry.answer
+            # Evicted or expired since it was indexed
+            index.remove(match)
+
+        self.misses += 1
+        return None
+
+    async def put(self, collection_name: str, question: str, answer: str):
+        """Cache the answer to a question.
+
+        Args:
+            collection_name (str): The name of the collection the question is about.
+            question (str): The question.
+            answer (str): The final answer.
+        """
+        normalized = normalize_question(question)
+        self._cache.set((collection_name, normalized), CachedAnswer(answer))
+        vector = await self._embed(question)
+        if vector is None:
+            return
+        index = self._indexes.get(collection_name)
+        if index is None:
+            index = self._indexes[collection_name] = QuestionIndex(len(vector))
+        index.add(normalized, vector)
+        if sum(len(index) for index in self._indexes.values()) > 2 * self.max_entries:
+            self._prune()
+
+    def _prune(self):
+        """Remove the vectors of the answers that are no longer cached."""
+        live = {key for key, _ in self._cache.items()}
+        for collection_name, index in list(self._indexes.items()):
+            for question in list(index.rows):
+                if (collection_name, question) not in live:
+                    index.remove(question)
+            if not index:
+                del self._indexes[collection_name]
+
+    def invalidate(self, collection_name: str) -> int:
+        """Drop every cached answer about a collection, e.g. when it is re-crawled.
+
+        Args:
+            collection_name (str): The name of the collection.
+
+        Returns:
+            int: The number of dropped answers.
+        """
+        removed = self._cache.remove_where(lambda key: key[0] == collection_name)
+        self._indexes.pop(collection_name, None)
+        if removed:
+            self.invalidations += 1
+            logger.info(f"Invalidated {removed} cached answers for {collection_name}")
+        return removed
+
+    def stats(self) -> dict:
+        """Get the size and hit/miss counters of the cache.
+
+        Returns:
+            dict: The cache statistics.
+        """
+        hits = self.exact_hits + self.semantic_hits
+        lookups = hits + self.misses
+        return {
+            "entries": len(self._cache),
+            "indexed_questions": sum(len(index) for index in self._indexes.values()),
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "evictions": self._cache.evictions,
+            "invalidations": self.invalidations,
+        }
@@ -0,0 +1,909 @@
+"""
+This script defines the checkpointers of the agent workflow.
+This module contains a bounded in-memory checkpointer that evicts idle threads, a SQLite
+checkpointer that persists threads across restarts, and a tiered checkpointer that keeps
+recently used threads in memory in front of SQLite. Each of them also bounds the number
+of messages a thread carries into its next turn.
+"""
+
+import asyncio
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from collections.abc import AsyncIterator, Iterator, Sequence
+from typing import Any, Optional
+
+from langchain_core.messages import (
+    BaseMessage,
+    HumanMessage,
+    RemoveMessage,
+    SystemMessage,
+)
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.checkpoint.serde.types import TASKS
+from loguru import logger
+
+
+class MessageBound:
+    """Bound the number of messages of a thread by trimming its oldest turns.
+
+    The checkpointer cannot change the messages of a thread itself, so the chat
+    endpoint applies the RemoveMessage updates returned by trim_messages before it
+    adds a new turn.
+    """
+
+    max_messages_per_thread: Optional[int] = None
+    trimmed_messages: int = 0
+
+    def trim_messages(self, messages: Sequence[BaseMessage]) -> list[RemoveMessage]:
+        """Get the removals that bring a thread back within max_messages_per_thread.
+
+        Whole turns are removed, oldest first, so that no tool call loses its
+        answer.
+
+        Args:
+            messages (Sequence[BaseMessage]): The messages of the thread.
+
+        Returns:
+            list[RemoveMessage]: The removals of the leading messages, none if the
+                thread is within the bound.
+        """
+        if (
+            self.max_messages_per_thread is None
+            or len(messages) <= self.max_messages_per_thread
+        ):
+            return []
+        start = len(messages) - self.max_messages_per_thread
+        # Every turn starts with the system message or the question of the user
+        while start < len(messages) and not isinstance(
+            messages[start], (HumanMessage, SystemMessage)
+        ):
+            start += 1
+        self.trimmed_messages += start
+        return [RemoveMessage(id=message.id) for message in messages[:start]]
+
+
+class BoundedMemorySaver(MessageBound, MemorySaver):
+    def __init__(
+        self,
+        max_threads: int = 1000,
+        ttl_seconds: float = 3600.0,
+        max_checkpoints_per_thread: int = 20,
+        max_messages_per_thread: Optional[int] = None,
+    ):
+        """Initialize the BoundedMemorySaver.
+
+        Threads are evicted when they have not been used for ttl_seconds, or in least
+        recently used order once more than max_threads are held. Only the newest
+        max_checkpoints_per_thread checkpoints of a thread are kept.
+
+        Args:
+            max_threads (int): The maximum number of threads held. Defaults to 1000.
+            ttl_seconds (float): The idle time after which a thread is evicted.
+                Defaults to 3600.0.
+            max_checkpoints_per_thread (int): The number of checkpoints kept per
+                thread. Defaults to 20.
+            max_messages_per_thread (int, optional): The number of messages a thread
+                carries into its next turn. Defaults to None, which keeps them all.
+        """
+        super().__init__()
+        self.max_threads = max_threads
+        self.ttl_seconds = ttl_seconds
+        self.max_checkpoints_per_thread = max_checkpoints_per_thread
+        self.max_messages_per_thread = max_messages_per_thread
+
+        self._lock = threading.RLock()
+        self._last_used: OrderedDict[str, float] = OrderedDict()
+        self._blob_keys: defaultdict[str, set] = defaultdict(set)
+        self._write_keys: defaultdict[str, set] = defaultdict(set)
+        self.lru_evictions = 0
+        self.ttl_evictions = 0
+        self.pruned_checkpoints = 0
+
+    def has_thread(self, thread_id: str) -> bool:
+        """Check whether a thread is held in memory.
+
+        Args:
+            thread_id (str): The ID of the thread.
+
+        Returns:
+            bool: True if the thread is held.
+        """
+        with self._lock:
+            return thread_id in self.storage
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        thread_id = config["configurable"]["thread_id"]
+        with self._lock:
+            self._evict_expired()
+            if thread_id not in self.storage:
+                # Avoid creating an empty entry for unknown threads
+                return None
+            self._touch(thread_id)
+            return super().get_tuple(config)
+
+    def list(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[CheckpointTuple]:
+        with self._lock:
+            if config and config["configurable"]["thread_id"] not in self.storage:
+                return iter(())
+            return iter(
+                list(super().list(config, filter=filter, before=before, limit=limit))
+            )
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"]["checkpoint_ns"]
+        with self._lock:
+            next_config = super().put(config, checkpoint, metadata, new_versions)
+            self._blob_keys[thread_id].update(
+                (thread_id, checkpoint_ns, channel, version)
+                for channel, version in new_versions.items()
+            )
+            self._touch(thread_id)
+            self._prune_thread(thread_id, checkpoint_ns)
+            self._evict_expired()
+            self._evict_lru()
+            return next_config
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        thread_id = config["configurable"]["thread_id"]
+        with self._lock:
+            super().put_writes(config, writes, task_id, task_path)
+            self._write_keys[thread_id].add(
+                (
+                    thread_id,
+                    config["configurable"].get("checkpoint_ns", ""),
+                    config["configurable"]["checkpoint_id"],
+                )
+            )
+            self._touch(thread_id)
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return self.get_tuple(config)
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        for item in self.list(config, filter=filter, before=before, limit=limit):
+            yield item
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        return self.put(config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        return self.put_writes(config, writes, task_id, task_path)
+
+    def _touch(self, thread_id: str):
+        self._last_used[thread_id] = time.monotonic()
+        self._last_used.move_to_end(thread_id)
+
+    def _prune_thread(self, thread_id: str, checkpoint_ns: str):
+        """Drop the oldest checkpoints of a thread beyond max_checkpoints_per_thread.
+
+        Args:
+            thread_id (str): The ID of the thread.
+            checkpoint_ns (str): The checkpoint namespace.
+        """
+        checkpoints = self.storage[thread_id][checkpoint_ns]
+        excess = len(checkpoints) - self.max_checkpoints_per_thread
+        if excess <= 0:
+            return
+
+        ordered = sorted(checkpoints.keys())
+        for checkpoint_id in ordered[:excess]:
+            del checkpoints[checkpoint_id]
+            write_key = (thread_id, checkpoint_ns, checkpoint_id)
+            self.writes.pop(write_key, None)
+            self._write_keys[thread_id].discard(write_key)
+        self.pruned_checkpoints += excess
+
+        # Blobs older than the versions referenced by the oldest kept checkpoint
+        # are no longer reachable.
+        oldest = self.serde.loads_typed(checkpoints[ordered[excess]][0])
+        oldest_versions = oldest["channel_versions"]
+        for key in list(self._blob_keys[thread_id]):
+            _, ns, channel, version = key
+            if ns == checkpoint_ns and channel in oldest_versions:
+                if version < oldest_versions[channel]:
+                    self.blobs.pop(key, None)
+                    self._blob_keys[thread_id].discard(key)
+
+    def _drop_thread(self, thread_id: str):
+        self.storage.pop(thread_id, None)
+        for key in self._write_keys.pop(thread_id, ()):
+            self.writes.pop(key, None)
+        for key in self._blob_keys.pop(thread_id, ()):
+            self.blobs.pop(key, None)
+        self._last_used.pop(thread_id, None)
+
+    def _evict_expired(self):
+        deadline = time.monotonic() - self.ttl_seconds
+        while self._last_used:
+            thread_id, last_used = next(iter(self._last_used.items()))
+            if last_used >= deadline:
+                break
+            self._drop_thread(thread_id)
+            self.ttl_evictions += 1
+
+    def _evict_lru(self):
+        while len(self._last_used) > self.max_threads:
+            thread_id = next(iter(self._last_used))
+            self._drop_thread(thread_id)
+            self.lru_evictions += 1
+
+    def stats(self) -> dict:
+        """Get the size and eviction counters of the checkpointer.
+
+        Returns:
+            dict: The checkpointer statistics.
+        """
+        with self._lock:
+            checkpoint_bytes = sum(
+                len(checkpoint[1]) + len(metadata[1])
+                for namespaces in self.storage.values()
+                for checkpoints in namespaces.values()
+                for checkpoint, metadata, _ in checkpoints.values()
+            )
+            write_bytes = sum(
+                len(write[2][1])
+                for writes in self.writes.values()
+                for write in writes.values()
+            )
+            blob_bytes = sum(len(blob[1]) for blob in self.blobs.values())
+            return {
+                "backend": "memory",
+                "threads": len(self._last_used),
+                "checkpoints": sum(
+                    len(checkpoints)
+                    for namespaces in self.storage.values()
+                    for checkpoints in namespaces.values()
+                ),
+                "bytes": checkpoint_bytes + write_bytes + blob_bytes,
+                "lru_evictions": self.lru_evictions,
+                "ttl_evictions": self.ttl_evictions,
+                "pruned_checkpoints": self.pruned_checkpoints,
+                "max_messages_per_thread": self.max_messages_per_thread,
+                "trimmed_messages": self.trimmed_messages,
+            }
+
+    async def aclose(self):
+        """Nothing to release for the in-memory checkpointer."""
+
+
+class SqliteSaver(MessageBound, BaseCheckpointSaver[str]):
+    def __init__(
+        self,
+        path: str,
+        ttl_seconds: float = 7 * 24 * 3600.0,
+        max_checkpoints_per_thread: int = 20,
+        sweep_interval: float = 300.0,
+        max_messages_per_thread: Optional[int] = None,
+    ):
+        """Initialize the SqliteSaver.
+
+        Threads that have not been written to for ttl_seconds are deleted by a sweep
+        that runs at most every sweep_interval seconds. Only the newest
+        max_checkpoints_per_thread checkpoints of a thread are kept.
+
+        Args:
+            path (str): The path of the SQLite database file.
+            ttl_seconds (float): The idle time after which a thread is deleted.
+                Defaults to one week.
+            max_checkpoints_per_thread (int): The number of checkpoints kept per
+                thread. Defaults to 20.
+            sweep_interval (float): The minimum number of seconds between two sweeps
+                for expired threads. Defaults to 300.0.
+            max_messages_per_thread (int, optional): The number of messages a thread
+                carries into its next turn. Defaults to None, which keeps them all.
+        """
+        super().__init__()
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_checkpoints_per_thread = max_checkpoints_per_thread
+        self.sweep_interval = sweep_interval
+        self.max_messages_per_thread = max_messages_per_thread
+
+        self._lock = threading.Lock()
+        self._last_sweep = 0.0
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.executescript(
+            """
+            PRAGMA journal_mode=WAL;
+            PRAGMA synchronous=NORMAL;
+            CREATE TABLE IF NOT EXISTS checkpoints (
+                thread_id TEXT NOT NULL,
+                checkpoint_ns TEXT NOT NULL DEFAULT '',
+                checkpoint_id TEXT NOT NULL,
+                parent_checkpoint_id TEXT,
+                type TEXT,
+                checkpoint BLOB,
+                metadata_type TEXT,
+                metadata BLOB,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+            );
+            CREATE TABLE IF NOT EXISTS writes (
+                thread_id TEXT NOT NULL,
+                checkpoint_ns TEXT NOT NULL DEFAULT '',
+                checkpoint_id TEXT NOT NULL,
+                task_id TEXT NOT NULL,
+                idx INTEGER NOT NULL,
+                channel TEXT NOT NULL,
+                type TEXT,
+                value BLOB,
+                task_path TEXT NOT NULL DEFAULT '',
+                PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+            );
+            CREATE INDEX IF NOT EXISTS checkpoints_updated_at
+                ON checkpoints (thread_id, updated_at);
+            """
+        )
+        self.pruned_checkpoints = 0
+        self.ttl_evictions = 0
+
+    def _pending_writes(
+        self, thread_id: str, checkpoint_ns: str, checkpoint_id: str
+    ) -> list:
+        rows = self.conn.execute(
+            "SELECT task_id, channel, type, value, task_path FROM writes "
+            "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ? "
+            "ORDER BY task_id, idx",
+            (thread_id, checkpoint_ns, checkpoint_id),
+        ).fetchall()
+        return rows
+
+    def _to_tuple(self, row: tuple) -> CheckpointTuple:
+        (
+            thread_id,
+            checkpoint_ns,
+            checkpoint_id,
+            parent_checkpoint_id,
+            type_,
+            checkpoint,
+            metadata_type,
+            metadata,
+        ) = row
+        writes = self._pending_writes(thread_id, checkpoint_ns, checkpoint_id)
+        sends = []
+        if parent_checkpoint_id:
+            sends = [
+                self.serde.loads_typed((w_type, value))
+                for _, channel, w_type, value, _ in self._pending_writes(
+                    thread_id, checkpoint_ns, parent_checkpoint_id
+                )
+                if channel == TASKS
+            ]
+        return CheckpointTuple(
+            config={
+                "configurable": {
+                    "thread_id": thread_id,
+                    "checkpoint_ns": checkpoint_ns,
+                    "checkpoint_id": checkpoint_id,
+                }
+            },
+            checkpoint={
+                **self.serde.loads_typed((type_, checkpoint)),
+                "pending_sends": sends,
+            },
+            metadata=self.serde.loads_typed((metadata_type, metadata)),
+            parent_config=(
+                {
+                    "configurable": {
+                        "thread_id": thread_id,
+                        "checkpoint_ns": checkpoint_ns,
+                        "checkpoint_id": parent_checkpoint_id,
+                    }
+                }
+                if parent_checkpoint_id
+                else None
+            ),
+            pending_writes=[
+                (task_id, channel, self.serde.loads_typed((w_type, value)))
+                for task_id, channel, w_type, value, _ in writes
+            ],
+        )
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        query = (
+            "SELECT thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, "
+            "type, checkpoint, metadata_type, metadata FROM checkpoints "
+            "WHERE thread_id = ? AND checkpoint_ns = ? "
+        )
+        with self._lock:
+            if checkpoint_id := get_checkpoint_id(config):
+                row = self.conn.execute(
+                    query + "AND checkpoint_id = ?",
+                    (thread_id, checkpoint_ns, checkpoint_id),
+                ).fetchone()
+            else:
+                row = self.conn.execute(
+                    query + "ORDER BY checkpoint_id DESC LIMIT 1",
+                    (thread_id, checkpoint_ns),
+                ).fetchone()
+            return self._to_tuple(row) if row else None
+
+    def list(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[CheckpointTuple]:
+        query = (
+            "SELECT thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, "
+            "type, checkpoint, metadata_type, metadata FROM checkpoints"
+        )
+        clauses, params = [], []
+        if config:
+            clauses.append("thread_id = ?")
+            params.append(config["configurable"]["thread_id"])
+            if (
+                checkpoint_ns := config["configurable"].get("checkpoint_ns")
+            ) is not None:
+                clauses.append("checkpoint_ns = ?")
+                params.append(checkpoint_ns)
+            if checkpoint_id := get_checkpoint_id(config):
+                clauses.append("checkpoint_id = ?")
+                params.append(checkpoint_id)
+        if before and (before_id := get_checkpoint_id(before)):
+            clauses.append("checkpoint_id < ?")
+            params.append(before_id)
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        query += " ORDER BY checkpoint_id DESC"
+
+        results = []
+        with self._lock:
+            for row in self.conn.execute(query, params).fetchall():
+                item = self._to_tuple(row)
+                if filter and not all(
+                    item.metadata.get(key) == value for key, value in filter.items()
+                ):
+                    continue
+                results.append(item)
+                if limit is not None and len(results) >= limit:
+                    break
+        return iter(results)
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"]["checkpoint_ns"]
+        c = checkpoint.copy()
+        c.pop("pending_sends", None)
+        type_, serialized_checkpoint = self.serde.dumps_typed(c)
+        metadata_type, serialized_metadata = self.serde.dumps_typed(
+            get_checkpoint_metadata(config, metadata)
+        )
+        with self._lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    thread_id,
+                    checkpoint_ns,
+                    checkpoint["id"],
+                    config["configurable"].get("checkpoint_id"),
+                    type_,
+                    serialized_checkpoint,
+                    metadata_type,
+                    serialized_metadata,
+                    time.time(),
+                ),
+            )
+            self._prune_thread(thread_id, checkpoint_ns)
+            self._sweep_expired()
+        return {
+            "configurable": {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": checkpoint["id"],
+            }
+        }
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        rows = []
+        for idx, (channel, value) in enumerate(writes):
+            type_, serialized = self.serde.dumps_typed(value)
+            rows.append(
+                (
+                    thread_id,
+                    checkpoint_ns,
+                    checkpoint_id,
+                    task_id,
+                    WRITES_IDX_MAP.get(channel, idx),
+                    channel,
+                    type_,
+                    serialized,
+                    task_path,
+                )
+            )
+        # Special writes (negative index) replace, regular writes are kept once
+        verb = (
+            "INSERT OR REPLACE"
+            if all(channel in WRITES_IDX_MAP for channel, _ in writes)
+            else "INSERT OR IGNORE"
+        )
+        with self._lock, self.conn:
+            self.conn.executemany(
+                f"{verb} INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows
+            )
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        items = await asyncio.to_thread(
+            lambda: list(self.list(config, filter=filter, before=before, limit=limit))
+        )
+        for item in items:
+            yield item
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        return await asyncio.to_thread(
+            self.put, config, checkpoint, metadata, new_versions
+        )
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        return await asyncio.to_thread(
+            self.put_writes, config, writes, task_id, task_path
+        )
+
+    def get_next_version(self, current: Optional[str], channel) -> str:
+        # Use the MemorySaver version format so that both tiers agree
+        return MemorySaver.get_next_version(self, current, channel)
+
+    def _prune_thread(self, thread_id: str, checkpoint_ns: str):
+        """Delete the oldest checkpoints of a thread beyond max_checkpoints_per_thread.
+
+        Args:
+            thread_id (str): The ID of the thread.
+            checkpoint_ns (str): The checkpoint namespace.
+        """
+        stale = self.conn.execute(
+            "SELECT checkpoint_id FROM checkpoints "
+            "WHERE thread_id = ? AND checkpoint_ns = ? "
+            "ORDER BY checkpoint_id DESC LIMIT -1 OFFSET ?",
+            (thread_id, checkpoint_ns, self.max_checkpoints_per_thread),
+        ).fetchall()
+        for (checkpoint_id,) in stale:
+            for table in ("checkpoints", "writes"):
+                self.conn.execute(
+                    f"DELETE FROM {table} WHERE thread_id = ? AND checkpoint_ns = ? "
+                    "AND checkpoint_id = ?",
+                    (thread_id, checkpoint_ns, checkpoint_id),
+                )
+        self.pruned_checkpoints += len(stale)
+
+    def _sweep_expired(self):
+        now = time.time()
+        if now - self._last_sweep < self.sweep_interval:
+            return
+        self._last_sweep = now
+        expired = self.conn.execute(
+            "SELECT thread_id FROM checkpoints GROUP BY thread_id "
+            "HAVING MAX(updated_at) < ?",
+            (now - self.ttl_seconds,),
+        ).fetchall()
+        for (thread_id,) in expired:
+            self.conn.execute(
+                "DELETE FROM checkpoints WHERE thread_id = ?", (thread_id,)
+            )
+            self.conn.execute("DELETE FROM writes WHERE thread_id = ?", (thread_id,))
+        if expired:
+            logger.info(f"Deleted {len(expired)} expired threads from {self.path}")
+        self.ttl_evictions += len(expired)
+
+    def stats(self) -> dict:
+        """Get the size and eviction counters of the checkpointer.
+
+        Returns:
+            dict: The checkpointer statistics.
+        """
+        with self._lock:
+            threads, checkpoints = self.conn.execute(
+                "SELECT COUNT(DISTINCT thread_id), COUNT(*) FROM checkpoints"
+            ).fetchone()
+            page_count = self.conn.execute("PRAGMA page_count").fetchone()[0]
+            page_size = self.conn.execute("PRAGMA page_size").fetchone()[0]
+        return {
+            "backend": "sqlite",
+            "threads": threads,
+            "checkpoints": checkpoints,
+            "bytes": page_count * page_size,
+            "ttl_evictions": self.ttl_evictions,
+            "pruned_checkpoints": self.pruned_checkpoints,
+            "max_messages_per_thread": self.max_messages_per_thread,
+            "trimmed_messages": self.trimmed_messages,
+        }
+
+    async def aclose(self):
+        """Close the SQLite connection."""
+        with self._lock:
+            self.conn.close()
+
+
+class TieredSaver(MessageBound, BaseCheckpointSaver[str]):
+    def __init__(
+        self,
+        memory: BoundedMemorySaver,
+        disk: SqliteSaver,
+        max_messages_per_thread: Optional[int] = None,
+    ):
+        """Initialize the TieredSaver.
+
+        Every checkpoint is written through to both tiers. Reads are served from the
+        memory tier and fall back to the disk tier for threads that were evicted from
+        memory or written before a restart.
+
+        Args:
+            memory (BoundedMemorySaver): The in-memory tier.
+            disk (SqliteSaver): The on-disk tier.
+            max_messages_per_thread (int, optional): The number of messages a thread
+                carries into its next turn. Defaults to None, which keeps them all.
+        """
+        super().__init__(serde=memory.serde)
+        self.memory = memory
+        self.disk = disk
+        self.max_messages_per_thread = max_messages_per_thread
+        self.memory_hits = 0
+        self.memory_misses = 0
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        if item := self.memory.get_tuple(config):
+            self.memory_hits += 1
+            return item
+        self.memory_misses += 1
+        return self.disk.get_tuple(config)
+
+    def list(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[CheckpointTuple]:
+        return self.disk.list(config, filter=filter, before=before, limit=limit)
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        next_config = self.disk.put(config, checkpoint, metadata, new_versions)
+        self._put_memory(config, checkpoint, metadata, new_versions)
+        return next_config
+
+    def _put_memory(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ):
+        # A thread that is not in memory has none of the unchanged channel values,
+        # so store every channel instead of only the new versions.
+        if not self.memory.has_thread(config["configurable"]["thread_id"]):
+            new_versions = checkpoint["channel_versions"]
+        self.memory.put(config, checkpoint, metadata, new_versions)
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        self.disk.put_writes(config, writes, task_id, task_path)
+        self.memory.put_writes(config, writes, task_id, task_path)
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        if item := self.memory.get_tuple(config):
+            self.memory_hits += 1
+            return item
+        self.memory_misses += 1
+        return await self.disk.aget_tuple(config)
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        async for item in self.disk.alist(
+            config, filter=filter, before=before, limit=limit
+        ):
+            yield item
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        next_config = await self.disk.aput(config, checkpoint, metadata, new_versions)
+        self._put_memory(config, checkpoint, metadata, new_versions)
+        return next_config
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        await self.disk.aput_writes(config, writes, task_id, task_path)
+        self.memory.put_writes(config, writes, task_id, task_path)
+
+    def get_next_version(self, current, channel) -> str:
+        return self.memory.get_next_version(current, channel)
+
+    def stats(self) -> dict:
+        """Get the statistics of both tiers and the memory hit rate.
+
+        Returns:
+            dict: The checkpointer statistics.
+        """
+        lookups = self.memory_hits + self.memory_misses
+        return {
+            "backend": "tiered",
+            "memory_hits": self.memory_hits,
+            "memory_misses": self.memory_misses,
+            "memory_hit_rate": self.memory_hits / lookups if lookups else 0.0,
+            "max_messages_per_thread": self.max_messages_per_thread,
+            "trimmed_messages": self.trimmed_messages,
+            "memory": self.memory.stats(),
+            "disk": self.disk.stats(),
+        }
+
+    async def aclose(self):
+        """Close both tiers."""
+        await self.memory.aclose()
+        await self.disk.aclose()
+
+
+def create_checkpointer(
+    backend: str = "tiered",
+    path: str = "checkpoints.sqlite",
+    max_threads: int = 1000,
+    memory_ttl_seconds: float = 3600.0,
+    disk_ttl_seconds: float = 7 * 24 * 3600.0,
+    max_checkpoints_per_thread: int = 20,
+    max_messages_per_thread: Optional[int] = None,
+):
+    """Create the checkpointer of the agent graph.
+
+    Args:
+        backend (str): "memory", "sqlite" or "tiered". Defaults to "tiered".
+        path (str): The path of the SQLite database file. Defaults to "checkpoints.sqlite".
+        max_threads (int): The maximum number of threads held in memory. Defaults to 1000.
+        memory_ttl_seconds (float): The idle time after which a thread is evicted from
+            memory. Defaults to 3600.0.
+        disk_ttl_seconds (float): The idle time after which a thread is deleted from
+            disk. Defaults to one week.
+        max_checkpoints_per_thread (int): The number of checkpoints kept per thread.
+            Defaults to 20.
+        max_messages_per_thread (int, optional): The number of messages a thread
+            carries into its next turn. Defaults to None, which keeps them all.
+
+    Returns:
+        The checkpointer.
+    """
+
+    def memory(max_messages: Optional[int] = None) -> BoundedMemorySaver:
+        return BoundedMemorySaver(
+            max_threads=max_threads,
+            ttl_seconds=memory_ttl_seconds,
+            max_checkpoints_per_thread=max_checkpoints_per_thread,
+            max_messages_per_thread=max_messages,
+        )
+
+    def disk(max_messages: Optional[int] = None) -> SqliteSaver:
+        return SqliteSaver(
+            path=path,
+            ttl_seconds=disk_ttl_seconds,
+            max_checkpoints_per_thread=max_checkpoints_per_thread,
+            max_messages_per_thread=max_messages,
+        )
+
+    if backend == "memory":
+        return memory(max_messages_per_thread)
+    if backend == "sqlite":
+        return disk(max_messages_per_thread)
+    if backend == "tiered":
+        # The tiers hold the same threads, so only the tiered saver trims them
+        return TieredSaver(
+            memory=memory(),
+            disk=disk(),
+            max_messages_per_thread=max_messages_per_thread,
+        )
+    raise ValueError(f"Unknown checkpointer backend: {backend}")
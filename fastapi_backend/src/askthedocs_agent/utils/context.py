@@ -0,0 +1,372 @@
+"""
+This script defines the context assembly of the agent workflow.
+This module contains the functions that turn tool results into clean passages and a
+context budget that packs the most relevant passages, with their sources, into a
+bounded number of tokens before they are sent to the grader or the generate node.
+"""
+
+import json
+import re
+from collections.abc import Sequence
+from dataclasses import dataclass, field
+from functools import lru_cache
+from itertools import zip_longest
+from typing import Any, Optional
+
+import tiktoken
+from langchain_core.callbacks import adispatch_custom_event
+from langchain_core.messages import BaseMessage, ToolMessage
+from langchain_core.runnables import RunnableConfig
+from loguru import logger
+
+from fastapi_backend.src.metrics import CONTEXT_TOKENS
+
+# Fields of a search result that hold the passage, the source URL and the title
+TEXT_FIELDS = ("document", "content", "page_content", "text")
+SOURCE_FIELDS = ("source", "sourceURL", "url")
+TITLE_FIELDS = ("title", "ogTitle")
+
+IMAGE_PATTERN = re.compile(r"!\[[^\]]*\]\([^)]*\)")
+LINK_PATTERN = re.compile(r"\[([^\]]+)\]\((?:[^()]|\([^)]*\))*\)")
+HTML_TAG_PATTERN = re.compile(r"</?[a-zA-Z][^>]*>")
+RULE_PATTERN = re.compile(r"^\s*(?:[-*_=]\s*){3,}$", re.MULTILINE)
+BLANK_LINES_PATTERN = re.compile(r"\n\s*\n(?:\s*\n)+")
+
+
+@lru_cache
+def _encoding(name: str) -> tiktoken.Encoding:
+    return tiktoken.get_encoding(name)
+
+
+@dataclass
+class Passage:
+    """A retrieved passage and the source it can be cited by."""
+
+    text: str
+    source: Optional[str] = None
+    title: Optional[str] = None
+
+
+@dataclass
+class PackedContext:
+    """The context sent to the model and what it cost compared to the raw results."""
+
+    text: str
+    sources: list[str] = field(default_factory=list)
+    candidates: int = 0
+    duplicates: int = 0
+    passages: int = 0
+    truncated: int = 0
+    retrieved_tokens: int = 0
+    context_tokens: int = 0
+
+    @property
+    def saved_tokens(self) -> int:
+        return max(self.retrieved_tokens - self.context_tokens, 0)
+
+    def stats(self) -> dict:
+        """Get the size of the context and the tokens saved by packing it.
+
+        Returns:
+            dict: The passage counts, the sources and the token counts.
+        """
+        return {
+            "candidates": self.candidates,
+            "duplicates": self.duplicates,
+            "passages": self.passages,
+            "truncated": self.truncated,
+            "sources": self.sources,
+            "retrieved_tokens": self.retrieved_tokens,
+            "context_tokens": self.context_tokens,
+            "saved_tokens": self.saved_tokens,
+        }
+
+
+def _first(values: dict, names: Sequence[str]) -> Optional[Any]:
+    return next((values[name] for name in names if values.get(name)), None)
+
+
+def _to_passage(item: Any) -> Optional[Passage]:
+    if isinstance(item, str):
+        return Passage(item)
+    if not isinstance(item, dict):
+        return None
+    text = _first(item, TEXT_FIELDS)
+    if not isinstance(text, str):
+        return None
+    metadata = item.get("metadata") if isinstance(item.get("metadata"), dict) else {}
+    return Passage(
+        text=text,
+        source=_first(metadata, SOURCE_FIELDS) or _first(item, SOURCE_FIELDS),
+        title=_first(metadata, TITLE_FIELDS) or _first(item, TITLE_FIELDS),
+    )
+
+
+def parse_passages(content: Any) -> list[Passage]:
+    """Parse the output of a search tool into passages.
+
+    Args:
+        content: The content of a tool message: a list of search results, or its
+            JSON serialization, or plain text.
+
+    Returns:
+        list[Passage]: The passages in the order of the results, best first.
+    """
+    if isinstance(content, str):
+        stripped = content.strip()
+        if not stripped.startswith(("[", "{")):
+            return [Passage(stripped)] if stripped else []
+        try:
+            content = json.loads(stripped)
+        except ValueError:
+            return [Passage(stripped)]
+    if isinstance(content, dict):
+        # Tavily returns its results under "results" when called directly
+        content = content.get("results", [content])
+    if not isinstance(content, list):
+        return []
+    return [
+        passage
+        for passage in (_to_passage(item) for item in content)
+        if passage is not None
+    ]
+
+
+def clean_text(text: str) -> str:
+    """Strip the markdown and HTML markup that costs tokens without adding content.
+
+    Images, link targets, HTML tags and horizontal rules are removed, and runs of
+    blank lines are collapsed.
+
+    Args:
+        text (str): The passage text.
+
+    Returns:
+        str: The cleaned text.
+    """
+    text = IMAGE_PATTERN.sub("", text)
+    text = LINK_PATTERN.sub(r"\1", text)
+    text = HTML_TAG_PATTERN.sub("", text)
+    text = RULE_PATTERN.sub("", text)
+    text = BLANK_LINES_PATTERN.sub("\n\n", text)
+    return text.strip()
+
+
+def _normalize(text: str) -> str:
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+
+def dedupe_passages(passages: list[Passage]) -> list[Passage]:
+    """Drop passages whose text repeats, or is contained in, a passage kept before.
+
+    Overlapping chunks of the same page and the same page returned by two tools
+    are only sent once.
+
+    Args:
+        passages (list[Passage]): The passages, best first.
+
+    Returns:
+        list[Passage]: The distinct passages in the same order.
+    """
+    kept: list[tuple[str, Passage]] = []
+    for passage in passages:
+        normalized = _normalize(passage.text)
+        if not normalized or any(normalized in other for other, _ in kept):
+            continue
+        # A longer passage replaces the shorter ones it contains, at their rank
+        contained = [
+            index for index, (other, _) in enumerate(kept) if other in normalized
+        ]
+        if contained:
+            kept[contained[0]] = (normalized, passage)
+            for index in reversed(contained[1:]):
+                del kept[index]
+        else:
+            kept.append((normalized, passage))
+    return [passage for _, passage in kept]
+
+
+def tool_results(messages: Sequence[BaseMessage]) -> list[ToolMessage]:
+    """Get the tool messages answering the last tool calls of the agent.
+
+    Args:
+        messages (Sequence[BaseMessage]): The messages of the graph state.
+
+    Returns:
+        list[ToolMessage]: The trailing tool messages, in call order.
+    """
+    results = []
+    for message in reversed(messages):
+        if not isinstance(message, ToolMessage):
+            break
+        results.append(message)
+    return results[::-1]
+
+
+class ContextBudget:
+    def __init__(
+        self,
+        max_tokens: int = 3000,
+        max_passage_tokens: int = 800,
+        min_passage_tokens: int = 50,
+        grader_max_tokens: Optional[int] = 1000,
+        encoding_name: str = "cl100k_base",
+    ):
+        """Initialize the ContextBudget.
+
+        Args:
+            max_tokens (int): The tokens the packed context may use. Defaults to 3000.
+            max_passage_tokens (int): The tokens a single passage may use, so that
+                one long page does not crowd out the others. Defaults to 800.
+            min_passage_tokens (int): A passage is only truncated to fit the
+                remaining budget if at least this many tokens remain. Defaults to 50.
+            grader_max_tokens (int, optional): The budget of the context of the
+                relevance grader, which only needs enough to judge relevance.
+                Capped at max_tokens. Defaults to 1000, None uses max_tokens.
+            encoding_name (str): The tiktoken encoding used to count tokens.
+                Defaults to "cl100k_base".
+        """
+        self.max_tokens = max_tokens
+        self.max_passage_tokens = max_passage_tokens
+        self.min_passage_tokens = min_passage_tokens
+        self.grader_max_tokens = (
+            min(grader_max_tokens, max_tokens)
+            if grader_max_tokens is not None
+            else max_tokens
+        )
+        self.encoding = _encoding(encoding_name)
+
+    def count_tokens(self, text: str) -> int:
+        """Count the tokens of a text.
+
+        Args:
+            text (str): The text.
+
+        Returns:
+            int: The number of tokens.
+        """
+        return len(self.encoding.encode(text, disallowed_special=()))
+
+    def _truncate(self, text: str, max_tokens: int) -> tuple[str, bool]:
+        tokens = self.encoding.encode(text, disallowed_special=())
+        if len(tokens) <= max_tokens:
+            return text, False
+        kept = tokens[:max_tokens]
+        truncated = self.encoding.decode(kept)
+        # A character whose bytes span several tokens is dropped rather than cut,
+        # which would decode to a replacement character
+        for _ in range(3):
+            if not kept or not truncated.endswith("�"):
+                break
+            kept = kept[:-1]
+            truncated = self.encoding.decode(kept)
+        return truncated.rstrip() + " ...", True
+
+    def pack(
+        self, results: Sequence[Any], max_tokens: Optional[int] = None
+    ) -> PackedContext:
+        """Pack the results of one or more tool calls into the token budget.
+
+        The passages of every result are interleaved by rank, cleaned and deduped,
+        then added best first until the budget is spent. Each passage is headed by
+        its number, title and source URL so that the answer can cite it.
+
+        Args:
+            results (Sequence[Any]): The content of each tool message.
+            max_tokens (int, optional): Override the budget of the context, e.g. for
+                the grader. Defaults to max_tokens.
+
+        Returns:
+            PackedContext: The context and its statistics.
+        """
+        budget = self.max_tokens if max_tokens is None else max_tokens
+        retrieved_tokens = sum(
+            self.count_tokens(
+                content
+                if isinstance(content, str)
+                else json.dumps(content, default=str)
+            )
+            for content in results
+        )
+        ranked = [parse_passages(content) for content in results]
+        candidates = [
+            passage
+            for group in zip_longest(*ranked)
+            for passage in group
+            if passage is not None
+        ]
+        for passage in candidates:
+            passage.text = clean_text(passage.text)
+        passages = dedupe_passages(candidates)
+
+        sections: list[str] = []
+        sources: list[str] = []
+        used = truncated = 0
+        for passage in passages:
+            header = f"[{len(sections) + 1}]"
+            if passage.title:
+                header += f" {passage.title}"
+            if passage.source:
+                header += f" ({passage.source})"
+            remaining = budget - used - self.count_tokens(header) - 2
+            if remaining < min(
+                self.min_passage_tokens, self.count_tokens(passage.text)
+            ):
+                break
+            text, cut = self._truncate(
+                passage.text, min(remaining, self.max_passage_tokens)
+            )
+            section = f"{header}\n{text}"
+            sections.append(section)
+            used += self.count_tokens(section) + 2
+            truncated += cut
+            if passage.source and passage.source not in sources:
+                sources.append(passage.source)
+
+        text = "\n\n".join(sections)
+        return PackedContext(
+            text=text,
+            sources=sources,
+            candidates=len(candidates),
+            duplicates=len(candidates) - len(passages),
+            passages=len(sections),
+            truncated=truncated,
+            retrieved_tokens=retrieved_tokens,
+            context_tokens=self.count_tokens(text),
+        )
+
+
+async def build_context(
+    messages: Sequence[BaseMessage], config: RunnableConfig, step: str
+) -> str:
+    """Build the context of the grader or the generate node from the tool results.
+
+    The statistics of the packed context are reported to the metrics and, as a
+    "context" custom event, to the callbacks of the run.
+
+    Args:
+        messages (Sequence[BaseMessage]): The messages of the graph state.
+        config (RunnableConfig): The run config, holding the context budget. Without
+            a budget the content of the last message is used as is.
+        step (str): The step the context is built for. The grader gets the smaller
+            grader budget.
+
+    Returns:
+        str: The context.
+    """
+    budget = config.get("configurable", {}).get("context_budget")
+    results = tool_results(messages)
+    if budget is None or not results:
+        return messages[-1].content
+    packed = budget.pack(
+        [message.content for message in results],
+        budget.grader_max_tokens if step == "grade_documents" else None,
+    )
+    CONTEXT_TOKENS.inc(packed.retrieved_tokens, step=step, kind="retrieved")
+    CONTEXT_TOKENS.inc(packed.context_tokens, step=step, kind="packed")
+    logger.debug(
+        f"Packed {packed.passages}/{packed.candidates} passages for {step}, "
+        f"saving {packed.saved_tokens} of {packed.retrieved_tokens} tokens"
+    )
+    await adispatch_custom_event("context", packed.stats(), config=config)
+    return packed.text
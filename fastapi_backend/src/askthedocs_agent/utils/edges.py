@@ -3,67 +3,125 @@ This script defines the edges of the agent workflow.
 This module contains the function to check the relevance of retrieved documents to the user question.
 """
 
-from typing import Literal
-from langchain_core.prompts import PromptTemplate
-from langchain_openai import ChatOpenAI
-from fastapi_backend.src.askthedocs_agent.utils.tools import tools
-from pydantic import BaseModel, Field
+from collections.abc import Sequence
+from typing import Literal, Optional
+from langchain_core.messages import BaseMessage, HumanMessage
+from langchain_core.runnables import RunnableConfig
 from loguru import logger
+from fastapi_backend.src.askthedocs_agent.utils.context import (
+    build_context,
+    tool_results,
+)
+from fastapi_backend.src.askthedocs_agent.utils.history import latest_question
+from fastapi_backend.src.askthedocs_agent.utils.rerankers import (
+    NOT_RELEVANT,
+    RELEVANT,
+)
 
+# Rewrites of the question in one turn, after which the answer is generated from
+# the last results instead of searching again
+MAX_REWRITES = 2
 
-def grade_documents(state) -> Literal["generate", "rewrite"]:
+
+def count_rewrites(messages: Sequence[BaseMessage]) -> int:
+    """Count the rewrites of the question in the current turn.
+
+    Args:
+        messages (Sequence[BaseMessage]): The messages of the graph state.
+
+    Returns:
+        int: The number of searches since the question, less the first one.
     """
-    Determines whether the retrieved documents are relevant to the question.
+    searches = 0
+    for message in reversed(messages):
+        if isinstance(message, HumanMessage):
+            break
+        if getattr(message, "tool_calls", None):
+            searches += 1
+    return max(searches - 1, 0)
+
+
+def rewrite_or_generate(
+    messages: Sequence[BaseMessage],
+) -> Literal["generate", "rewrite"]:
+    """Rewrite the question, unless it was rewritten MAX_REWRITES times already.
 
     Args:
-        state (messages): The current state
+        messages (Sequence[BaseMessage]): The messages of the graph state.
 
     Returns:
-        str: A decision for whether the documents are relevant or not
+        str: "rewrite", or "generate" once the rewrites are used up.
     """
+    if count_rewrites(messages) >= MAX_REWRITES:
+        logger.debug("---DECISION: REWRITES USED UP, GENERATE---")
+        return "generate"
+    return "rewrite"
+
 
-    logger.info("---CHECK RELEVANCE---")
+def reranker_decision(messages: Sequence[BaseMessage]) -> Optional[str]:
+    """Get the relevance decision the rerankers made for the last tool calls.
 
-    # Data model
-    class grade(BaseModel):
-        """Binary score for relevance check."""
+    Args:
+        messages (Sequence[BaseMessage]): The messages of the graph state.
 
-        binary_score: str = Field(description="Relevance score 'yes' or 'no'")
+    Returns:
+        Optional[str]: "relevant" or "not_relevant" if every tool result carries
+            that decision, or None if the LLM grader should decide.
+    """
+    decisions = set()
+    for message in tool_results(messages):
+        artifact = getattr(message, "artifact", None)
+        decision = artifact.get("relevance") if isinstance(artifact, dict) else None
+        if decision is None:
+            return None
+        decisions.add(decision)
+    return decisions.pop() if len(decisions) == 1 else None
+
+
+async def grade_documents(
+    state, config: RunnableConfig
+) -> Literal["generate", "rewrite"]:
+    """
+    Determines whether the retrieved documents are relevant to the question.
+    When the reranker of the search_vector_store tool is confident about the
+    relevance, its decision is used and the LLM grader is skipped. After several
+    tool calls, it is only skipped if the rerankers of all of them agree.
+    Irrelevant documents lead to a rewrite, at most MAX_REWRITES times per turn.
 
-    # LLM
-    model = ChatOpenAI(temperature=0, model="gpt-4o", streaming=True)
+    Args:
+        state (messages): The current state
+        config (RunnableConfig): The run config holding the model registry
 
-    # LLM with tool and validation
-    llm_with_tool = model.bind_tools(tools=tools).with_structured_output(grade)
+    Returns:
+        str: A decision for whether the documents are relevant or not
+    """
 
-    # Prompt
-    prompt = PromptTemplate(
-        template="""You are a grader assessing relevance of a retrieved document to a user question. \n
-        Here is the retrieved document: \n\n {context} \n\n
-        Here is the user question: {question} \n
-        If the document contains keyword(s) or semantic meaning related to the user question, grade it as relevant. \n
-        Give a binary score 'yes' or 'no' score to indicate whether the document is relevant to the question.""",
-        input_variables=["context", "question"],
-    )
+    logger.debug("---CHECK RELEVANCE---")
 
     # Chain
-    chain = prompt | llm_with_tool
+    chain = config["configurable"]["models"].grade_chain
 
     messages = state["messages"]
-    last_message = messages[-1]
 
-    question = messages[0].content
-    docs = last_message.content
+    question = latest_question(messages)
+
+    relevance = reranker_decision(messages)
+    if relevance == RELEVANT:
+        logger.debug("---DECISION: DOCS RELEVANT (RERANKER)---")
+        return "generate"
+    if relevance == NOT_RELEVANT:
+        logger.debug("---DECISION: DOCS NOT RELEVANT (RERANKER)---")
+        return rewrite_or_generate(messages)
 
-    scored_result = chain.invoke({"question": question, "context": docs})
+    docs = await build_context(messages, config, "grade_documents")
+    scored_result = await chain.ainvoke({"question": question, "context": docs})
 
     score = scored_result.binary_score
 
     if score == "yes":
-        logger.info("---DECISION: DOCS RELEVANT---")
+        logger.debug("---DECISION: DOCS RELEVANT---")
         return "generate"
 
     else:
-        logger.info("---DECISION: DOCS NOT RELEVANT---")
-        logger.info(score)
-        return "rewrite"
+        logger.debug("---DECISION: DOCS NOT RELEVANT---")
+        return rewrite_or_generate(messages)
@@ -0,0 +1,315 @@
+"""
+This script defines the history policy of the agent workflow.
+This module contains the policy that bounds the conversation history sent to the agent
+model: tool outputs are elided, older turns fall out of a sliding window into a rolling
+summary, and the remaining history is kept within a token budget.
+"""
+
+from collections import OrderedDict
+from collections.abc import Sequence
+from dataclasses import dataclass, field
+from typing import Optional
+
+import tiktoken
+from langchain_core.messages import (
+    AIMessage,
+    BaseMessage,
+    HumanMessage,
+    SystemMessage,
+    ToolMessage,
+)
+from langchain_core.runnables import Runnable
+from loguru import logger
+
+from fastapi_backend.src.askthedocs_agent.utils.context import parse_passages
+from fastapi_backend.src.askthedocs_agent.utils.tracing import message_usage
+from fastapi_backend.src.metrics import HISTORY_SUMMARIES, HISTORY_TOKENS
+
+# Tag of the summarizer calls, whose tokens are not streamed to the client
+SUMMARY_TAG = "history_summary"
+# Tokens of the role and separators of every message, as counted by OpenAI
+MESSAGE_OVERHEAD_TOKENS = 4
+# Messages whose token counts are kept, so that a thread is only counted once
+TOKEN_CACHE_SIZE = 10_000
+
+# A turn is a list of (index in the thread, message) pairs
+Turn = list[tuple[int, BaseMessage]]
+
+
+@dataclass
+class PreparedHistory:
+    """The messages sent to the agent model and the summary state of the thread."""
+
+    messages: list[BaseMessage]
+    summary: str
+    summarized_messages: int
+    full_tokens: int = 0
+    tokens: int = 0
+    usage: dict = field(default_factory=dict)
+
+    @property
+    def saved_tokens(self) -> int:
+        return max(self.full_tokens - self.tokens, 0)
+
+
+def latest_question(messages: Sequence[BaseMessage]) -> str:
+    """Get the question of the current turn.
+
+    Args:
+        messages (Sequence[BaseMessage]): The messages of the graph state.
+
+    Returns:
+        str: The content of the last human message, or of the first message if
+            there is none.
+    """
+    question = next(
+        (
+            message
+            for message in reversed(messages)
+            if isinstance(message, HumanMessage)
+        ),
+        messages[0],
+    )
+    return question.content
+
+
+def elide_tool_output(message: ToolMessage) -> ToolMessage:
+    """Replace the output of a tool call by a short note of what it returned.
+
+    The message is kept, since the tool call of the agent needs its answer.
+
+    Args:
+        message (ToolMessage): The tool message.
+
+    Returns:
+        ToolMessage: A copy with the note as content and without the artifact.
+    """
+    passages = parse_passages(message.content)
+    sources = list(dict.fromkeys(p.source for p in passages if p.source))
+    note = f"[{len(passages)} results elided"
+    if sources:
+        note += f", from {', '.join(sources[:3])}"
+    return message.model_copy(update={"content": note + "]", "artifact": None})
+
+
+def split_turns(messages: Sequence[BaseMessage], start: int = 0) -> list[Turn]:
+    """Split the messages of a thread into turns, each starting with a question.
+
+    System messages are left out, since the router sends one with every turn.
+
+    Args:
+        messages (Sequence[BaseMessage]): The messages of the thread.
+        start (int): The index of the first message to split. Defaults to 0.
+
+    Returns:
+        list[Turn]: The turns, with the index of every message in the thread.
+    """
+    turns: list[Turn] = []
+    for index in range(start, len(messages)):
+        message = messages[index]
+        if isinstance(message, SystemMessage):
+            continue
+        if isinstance(message, HumanMessage) or not turns:
+            turns.append([])
+        turns[-1].append((index, message))
+    return turns
+
+
+def render_turns(turns: Sequence[Turn]) -> str:
+    """Render the questions and answers of turns for the summarizer.
+
+    Args:
+        turns (Sequence[Turn]): The turns.
+
+    Returns:
+        str: One line per question and answer, without the tool calls.
+    """
+    lines = []
+    for turn in turns:
+        for _, message in turn:
+            if isinstance(message, HumanMessage):
+                lines.append(f"User: {message.content}")
+            elif isinstance(message, AIMessage) and message.content:
+                lines.append(f"Assistant: {message.content}")
+    return "\n".join(lines)
+
+
+class HistoryPolicy:
+    def __init__(
+        self,
+        max_tokens: int = 4000,
+        window_turns: int = 4,
+        summary_batch_turns: int = 2,
+        summarize: bool = True,
+        encoding_name: str = "cl100k_base",
+    ):
+        """Initialize the HistoryPolicy.
+
+        Args:
+            max_tokens (int): The tokens the history sent to the agent may use. Older
+                turns are folded into the summary until it fits. Defaults to 4000.
+            window_turns (int): The number of previous turns sent in full, besides
+                the current one. Defaults to 4.
+            summary_batch_turns (int): Fold turns into the summary once this many
+                have left the window, so that it is not rewritten on every turn.
+                Defaults to 2.
+            summarize (bool): Summarize the folded turns. Without a summary they are
+                left out of the prompt, but stay in the thread. Defaults to True.
+            encoding_name (str): The tiktoken encoding used to count tokens.
+                Defaults to "cl100k_base".
+        """
+        self.max_tokens = max_tokens
+        self.window_turns = window_turns
+        self.summary_batch_turns = max(summary_batch_turns, 1)
+        self.summarize = summarize
+        self.encoding = tiktoken.get_encoding(encoding_name)
+        self._token_cache: OrderedDict[tuple[str, int], int] = OrderedDict()
+
+    def _message_tokens(self, message: BaseMessage) -> int:
+        text = str(message.content)
+        for tool_call in getattr(message, "tool_calls", None) or []:
+            text += f"{tool_call['name']}{tool_call['args']}"
+        # The messages of a thread keep their ID, and an elided tool output is
+        # shorter than the original, so the ID and length identify the content
+        key = (message.id, len(text)) if message.id else None
+        if key in self._token_cache:
+            self._token_cache.move_to_end(key)
+            return self._token_cache[key]
+        tokens = MESSAGE_OVERHEAD_TOKENS + len(
+            self.encoding.encode(text, disallowed_special=())
+        )
+        if key is not None:
+            self._token_cache[key] = tokens
+            if len(self._token_cache) > TOKEN_CACHE_SIZE:
+                self._token_cache.popitem(last=False)
+        return tokens
+
+    def count_tokens(self, messages: Sequence[BaseMessage]) -> int:
+        """Count the tokens of messages, including the tool calls of the agent.
+
+        The count of every message of a thread is cached, so that each turn only
+        tokenizes its new messages.
+
+        Args:
+            messages (Sequence[BaseMessage]): The messages.
+
+        Returns:
+            int: The number of tokens.
+        """
+        return sum(self._message_tokens(message) for message in messages)
+
+    async def _summarize(
+        self, summarizer: Runnable, summary: str, turns: Sequence[Turn]
+    ) -> tuple[Optional[str], dict]:
+        try:
+            response = await summarizer.ainvoke(
+                {"summary": summary or "(none)", "conversation": render_turns(turns)},
+                config={"tags": [SUMMARY_TAG]},
+            )
+        except Exception as e:
+            # Keep the old summary rather than failing the turn
+            logger.error(f"Failed to summarize the conversation: {e}")
+            return None, {}
+        HISTORY_SUMMARIES.inc()
+        return response.content, message_usage(response)
+
+    async def prepare(
+        self,
+        messages: Sequence[BaseMessage],
+        summary: str = "",
+        summarized_messages: int = 0,
+        summarizer: Optional[Runnable] = None,
+    ) -> PreparedHistory:
+        """Build the messages sent to the agent model from the thread.
+
+        The latest system message comes first, followed by the summary of the
+        earlier conversation, the previous turns in the window and the current
+        turn. Tool outputs are replaced by a short note, since the agent only needs
+        to know that a search was made: the grader and the generate node read them
+        from the state.
+
+        Args:
+            messages (Sequence[BaseMessage]): The messages of the thread.
+            summary (str): The summary of the thread so far. Defaults to "".
+            summarized_messages (int): The number of leading messages the summary
+                covers. Defaults to 0.
+            summarizer (Runnable, optional): The chain that extends the summary with
+                the folded turns. Defaults to None, which leaves them out of the
+                prompt without summarizing them.
+
+        Returns:
+            PreparedHistory: The messages and the new summary state of the thread.
+        """
+        system = next(
+            (m for m in reversed(messages) if isinstance(m, SystemMessage)), None
+        )
+        head = [system] if system is not None else []
+        turns = [
+            [
+                (index, elide_tool_output(m) if isinstance(m, ToolMessage) else m)
+                for index, m in turn
+            ]
+            for turn in split_turns(messages, summarized_messages)
+        ]
+        if not turns:
+            return PreparedHistory(head, summary, summarized_messages)
+        previous, current = turns[:-1], turns[-1]
+
+        def summary_messages(summary: str) -> list[BaseMessage]:
+            if not summary:
+                return []
+            return [SystemMessage(f"Summary of the earlier conversation:\n{summary}")]
+
+        def history(fold: int, summary: str) -> list[BaseMessage]:
+            kept = [
+                message for turn in [*previous[fold:], current] for _, message in turn
+            ]
+            return [*head, *summary_messages(summary), *kept]
+
+        # Fold the turns that left the window in batches, then older turns until
+        # the history fits the budget. The current turn is always sent. Each turn
+        # is counted once, and folding it takes its tokens off the total.
+        turn_tokens = [
+            self.count_tokens([message for _, message in turn]) for turn in previous
+        ]
+        overflow = len(previous) - self.window_turns
+        fold = overflow if overflow >= self.summary_batch_turns else 0
+        tokens = (
+            self.count_tokens([*head, *summary_messages(summary)])
+            + sum(turn_tokens[fold:])
+            + self.count_tokens([message for _, message in current])
+        )
+        while fold < len(previous) and tokens > self.max_tokens:
+            tokens -= turn_tokens[fold]
+            fold += 1
+
+        # The summary only moves past the folded turns once it covers them, so no
+        # turn is lost when the summarizer fails or summarizing is disabled
+        usage = {}
+        if fold and self.summarize and summarizer is not None:
+            new_summary, usage = await self._summarize(
+                summarizer, summary, previous[:fold]
+            )
+            if new_summary is None:
+                # Send the turns again, and fold them on the next turn
+                fold = 0
+            else:
+                summary = new_summary
+                summarized_messages = (previous[fold:] or [current])[0][0][0]
+
+        prepared = history(fold, summary)
+        result = PreparedHistory(
+            messages=prepared,
+            summary=summary,
+            summarized_messages=summarized_messages,
+            full_tokens=self.count_tokens(messages),
+            tokens=self.count_tokens(prepared),
+            usage=usage,
+        )
+        HISTORY_TOKENS.inc(result.full_tokens, kind="full")
+        HISTORY_TOKENS.inc(result.tokens, kind="sent")
+        logger.debug(
+            f"Sending {len(prepared)}/{len(messages)} messages to the agent, "
+            f"saving {result.saved_tokens} of {result.full_tokens} tokens"
+        )
+        return result
@@ -0,0 +1,85 @@
+"""
+This script defines the model registry of the agent workflow.
+This module builds the chat models and chains used by the nodes and edges once, so that
+every graph step reuses the same pooled HTTP clients and pre-bound chains.
+"""
+
+import httpx
+from langchain_openai import ChatOpenAI
+from pydantic import BaseModel, Field
+
+from fastapi_backend.src.askthedocs_agent.utils.prompts import (
+    GENERATE_PROMPT,
+    GRADE_PROMPT,
+    SUMMARY_PROMPT,
+)
+from fastapi_backend.src.askthedocs_agent.utils.tools import tools
+
+
+class Grade(BaseModel):
+    """Binary score for relevance check."""
+
+    binary_score: str = Field(description="Relevance score 'yes' or 'no'")
+
+
+class ModelRegistry:
+    def __init__(
+        self,
+        agent_model: str = "gpt-4o-mini",
+        rewrite_model: str = "gpt-4-0125-preview",
+        generate_model: str = "gpt-4o-mini",
+        grader_model: str = "gpt-4o",
+        summary_model: str = "gpt-4o-mini",
+        temperature: float = 0.0,
+        timeout: float = 60.0,
+        max_retries: int = 2,
+        max_connections: int = 20,
+        max_keepalive_connections: int = 10,
+    ):
+        """Initialize the ModelRegistry and build every model and chain once.
+
+        Args:
+            agent_model (str): The model that decides whether to retrieve. Defaults to "gpt-4o-mini".
+            rewrite_model (str): The model that rewrites the question. Defaults to "gpt-4-0125-preview".
+            generate_model (str): The model that generates the answer. Defaults to "gpt-4o-mini".
+            grader_model (str): The model that grades the retrieved documents. Defaults to "gpt-4o".
+            summary_model (str): The model that summarizes long threads. Defaults to "gpt-4o-mini".
+            temperature (float): The sampling temperature of every model. Defaults to 0.0.
+            timeout (float): The request timeout in seconds. Defaults to 60.0.
+            max_retries (int): The number of retries of a failed request. Defaults to 2.
+            max_connections (int): The size of the shared connection pool. Defaults to 20.
+            max_keepalive_connections (int): The number of idle connections kept
+                alive. Defaults to 10.
+        """
+        limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+        )
+        self.http_client = httpx.Client(limits=limits, timeout=timeout)
+        self.http_async_client = httpx.AsyncClient(limits=limits, timeout=timeout)
+
+        def chat_model(model: str) -> ChatOpenAI:
+            return ChatOpenAI(
+                model=model,
+                temperature=temperature,
+                streaming=True,
+                # Report token usage on streamed responses, for the traces
+                stream_usage=True,
+                timeout=timeout,
+                max_retries=max_retries,
+                http_client=self.http_client,
+                http_async_client=self.http_async_client,
+            )
+
+        self.agent = chat_model(agent_model).bind_tools(tools)
+        self.rewriter = chat_model(rewrite_model)
+        self.generate_chain = GENERATE_PROMPT | chat_model(generate_model)
+        self.grade_chain = GRADE_PROMPT | chat_model(grader_model).bind_tools(
+            tools=tools
+        ).with_structured_output(Grade)
+        self.summarizer = SUMMARY_PROMPT | chat_model(summary_model)
+
+    async def aclose(self):
+        """Close the shared HTTP clients."""
+        self.http_client.close()
+        await self.http_async_client.aclose()
@@ -1,107 +1,115 @@
 """
 This script defines the nodes of the agent workflow.
 This module contains the function to invoke the agent model, re-write the question, and generate an answer.
+Every node adds the token usage of its model call to the usage of the thread.
 """
 
 from loguru import logger
 from langchain import hub
 from langchain_core.messages import HumanMessage
-from langchain_openai import ChatOpenAI
-from fastapi_backend.src.askthedocs_agent.utils.tools import tools
-from langchain_core.prompts import PromptTemplate
+from langchain_core.runnables import RunnableConfig
+from fastapi_backend.src.askthedocs_agent.utils.context import build_context
+from fastapi_backend.src.askthedocs_agent.utils.history import latest_question
+from fastapi_backend.src.askthedocs_agent.utils.prompts import rewrite_prompt
+from fastapi_backend.src.askthedocs_agent.utils.state import add_usage
+from fastapi_backend.src.askthedocs_agent.utils.tracing import message_usage
 
 
-def agent(state):
+async def agent(state, config: RunnableConfig):
     """
     Invokes the agent model to generate a response based on the current state. Given
     the question, it will decide to retrieve using the retriever tool, or simply end.
 
     Args:
         state (messages): The current state
+        config (RunnableConfig): The run config holding the model registry
 
     Returns:
         dict: The updated state with the agent response appended to messages
     """
-    print("---CALL AGENT---")
+    logger.debug("---CALL AGENT---")
     messages = state["messages"]
-    model = ChatOpenAI(temperature=0, streaming=True, model="gpt-4o-mini")
-    model = model.bind_tools(tools)
-    response = model.invoke(messages)
+    models = config["configurable"]["models"]
+    history_policy = config["configurable"].get("history_policy")
+    update = {}
+    usage = {}
+    if history_policy is not None:
+        # Bound the history of long threads before it is sent to the model
+        history = await history_policy.prepare(
+            messages,
+            summary=state.get("summary", ""),
+            summarized_messages=state.get("summarized_messages", 0),
+            summarizer=models.summarizer,
+        )
+        messages = history.messages
+        update = {
+            "summary": history.summary,
+            "summarized_messages": history.summarized_messages,
+        }
+        usage = add_usage(
+            history.usage,
+            {
+                "history_tokens": history.tokens,
+                "history_saved_tokens": history.saved_tokens,
+            },
+        )
+    response = await models.agent.ainvoke(messages)
     # We return a list, because this will get added to the existing list
-    return {"messages": [response]}
+    return {
+        "messages": [response],
+        **update,
+        "usage": add_usage(usage, message_usage(response)),
+    }
 
 
-def rewrite(state):
+async def rewrite(state, config: RunnableConfig):
     """
     Transform the query to produce a better question.
 
     Args:
         state (messages): The current state
+        config (RunnableConfig): The run config holding the model registry
 
     Returns:
         dict: The updated state with re-phrased question
     """
 
-    logger.info("---TRANSFORM QUERY---")
+    logger.debug("---TRANSFORM QUERY---")
     messages = state["messages"]
-    question = messages[0].content
-
-    msg = [
-        HumanMessage(
-            content=f""" \n
-    Look at the input and try to reason about the underlying semantic intent / meaning. \n
-    Here is the initial question:
-    \n ------- \n
-    {question}
-    \n ------- \n
-    Formulate an improved question: """,
-        )
-    ]
+    question = latest_question(messages)
+
+    msg = [HumanMessage(content=rewrite_prompt(question))]
 
     # Grader
-    model = ChatOpenAI(temperature=0, model="gpt-4-0125-preview", streaming=True)
-    response = model.invoke(msg)
-    return {"messages": [response]}
+    model = config["configurable"]["models"].rewriter
+    response = await model.ainvoke(msg)
+    return {"messages": [response], "usage": message_usage(response)}
 
 
-def generate(state):
+async def generate(state, config: RunnableConfig):
     """
     Generate answer
 
     Args:
         state (messages): The current state
+        config (RunnableConfig): The run config holding the model registry
 
     Returns:
          dict: The updated state with re-phrased question
     """
-    print("---GENERATE---")
+    logger.debug("---GENERATE---")
     messages = state["messages"]
-    question = messages[0].content
-    last_message = messages[-1]
-
-    docs = last_message.content
-
-    # Prompt
-    prompt = PromptTemplate.from_template("""
-You are an assistant for question-answering tasks. Use the following pieces of retrieved context to answer the question. If you don't know the answer, just say that you don't know.
-Question: {question}
-Context: {context}
-Answer:
-""")
-
-    # LLM
-    llm = ChatOpenAI(model_name="gpt-4o-mini", temperature=0, streaming=True)
+    question = latest_question(messages)
 
-    # Post-processing
-    def format_docs(docs):
-        return "\n\n".join(doc.page_content for doc in docs)
+    # The tool results, cleaned and packed into the context budget
+    docs = await build_context(messages, config, "generate")
 
     # Chain
-    rag_chain = prompt | llm
+    rag_chain = config["configurable"]["models"].generate_chain
 
     # Run
-    response = rag_chain.invoke({"context": docs, "question": question})
-    return {"messages": [response]}
+    response = await rag_chain.ainvoke({"context": docs, "question": question})
+    return {"messages": [response], "usage": message_usage(response)}
 
 
 if __name__ == "__main__":
@@ -0,0 +1,50 @@
+"""
+This script defines the prompts of the agent workflow.
+This module contains the prompt templates used by the grader, the generate node and the
+summary of long conversations.
+"""
+
+from langchain_core.prompts import PromptTemplate
+
+GRADE_PROMPT = PromptTemplate(
+    template="""You are a grader assessing relevance of a retrieved document to a user question. \n
+        Here is the retrieved document: \n\n {context} \n\n
+        Here is the user question: {question} \n
+        If the document contains keyword(s) or semantic meaning related to the user question, grade it as relevant. \n
+        Give a binary score 'yes' or 'no' score to indicate whether the document is relevant to the question.""",
+    input_variables=["context", "question"],
+)
+
+GENERATE_PROMPT = PromptTemplate.from_template("""
+You are an assistant for question-answering tasks. Use the following pieces of retrieved context to answer the question. If you don't know the answer, just say that you don't know.
+Question: {question}
+Context: {context}
+Answer:
+""")
+
+SUMMARY_PROMPT = PromptTemplate.from_template("""
+You are summarizing a conversation between a user and a documentation assistant, so that it can continue without the full history.
+Extend the current summary with the new turns. Keep the questions asked, the facts and answers given, the sources cited and any open follow-ups. Be concise.
+Current summary: {summary}
+New turns:
+{conversation}
+Summary:
+""")
+
+
+def rewrite_prompt(question: str) -> str:
+    """Build the prompt that asks the model to improve a question.
+
+    Args:
+        question (str): The initial question.
+
+    Returns:
+        str: The prompt.
+    """
+    return f""" \n
+    Look at the input and try to reason about the underlying semantic intent / meaning. \n
+    Here is the initial question:
+    \n ------- \n
+    {question}
+    \n ------- \n
+    Formulate an improved question: """
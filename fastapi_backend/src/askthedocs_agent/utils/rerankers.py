@@ -0,0 +1,229 @@
+"""
+This script defines the rerankers used by the search_vector_store tool.
+This module contains a lexical reranker and a cross-encoder reranker that reorder an
+over-fetched list of candidates, and decide whether the LLM grader can be skipped.
+"""
+
+import asyncio
+import math
+import re
+import threading
+from abc import ABC, abstractmethod
+from collections import Counter
+from typing import Optional
+
+from fastembed.rerank.cross_encoder import TextCrossEncoder
+from loguru import logger
+
+RELEVANT = "relevant"
+NOT_RELEVANT = "not_relevant"
+
+# Identifiers like set_sparse_model, qdrant_client.models or x-api-key are kept
+# whole, and their parts are added as separate tokens.
+TOKEN_PATTERN = re.compile(r"[a-z0-9_]+(?:[.\-][a-z0-9_]+)*")
+STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from how i in is it of on or the "
+    "this to use what when where which who why with you your".split()
+)
+
+
+def tokenize(text: str) -> list[str]:
+    """Split text into lower-case terms, keeping identifiers and their parts.
+
+    Args:
+        text (str): The text.
+
+    Returns:
+        list[str]: The terms of the text without stopwords.
+    """
+    tokens = []
+    for token in TOKEN_PATTERN.findall(text.lower()):
+        parts = [part for part in re.split(r"[._\-]", token) if part]
+        tokens.extend(parts if len(parts) == 1 else [token, *parts])
+    return [token for token in tokens if token not in STOPWORDS]
+
+
+# A cross-encoder probability at or above this counts as relevant without the grader
+CROSS_ENCODER_HIGH_CONFIDENCE = 0.8
+
+
+class Reranker(ABC):
+    def __init__(
+        self,
+        candidates: int = 20,
+        top_n: int = 3,
+        high_confidence: Optional[float] = None,
+        low_confidence: Optional[float] = None,
+    ):
+        """Initialize the Reranker.
+
+        Args:
+            candidates (int): The number of results fetched from the retriever.
+                Defaults to 20.
+            top_n (int): The number of reranked results passed on. Defaults to 3.
+            high_confidence (float, optional): A top score at or above this value
+                counts as relevant without asking the LLM grader. Defaults to None,
+                which leaves high scores to the grader: a lexical score of 1 only
+                means that every query term matched.
+            low_confidence (float, optional): A top score at or below this value
+                counts as not relevant without asking the LLM grader. Defaults to
+                None, which leaves low scores to the grader: a lexical score of 0
+                only means that no query term matched.
+        """
+        self.candidates = candidates
+        self.top_n = top_n
+        self.high_confidence = high_confidence
+        self.low_confidence = low_confidence
+
+    @abstractmethod
+    def score(self, query: str, documents: list[str]) -> list[float]:
+        """Score the relevance of each document to the query.
+
+        Args:
+            query (str): The search query.
+            documents (list[str]): The candidate documents.
+
+        Returns:
+            list[float]: A score between 0 and 1 for each document.
+        """
+
+    def decide(self, top_score: Optional[float]) -> Optional[str]:
+        """Decide the relevance of the results from the best score, if confident.
+
+        Args:
+            top_score (float, optional): The best rerank score, or None without results.
+
+        Returns:
+            Optional[str]: "relevant", "not_relevant", or None if the LLM grader
+                should decide.
+        """
+        if top_score is None:
+            return NOT_RELEVANT
+        if self.high_confidence is not None and top_score >= self.high_confidence:
+            return RELEVANT
+        if self.low_confidence is not None and top_score <= self.low_confidence:
+            return NOT_RELEVANT
+        return None
+
+    async def rerank(self, query: str, results: list[dict]) -> tuple[list[dict], dict]:
+        """Reorder the candidates by rerank score and keep the best ones.
+
+        Args:
+            query (str): The search query.
+            results (list[dict]): The candidates from the retriever.
+
+        Returns:
+            tuple[list[dict], dict]: The top results with their rerank_score, and a
+                summary with the top score and the relevance decision.
+        """
+        scores = (
+            await asyncio.to_thread(
+                self.score, query, [result.get("document", "") for result in results]
+            )
+            if results
+            else []
+        )
+        ranked = sorted(
+            zip(scores, results),
+            key=lambda item: (item[0], item[1].get("score", 0.0)),
+            reverse=True,
+        )[: self.top_n]
+        top_score = ranked[0][0] if ranked else None
+        summary = {
+            "candidates": len(results),
+            "top_score": top_score,
+            "relevance": self.decide(top_score),
+        }
+        logger.info(f"Reranked {len(results)} candidates: {summary}")
+        return [{**result, "rerank_score": score} for score, result in ranked], summary
+
+
+class LexicalReranker(Reranker):
+    """Scores documents by the share of the query's IDF-weighted terms they contain."""
+
+    def score(self, query: str, documents: list[str]) -> list[float]:
+        query_terms = set(tokenize(query))
+        document_terms = [set(tokenize(document)) for document in documents]
+        if not query_terms:
+            # Nothing to match on, so leave the decision to the grader
+            return [0.5] * len(documents)
+
+        document_frequency = Counter(
+            term for terms in document_terms for term in terms & query_terms
+        )
+        total = len(documents)
+        idf = {
+            term: math.log(
+                1
+                + (total - document_frequency[term] + 0.5)
+                / (document_frequency[term] + 0.5)
+            )
+            for term in query_terms
+        }
+        weight = sum(idf.values())
+        return [
+            sum(idf[term] for term in query_terms & terms) / weight
+            for terms in document_terms
+        ]
+
+
+class CrossEncoderReranker(Reranker):
+    def __init__(
+        self,
+        model_name: str = "Xenova/ms-marco-MiniLM-L-6-v2",
+        high_confidence: Optional[float] = CROSS_ENCODER_HIGH_CONFIDENCE,
+        **kwargs,
+    ):
+        """Initialize the CrossEncoderReranker with a fastembed cross-encoder.
+
+        The model runs on the CPU and is loaded on first use. Its scores are
+        calibrated probabilities, so a high one skips the LLM grader by default.
+
+        Args:
+            model_name (str): The fastembed cross-encoder model. Defaults to
+                "Xenova/ms-marco-MiniLM-L-6-v2".
+            high_confidence (float, optional): See Reranker. Defaults to
+                CROSS_ENCODER_HIGH_CONFIDENCE.
+            **kwargs: The arguments of Reranker.
+        """
+        super().__init__(high_confidence=high_confidence, **kwargs)
+        self.model_name = model_name
+        self._model: Optional[TextCrossEncoder] = None
+        self._model_lock = threading.Lock()
+
+    def _get_model(self) -> TextCrossEncoder:
+        with self._model_lock:
+            if self._model is None:
+                self._model = TextCrossEncoder(model_name=self.model_name)
+        return self._model
+
+    def score(self, query: str, documents: list[str]) -> list[float]:
+        logits = self._get_model().rerank(query, documents)
+        return [1 / (1 + math.exp(-logit)) for logit in logits]
+
+
+def create_reranker(kind: str, **kwargs) -> Optional[Reranker]:
+    """Create the reranker selected in the settings.
+
+    Args:
+        kind (str): "lexical", "cross-encoder", or "none" to disable reranking.
+        **kwargs: The arguments of the reranker. A high_confidence of None keeps
+            the default of the reranker, so only the cross-encoder skips the
+            grader unless a threshold is set.
+
+    Returns:
+        Optional[Reranker]: The reranker, or None if reranking is disabled.
+
+    Raises:
+        ValueError: If the kind is unknown.
+    """
+    if kind == "none":
+        return None
+    if kwargs.get("high_confidence") is None:
+        kwargs.pop("high_confidence", None)
+    if kind == "lexical":
+        kwargs.pop("model_name", None)
+        return LexicalReranker(**kwargs)
+    if kind == "cross-encoder":
+        return CrossEncoderReranker(**kwargs)
+    raise ValueError(f"Unknown reranker: {kind}")
@@ -0,0 +1,312 @@
+"""
+This script defines the retrievers used by the search_vector_store tool.
+This module contains an in-process retriever that calls the VectorStore directly, an
+HTTP retriever that calls the /vector-store/search endpoint of a separate backend, and a
+fan-out retriever that searches several collections and the web concurrently.
+"""
+
+import asyncio
+import re
+import time
+from collections.abc import Awaitable, Callable, Sequence
+from itertools import zip_longest
+from typing import Optional, Protocol
+
+import httpx
+from loguru import logger
+
+from fastapi_backend.src.metrics import FANOUT_SOURCE_SECONDS, FANOUT_SOURCES
+
+# Name of the web search source in the fan-out results
+WEB_SOURCE = "web"
+
+
+class Retriever(Protocol):
+    async def search(
+        self, collection_name: str, query: str, limit: Optional[int] = None
+    ) -> list[dict]:
+        """Search a collection for documents relevant to the query."""
+        ...
+
+    async def close(self):
+        """Release the resources held by the retriever."""
+        ...
+
+
+class LocalRetriever:
+    def __init__(
+        self,
+        vector_store,
+        limit: int = 3,
+        score_threshold: Optional[float] = None,
+        max_document_chars: Optional[int] = 2000,
+    ):
+        """Initialize the LocalRetriever with the VectorStore of this process.
+
+        Args:
+            vector_store: The vector store instance to search.
+            limit (int): The number of results per search. Defaults to 3.
+            score_threshold (float, optional): Drop results scoring below this value.
+            max_document_chars (int, optional): Truncate the returned documents to
+                this many characters. Defaults to 2000.
+        """
+        self.vector_store = vector_store
+        self.limit = limit
+        self.score_threshold = score_threshold
+        self.max_document_chars = max_document_chars
+
+    async def search(
+        self, collection_name: str, query: str, limit: Optional[int] = None
+    ) -> list[dict]:
+        """Search the vector store in-process.
+
+        Args:
+            collection_name (str): The name of the collection to search in.
+            query (str): The search query.
+            limit (int, optional): The number of results, e.g. to over-fetch
+                candidates for reranking. Defaults to the retriever's limit.
+
+        Returns:
+            list[dict]: The search results.
+        """
+        results = await self.vector_store.search_result(
+            collection_name=collection_name,
+            query=query,
+            limit=limit or self.limit,
+            score_threshold=self.score_threshold,
+            max_document_chars=self.max_document_chars,
+        )
+        return [result.model_dump() for result in results]
+
+    async def close(self):
+        """The vector store is owned by the application, so there is nothing to close."""
+
+
+class HttpRetriever:
+    def __init__(
+        self,
+        base_url: str,
+        timeout: float = 30.0,
+        max_connections: int = 20,
+        max_keepalive_connections: int = 10,
+        limit: int = 3,
+        score_threshold: Optional[float] = None,
+        max_document_chars: Optional[int] = 2000,
+    ):
+        """Initialize the HttpRetriever with a pooled async HTTP client.
+
+        Use this retriever when the vector store is served by a separate deployment.
+
+        Args:
+            base_url (str): The URL of the backend that serves /vector-store/search.
+            timeout (float): The request timeout in seconds. Defaults to 30.0.
+            max_connections (int): The size of the connection pool. Defaults to 20.
+            max_keepalive_connections (int): The number of idle connections kept
+                alive. Defaults to 10.
+            limit (int): The number of results per search. Defaults to 3.
+            score_threshold (float, optional): Drop results scoring below this value.
+            max_document_chars (int, optional): Truncate the returned documents to
+                this many characters. Defaults to 2000.
+        """
+        self.limit = limit
+        self.score_threshold = score_threshold
+        self.max_document_chars = max_document_chars
+        self.client = httpx.AsyncClient(
+            base_url=base_url,
+            timeout=timeout,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive_connections,
+            ),
+        )
+
+    async def search(
+        self, collection_name: str, query: str, limit: Optional[int] = None
+    ) -> list[dict]:
+        """Search the vector store through the /vector-store/search endpoint.
+
+        Args:
+            collection_name (str): The name of the collection to search in.
+            query (str): The search query.
+            limit (int, optional): The number of results, e.g. to over-fetch
+                candidates for reranking. Defaults to the retriever's limit.
+
+        Returns:
+            list[dict]: The search results.
+        """
+        response = await self.client.post(
+            "/vector-store/search",
+            json={
+                "collection_name": collection_name,
+                "query": query,
+                "limit": limit or self.limit,
+                "score_threshold": self.score_threshold,
+                "max_document_chars": self.max_document_chars,
+            },
+        )
+        response.raise_for_status()
+        return response.json()
+
+    async def close(self):
+        """Close the pooled HTTP client."""
+        await self.client.aclose()
+
+
+def result_key(result: dict) -> tuple:
+    """Identify a search result, to drop the same passage returned by two sources.
+
+    Args:
+        result (dict): The search result.
+
+    Returns:
+        tuple: The source URL and chunk index of the result if known, else its
+            normalized text.
+    """
+    metadata = result.get("metadata") or {}
+    source = metadata.get("source") or metadata.get("sourceURL")
+    if source and "chunk_index" in metadata:
+        return (source, metadata["chunk_index"])
+    return (re.sub(r"\s+", " ", result.get("document", "")).strip().lower(),)
+
+
+class FanOutRetriever:
+    def __init__(
+        self,
+        retriever: Retriever,
+        web_search: Optional[Callable[[str], Awaitable[list[dict]]]] = None,
+        timeout: float = 5.0,
+        web_timeout: float = 10.0,
+        enough_results: Optional[int] = None,
+        min_score: Optional[float] = None,
+        source_top_k: int = 3,
+    ):
+        """Initialize the FanOutRetriever.
+
+        Args:
+            retriever (Retriever): The retriever of the collections.
+            web_search (optional): An async function that searches the web for a
+                query and returns results shaped like the collection results.
+                Defaults to None, which disables web search.
+            timeout (float): The seconds a collection search may take before its
+                results are given up. Defaults to 5.0.
+            web_timeout (float): The seconds the web search may take. Defaults to
+                10.0.
+            enough_results (int, optional): Return as soon as this many results
+                have arrived, and cancel the slower sources. Defaults to None, which
+                waits for every source.
+            min_score (float, optional): Only results scoring at least this value
+                count towards enough_results. Defaults to None.
+            source_top_k (int): Only the best results of each source count towards
+                enough_results, so that one source returning many candidates for the
+                reranker does not cut the others short. Defaults to 3.
+        """
+        self.retriever = retriever
+        self.web_search = web_search
+        self.timeout = timeout
+        self.web_timeout = web_timeout
+        self.enough_results = enough_results
+        self.min_score = min_score
+        self.source_top_k = source_top_k
+
+    async def _search_source(
+        self, source: str, query: str, limit: Optional[int]
+    ) -> list[dict]:
+        if source == WEB_SOURCE:
+            results = await asyncio.wait_for(self.web_search(query), self.web_timeout)
+        else:
+            results = await asyncio.wait_for(
+                self.retriever.search(collection_name=source, query=query, limit=limit),
+                self.timeout,
+            )
+        return [{**result, "origin": source} for result in results]
+
+    def _relevant(self, results: list[dict]) -> int:
+        results = results[: self.source_top_k]
+        if self.min_score is None:
+            return len(results)
+        return sum(result.get("score", 0.0) >= self.min_score for result in results)
+
+    async def search(
+        self,
+        collection_names: Sequence[str],
+        query: str,
+        include_web: bool = False,
+        limit: Optional[int] = None,
+    ) -> tuple[list[dict], dict]:
+        """Search the collections, and the web if asked, concurrently.
+
+        Sources that fail or time out are skipped. The results are interleaved by
+        rank across sources, so that each source contributes its best results
+        first, and results returned by several sources are kept once.
+
+        Args:
+            collection_names (Sequence[str]): The collections to search.
+            query (str): The search query.
+            include_web (bool): Also search the web. Defaults to False.
+            limit (int, optional): The number of results per collection. Defaults
+                to the limit of the retriever.
+
+        Returns:
+            tuple[list[dict], dict]: The merged results, each with the source it
+                came from as "origin", and the status, result count and seconds of
+                every source.
+        """
+        sources = list(dict.fromkeys(collection_names))
+        if include_web and self.web_search is not None:
+            sources.append(WEB_SOURCE)
+        started_at = time.perf_counter()
+        tasks = {
+            asyncio.create_task(self._search_source(source, query, limit)): source
+            for source in sources
+        }
+        results: dict[str, list[dict]] = {}
+        stats: dict[str, dict] = {}
+        pending = set(tasks)
+        try:
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    source = tasks[task]
+                    seconds = time.perf_counter() - started_at
+                    try:
+                        results[source] = task.result()
+                        status = "ok"
+                    except asyncio.TimeoutError:
+                        status = "timeout"
+                    except Exception as e:
+                        logger.error(f"Error searching {source}: {e}")
+                        status = "error"
+                    stats[source] = {
+                        "status": status,
+                        "results": len(results.get(source, [])),
+                        "seconds": seconds,
+                    }
+                relevant = sum(self._relevant(found) for found in results.values())
+                if pending and self.enough_results and relevant >= self.enough_results:
+                    break
+        finally:
+            for task in pending:
+                task.cancel()
+                stats[tasks[task]] = {"status": "cancelled", "results": 0}
+
+        for source, source_stats in stats.items():
+            kind = "web" if source == WEB_SOURCE else "collection"
+            FANOUT_SOURCES.inc(kind=kind, status=source_stats["status"])
+            if "seconds" in source_stats:
+                FANOUT_SOURCE_SECONDS.observe(source_stats["seconds"], kind=kind)
+
+        merged, seen = [], set()
+        ranked = [results[source] for source in sources if source in results]
+        for group in zip_longest(*ranked):
+            for result in group:
+                if result is None or (key := result_key(result)) in seen:
+                    continue
+                seen.add(key)
+                merged.append(result)
+        return merged, {
+            "sources": stats,
+            "early_return": bool(pending),
+            "seconds": time.perf_counter() - started_at,
+        }
@@ -3,7 +3,7 @@ This script defines the state of the agent workflow.
 This module contains the state of the agent, which is a dictionary with messages and collection name.
 """
 
-from typing import Annotated, Sequence
+from typing import Annotated, Optional, Sequence
 from typing_extensions import TypedDict
 
 from langchain_core.messages import BaseMessage
@@ -11,13 +11,34 @@ from langchain_core.messages import BaseMessage
 from langgraph.graph.message import add_messages
 
 
+def add_usage(left: Optional[dict], right: Optional[dict]) -> dict:
+    """Add up the token usage counters of a thread.
+
+    Args:
+        left (dict, optional): The usage so far.
+        right (dict, optional): The usage of a step.
+
+    Returns:
+        dict: The sum of both, key by key.
+    """
+    usage = dict(left or {})
+    for key, value in (right or {}).items():
+        usage[key] = usage.get(key, 0) + value
+    return usage
+
+
 class AgentState(TypedDict):
     """
     The state of the agent workflow. It contains the messages and collection name.
     The messages are a sequence of BaseMessage objects, and the collection name is a string.
+    The summary covers the first summarized_messages messages of long threads, which
+    are no longer sent to the agent model, and usage sums the tokens of the thread.
     """
 
     # The add_messages function defines how an update should be processed
     # Default is to replace. add_messages says "append"
     messages: Annotated[Sequence[BaseMessage], add_messages]
     collection_name: str
+    summary: str
+    summarized_messages: int
+    usage: Annotated[dict, add_usage]
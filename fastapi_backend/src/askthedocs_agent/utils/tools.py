@@ -1,25 +1,22 @@
 """
 This script defines the tools used in the agent workflow.
-This module contains the function to search the vector store for relevant documents.
+This module contains the function to search the vector store for relevant documents,
+and the function to search several collections and the web at once.
 It also includes the TavilySearchResults tool for searching Tavily.
 """
 
 from langchain_community.tools.tavily_search import TavilySearchResults
+from langchain_core.runnables import RunnableConfig
 from langchain_core.tools import tool
 from dotenv import load_dotenv
-import requests
-import os
-from urllib.parse import urljoin
 from loguru import logger
 
 load_dotenv()
 tavily_tool = TavilySearchResults(max_results=2)
 
-FASTAPI_BACKEND = os.getenv("FASTAPI_BACKEND")
 
-
-@tool
-def search_vector_store(collection_name: str, query: str):
+@tool(response_format="content_and_artifact")
+async def search_vector_store(collection_name: str, query: str, config: RunnableConfig):
     """Search the vector store for relevant documents.
 
     Args:
@@ -29,18 +26,95 @@ def search_vector_store(collection_name: str, query: str):
     Returns:
         The search results from the vector store. This includes their metadata which contains the sourceURL.
     """
+    configurable = config.get("configurable", {})
+    retriever = configurable.get("retriever")
+    reranker = configurable.get("reranker")
+    if retriever is None:
+        logger.error("Error in search_vector_store: no retriever configured")
+        return "Error searching vector store: no retriever configured", None
     try:
-        response = requests.post(
-            urljoin(FASTAPI_BACKEND, "/vector-store/search"),
-            json={"collection_name": collection_name, "query": query},
+        if reranker is None:
+            results = await retriever.search(
+                collection_name=collection_name, query=query
+            )
+            return results, None
+        # Over-fetch candidates and keep the best ones after reranking. The
+        # rerank summary is read by grade_documents to skip the LLM grader.
+        candidates = await retriever.search(
+            collection_name=collection_name, query=query, limit=reranker.candidates
         )
-        response.raise_for_status()
-        return response.json()
-    except requests.exceptions.RequestException as e:
-        # Add more detailed logging here
+        return await reranker.rerank(query, candidates)
+    except Exception as e:
         logger.error(f"Error in search_vector_store: {str(e)}")
-        return f"Error searching vector store: {str(e)}"
+        return f"Error searching vector store: {str(e)}", None
+
+
+async def search_web(query: str) -> list[dict]:
+    """Search Tavily and shape the results like the vector store results.
+
+    Args:
+        query (str): The search query.
+
+    Returns:
+        list[dict]: The results, with the page content as document and the URL and
+            title as metadata.
+    """
+    results = await tavily_tool.ainvoke({"query": query})
+    if not isinstance(results, list):
+        # The tool returns the error as a string
+        raise RuntimeError(results)
+    return [
+        {
+            "document": result.get("content", ""),
+            "score": result.get("score", 0.0),
+            "metadata": {"source": result.get("url"), "title": result.get("title")},
+        }
+        for result in results
+    ]
+
+
+@tool(response_format="content_and_artifact")
+async def search_collections(
+    collection_names: list[str],
+    query: str,
+    config: RunnableConfig,
+    include_web: bool = False,
+):
+    """Search several collections, and optionally the web, at once. Use it when the
+    question spans more than one collection.
+
+    Args:
+        collection_names: The names of the collections to search in
+        query: The search query string
+        include_web: Also search the web
+
+    Returns:
+        The merged search results. Their metadata contains the source URL.
+    """
+    configurable = config.get("configurable", {})
+    fanout = configurable.get("fanout_retriever")
+    reranker = configurable.get("reranker")
+    if fanout is None:
+        logger.error("Error in search_collections: no fan-out retriever configured")
+        return "Error searching collections: no fan-out retriever configured", None
+    try:
+        results, summary = await fanout.search(
+            collection_names,
+            query,
+            include_web=include_web,
+            limit=reranker.candidates if reranker is not None else None,
+        )
+        logger.info(f"Searched {len(summary['sources'])} sources: {summary}")
+        if reranker is None:
+            return results, summary
+        # The merged candidates are reranked together, and the rerank decision
+        # is read by grade_documents like for search_vector_store.
+        ranked, rerank_summary = await reranker.rerank(query, results)
+        return ranked, {**summary, **rerank_summary}
+    except Exception as e:
+        logger.error(f"Error in search_collections: {str(e)}")
+        return f"Error searching collections: {str(e)}", None
 
 
 # Update the tools list to include your new tool
-tools = [tavily_tool, search_vector_store]
+tools = [tavily_tool, search_vector_store, search_collections]
@@ -0,0 +1,269 @@
+"""
+This script defines the tracing of the agent workflow.
+This module contains a callback handler that records, for each step of a graph run,
+its wall time, LLM latency, token usage and retrieval size, and reports them to the
+process metrics.
+"""
+
+import json
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import LLMResult
+
+from fastapi_backend.src.metrics import (
+    AGENT_LLM_FIRST_TOKEN_SECONDS,
+    AGENT_LLM_SECONDS,
+    AGENT_RETRIEVED_DOCUMENTS,
+    AGENT_STEP_SECONDS,
+    AGENT_TOKENS,
+)
+
+# The graph nodes and the conditional edge that calls the grader
+TRACED_STEPS = ("agent", "retrieve", "rewrite", "generate", "grade_documents")
+
+
+@dataclass
+class StepTrace:
+    """The accumulated cost of one step of a graph run."""
+
+    step: str
+    calls: int = 0
+    seconds: float = 0.0
+    llm_calls: int = 0
+    llm_seconds: float = 0.0
+    llm_first_token_seconds: Optional[float] = None
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    retrieved_documents: int = 0
+    retrieved_chars: int = 0
+    context_tokens: int = 0
+    context_saved_tokens: int = 0
+
+
+class GraphTracer(BaseCallbackHandler):
+    """Traces one graph run. Pass a new instance in the callbacks of every run.
+
+    The handler runs inline on the event loop and only updates counters, so it is
+    cheap enough to leave on for every request.
+    """
+
+    run_inline = True
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.steps: dict[str, StepTrace] = {}
+        self._run_steps: dict[UUID, str] = {}
+        self._step_starts: dict[UUID, float] = {}
+        self._llm_starts: dict[UUID, float] = {}
+        self._first_tokens: set[UUID] = set()
+
+    def _enter(
+        self, run_id: UUID, parent_run_id: Optional[UUID], step: Optional[str] = None
+    ) -> Optional[str]:
+        step = step or self._run_steps.get(parent_run_id)
+        if step is not None:
+            self._run_steps[run_id] = step
+        return step
+
+    def _step(self, run_id: UUID) -> Optional[StepTrace]:
+        step = self._run_steps.get(run_id)
+        if step is None:
+            return None
+        return self.steps.setdefault(step, StepTrace(step))
+
+    def _exit(self, run_id: UUID):
+        start = self._step_starts.pop(run_id, None)
+        trace = self._step(run_id)
+        self._run_steps.pop(run_id, None)
+        if start is None or trace is None:
+            return
+        seconds = time.perf_counter() - start
+        trace.calls += 1
+        trace.seconds += seconds
+        AGENT_STEP_SECONDS.observe(seconds, step=trace.step)
+
+    def on_chain_start(
+        self,
+        serialized: Optional[dict[str, Any]],
+        inputs: Any,
+        *,
+        run_id: UUID,
+        parent_run_id: Optional[UUID] = None,
+        metadata: Optional[dict[str, Any]] = None,
+        **kwargs: Any,
+    ):
+        name = kwargs.get("name")
+        node = (metadata or {}).get("langgraph_node")
+        if name in TRACED_STEPS and (name == node or name == "grade_documents"):
+            self._enter(run_id, parent_run_id, name)
+            self._step_starts[run_id] = time.perf_counter()
+        else:
+            self._enter(run_id, parent_run_id)
+
+    def on_chain_end(self, outputs: Any, *, run_id: UUID, **kwargs: Any):
+        self._exit(run_id)
+
+    def on_chain_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any):
+        self._exit(run_id)
+
+    def on_chat_model_start(
+        self,
+        serialized: Optional[dict[str, Any]],
+        messages: Any,
+        *,
+        run_id: UUID,
+        parent_run_id: Optional[UUID] = None,
+        **kwargs: Any,
+    ):
+        if self._enter(run_id, parent_run_id) is not None:
+            self._llm_starts[run_id] = time.perf_counter()
+
+    def on_llm_start(
+        self,
+        serialized: Optional[dict[str, Any]],
+        prompts: Any,
+        *,
+        run_id: UUID,
+        parent_run_id: Optional[UUID] = None,
+        **kwargs: Any,
+    ):
+        if self._enter(run_id, parent_run_id) is not None:
+            self._llm_starts[run_id] = time.perf_counter()
+
+    def on_llm_new_token(self, token: str, *, run_id: UUID, **kwargs: Any):
+        if run_id in self._first_tokens or run_id not in self._llm_starts:
+            return
+        self._first_tokens.add(run_id)
+        trace = self._step(run_id)
+        seconds = time.perf_counter() - self._llm_starts[run_id]
+        if trace.llm_first_token_seconds is None:
+            trace.llm_first_token_seconds = seconds
+        AGENT_LLM_FIRST_TOKEN_SECONDS.observe(seconds, step=trace.step)
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any):
+        start = self._llm_starts.pop(run_id, None)
+        self._first_tokens.discard(run_id)
+        trace = self._step(run_id)
+        self._run_steps.pop(run_id, None)
+        if start is None or trace is None:
+            return
+        seconds = time.perf_counter() - start
+        trace.llm_calls += 1
+        trace.llm_seconds += seconds
+        AGENT_LLM_SECONDS.observe(seconds, step=trace.step)
+
+        prompt_tokens, completion_tokens = token_usage(response)
+        trace.prompt_tokens += prompt_tokens
+        trace.completion_tokens += completion_tokens
+        AGENT_TOKENS.inc(prompt_tokens, step=trace.step, kind="prompt")
+        AGENT_TOKENS.inc(completion_tokens, step=trace.step, kind="completion")
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any):
+        self._llm_starts.pop(run_id, None)
+        self._first_tokens.discard(run_id)
+        self._run_steps.pop(run_id, None)
+
+    def on_tool_start(
+        self,
+        serialized: Optional[dict[str, Any]],
+        input_str: str,
+        *,
+        run_id: UUID,
+        parent_run_id: Optional[UUID] = None,
+        **kwargs: Any,
+    ):
+        self._enter(run_id, parent_run_id)
+
+    def on_tool_end(self, output: Any, *, run_id: UUID, **kwargs: Any):
+        trace = self._step(run_id)
+        self._run_steps.pop(run_id, None)
+        if trace is None:
+            return
+        content = getattr(output, "content", output)
+        documents = 0
+        if isinstance(content, list):
+            documents = len(content)
+        elif isinstance(content, str) and content.startswith("["):
+            # ToolNode serializes the list of results to JSON
+            try:
+                documents = len(json.loads(content))
+            except ValueError:
+                pass
+        trace.retrieved_documents += documents
+        trace.retrieved_chars += len(content) if isinstance(content, str) else 0
+        AGENT_RETRIEVED_DOCUMENTS.observe(documents, step=trace.step)
+
+    def on_tool_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any):
+        self._run_steps.pop(run_id, None)
+
+    def on_custom_event(self, name: str, data: Any, *, run_id: UUID, **kwargs: Any):
+        trace = self._step(run_id)
+        if name != "context" or trace is None:
+            return
+        # Reported by build_context when it packs the tool results
+        trace.context_tokens += data["context_tokens"]
+        trace.context_saved_tokens += data["saved_tokens"]
+
+    def summary(self) -> dict:
+        """Get the trace of the run so far.
+
+        Returns:
+            dict: The total seconds and tokens of the run, including the tokens
+                saved by packing the context, and the trace of every
+                step in the order the steps first ran.
+        """
+        steps = [asdict(trace) for trace in self.steps.values()]
+        return {
+            "seconds": time.perf_counter() - self.started_at,
+            "prompt_tokens": sum(step["prompt_tokens"] for step in steps),
+            "completion_tokens": sum(step["completion_tokens"] for step in steps),
+            "context_saved_tokens": sum(step["context_saved_tokens"] for step in steps),
+            "steps": steps,
+        }
+
+
+def token_usage(response: LLMResult) -> tuple[int, int]:
+    """Read the prompt and completion tokens reported by a model.
+
+    Args:
+        response (LLMResult): The result of the model call.
+
+    Returns:
+        tuple[int, int]: The prompt and completion tokens, 0 if not reported.
+    """
+    prompt_tokens = completion_tokens = 0
+    for generations in response.generations:
+        for generation in generations:
+            usage = getattr(
+                getattr(generation, "message", None), "usage_metadata", None
+            )
+            if usage:
+                prompt_tokens += usage.get("input_tokens", 0)
+                completion_tokens += usage.get("output_tokens", 0)
+    if not prompt_tokens and not completion_tokens:
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        prompt_tokens = usage.get("prompt_tokens", 0)
+        completion_tokens = usage.get("completion_tokens", 0)
+    return prompt_tokens, completion_tokens
+
+
+def message_usage(message: BaseMessage) -> dict:
+    """Read the token usage of a model response, for the usage of the thread.
+
+    Args:
+        message (BaseMessage): The response of the model.
+
+    Returns:
+        dict: The LLM calls, prompt tokens and completion tokens of the response.
+    """
+    usage = getattr(message, "usage_metadata", None) or {}
+    return {
+        "llm_calls": 1,
+        "prompt_tokens": usage.get("input_tokens", 0),
+        "completion_tokens": usage.get("output_tokens", 0),
+    }
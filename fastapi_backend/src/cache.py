@@ -0,0 +1,123 @@
+"""
+In-process caches.
+This module contains a size-bounded LRU cache with per-entry expiry and hit/miss counters.
+"""
+
+import time
+from collections import OrderedDict
+from collections.abc import Hashable, Iterator
+from typing import Any, Optional
+
+
+class TTLCache:
+    def __init__(self, max_entries: int = 1000, ttl_seconds: Optional[float] = None):
+        """Initialize the TTLCache.
+
+        Args:
+            max_entries (int): The maximum number of entries. The least recently used
+                entry is evicted when the cache is full. Defaults to 1000.
+            ttl_seconds (float, optional): The lifetime of an entry. Defaults to no
+                expiry.
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: OrderedDict[Hashable, tuple[Any, float]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _expired(self, expires_at: float) -> bool:
+        return expires_at <= time.monotonic()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Get an entry and mark it as recently used.
+
+        Args:
+            key (Hashable): The key of the entry.
+            default (Any): The value returned on a miss. Defaults to None.
+
+        Returns:
+            Any: The cached value, or the default on a miss.
+        """
+        entry = self._entries.get(key)
+        if entry is None or self._expired(entry[1]):
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return default
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def set(self, key: Hashable, value: Any):
+        """Add or replace an entry, evicting the least recently used entries if full.
+
+        Args:
+            key (Hashable): The key of the entry.
+            value (Any): The value to cache.
+        """
+        expires_at = (
+            time.monotonic() + self.ttl_seconds
+            if self.ttl_seconds is not None
+            else float("inf")
+        )
+        self._entries[key] = (value, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """Remove an entry.
+
+        Args:
+            key (Hashable): The key of the entry.
+            default (Any): The value returned if the key is missing. Defaults to None.
+
+        Returns:
+            Any: The removed value, or the default.
+        """
+        entry = self._entries.pop(key, None)
+        return default if entry is None else entry[0]
+
+    def items(self) -> Iterator[tuple[Hashable, Any]]:
+        """Iterate over the live entries without changing their recency.
+
+        Yields:
+            tuple[Hashable, Any]: The key and value of each live entry.
+        """
+        for key, (value, expires_at) in list(self._entries.items()):
+            if not self._expired(expires_at):
+                yield key, value
+
+    def remove_where(self, predicate) -> int:
+        """Remove every entry whose key matches a predicate.
+
+        Args:
+            predicate: A function that takes a key and returns True to remove it.
+
+        Returns:
+            int: The number of removed entries.
+        """
+        keys = [key for key in self._entries if predicate(key)]
+        for key in keys:
+            del self._entries[key]
+        return len(keys)
+
+    def stats(self) -> dict:
+        """Get the size and hit/miss counters of the cache.
+
+        Returns:
+            dict: The cache statistics.
+        """
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,316 @@
+"""
+Application settings.
+This module reads the tunable parameters of the backend from environment variables.
+"""
+
+import os
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Optional
+
+from dotenv import load_dotenv
+
+
+def _env_str(name: str, default: Optional[str] = None) -> Optional[str]:
+    return os.environ.get(name, default)
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.environ.get(name)
+    return int(value) if value not in (None, "") else default
+
+
+def _env_float(name: str, default: float) -> float:
+    value = os.environ.get(name)
+    return float(value) if value not in (None, "") else default
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.environ.get(name)
+    if value in (None, ""):
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+@dataclass(frozen=True)
+class Settings:
+    """
+    Settings for the backend. Every field can be overridden by the environment
+    variable of the same name in upper case.
+    """
+
+    qdrant_url: Optional[str] = field(default_factory=lambda: _env_str("QDRANT_URL"))
+    firecrawl_api_url: Optional[str] = field(
+        default_factory=lambda: _env_str("FIRECRAWL_API_URL")
+    )
+    qdrant_timeout: int = field(default_factory=lambda: _env_int("QDRANT_TIMEOUT", 30))
+    qdrant_max_connections: int = field(
+        default_factory=lambda: _env_int("QDRANT_MAX_CONNECTIONS", 20)
+    )
+    qdrant_max_keepalive_connections: int = field(
+        default_factory=lambda: _env_int("QDRANT_MAX_KEEPALIVE_CONNECTIONS", 10)
+    )
+    # Dense embedding backend. The model also sets the dimension of new collections.
+    embedding_backend: str = field(
+        default_factory=lambda: _env_str("EMBEDDING_BACKEND", "fastembed")
+    )
+    embedding_model: str = field(
+        default_factory=lambda: _env_str("EMBEDDING_MODEL", "BAAI/bge-small-en")
+    )
+    embedding_workers: int = field(
+        default_factory=lambda: _env_int("EMBEDDING_WORKERS", os.cpu_count() or 1)
+    )
+    embedding_batch_size: int = field(
+        default_factory=lambda: _env_int("EMBEDDING_BATCH_SIZE", 64)
+    )
+    embedding_cache_size: int = field(
+        default_factory=lambda: _env_int("EMBEDDING_CACHE_SIZE", 10000)
+    )
+    query_cache_size: int = field(
+        default_factory=lambda: _env_int("QUERY_CACHE_SIZE", 1024)
+    )
+    search_cache_size: int = field(
+        default_factory=lambda: _env_int("SEARCH_CACHE_SIZE", 1024)
+    )
+    search_cache_ttl: float = field(
+        default_factory=lambda: _env_float("SEARCH_CACHE_TTL", 30.0)
+    )
+
+    # Hybrid dense + sparse (BM25) retrieval
+    hybrid_search: bool = field(
+        default_factory=lambda: _env_bool("HYBRID_SEARCH", False)
+    )
+    sparse_model: str = field(
+        default_factory=lambda: _env_str("SPARSE_MODEL", "Qdrant/bm25")
+    )
+    hybrid_dense_weight: float = field(
+        default_factory=lambda: _env_float("HYBRID_DENSE_WEIGHT", 1.0)
+    )
+    hybrid_sparse_weight: float = field(
+        default_factory=lambda: _env_float("HYBRID_SPARSE_WEIGHT", 1.0)
+    )
+    hybrid_prefetch_limit: int = field(
+        default_factory=lambda: _env_int("HYBRID_PREFETCH_LIMIT", 20)
+    )
+    # Storage profile of new collections: "default", "scalar", "binary" or "on_disk"
+    collection_profile: str = field(
+        default_factory=lambda: _env_str("COLLECTION_PROFILE", "default")
+    )
+
+    # Chat models of the agent workflow
+    agent_model: str = field(
+        default_factory=lambda: _env_str("AGENT_MODEL", "gpt-4o-mini")
+    )
+    rewrite_model: str = field(
+        default_factory=lambda: _env_str("REWRITE_MODEL", "gpt-4-0125-preview")
+    )
+    generate_model: str = field(
+        default_factory=lambda: _env_str("GENERATE_MODEL", "gpt-4o-mini")
+    )
+    grader_model: str = field(
+        default_factory=lambda: _env_str("GRADER_MODEL", "gpt-4o")
+    )
+    summary_model: str = field(
+        default_factory=lambda: _env_str("SUMMARY_MODEL", "gpt-4o-mini")
+    )
+    llm_temperature: float = field(
+        default_factory=lambda: _env_float("LLM_TEMPERATURE", 0.0)
+    )
+    llm_timeout: float = field(default_factory=lambda: _env_float("LLM_TIMEOUT", 60.0))
+    llm_max_retries: int = field(default_factory=lambda: _env_int("LLM_MAX_RETRIES", 2))
+    llm_max_connections: int = field(
+        default_factory=lambda: _env_int("LLM_MAX_CONNECTIONS", 20)
+    )
+
+    # Checkpointer of the agent graph: "memory", "sqlite" or "tiered"
+    checkpointer_backend: str = field(
+        default_factory=lambda: _env_str("CHECKPOINTER_BACKEND", "tiered")
+    )
+    checkpointer_path: str = field(
+        default_factory=lambda: _env_str("CHECKPOINTER_PATH", "checkpoints.sqlite")
+    )
+    checkpointer_max_threads: int = field(
+        default_factory=lambda: _env_int("CHECKPOINTER_MAX_THREADS", 1000)
+    )
+    checkpointer_memory_ttl: float = field(
+        default_factory=lambda: _env_float("CHECKPOINTER_MEMORY_TTL", 3600.0)
+    )
+    checkpointer_disk_ttl: float = field(
+        default_factory=lambda: _env_float("CHECKPOINTER_DISK_TTL", 7 * 24 * 3600.0)
+    )
+    checkpointer_max_checkpoints: int = field(
+        default_factory=lambda: _env_int("CHECKPOINTER_MAX_CHECKPOINTS", 20)
+    )
+    # Messages a thread carries into its next turn, older turns are trimmed. 0 keeps
+    # them all
+    checkpointer_max_messages: Optional[int] = field(
+        default_factory=lambda: _env_int("CHECKPOINTER_MAX_MESSAGES", 200) or None
+    )
+
+    # Crawl jobs
+    max_concurrent_crawls: int = field(
+        default_factory=lambda: _env_int("MAX_CONCURRENT_CRAWLS", 4)
+    )
+    # SQLite file the crawl jobs are saved to, and the seconds between checkpoints
+    crawl_jobs_path: str = field(
+        default_factory=lambda: _env_str("CRAWL_JOBS_PATH", "crawl_jobs.sqlite")
+    )
+    crawl_checkpoint_interval: float = field(
+        default_factory=lambda: _env_float("CRAWL_CHECKPOINT_INTERVAL", 10.0)
+    )
+    # Seconds between two throughput "stats" events of a running crawl job
+    crawl_stats_interval: float = field(
+        default_factory=lambda: _env_float("CRAWL_STATS_INTERVAL", 2.0)
+    )
+    crawl_queue_size: int = field(
+        default_factory=lambda: _env_int("CRAWL_QUEUE_SIZE", 100)
+    )
+    crawl_ingest_workers: int = field(
+        default_factory=lambda: _env_int("CRAWL_INGEST_WORKERS", 4)
+    )
+    # Local imports: the directory API imports must be inside (unset disables
+    # them), and the number of processes parsing files.
+    import_root: Optional[str] = field(default_factory=lambda: _env_str("IMPORT_ROOT"))
+    import_workers: int = field(
+        default_factory=lambda: _env_int("IMPORT_WORKERS", os.cpu_count() or 1)
+    )
+
+    # Answer cache checked before the agent graph runs, off by default
+    answer_cache_enabled: bool = field(
+        default_factory=lambda: _env_bool("ANSWER_CACHE_ENABLED", False)
+    )
+    answer_cache_max_entries: int = field(
+        default_factory=lambda: _env_int("ANSWER_CACHE_MAX_ENTRIES", 1000)
+    )
+    answer_cache_ttl: float = field(
+        default_factory=lambda: _env_float("ANSWER_CACHE_TTL", 3600.0)
+    )
+    # Unset, only exact matches of the normalized question are served. Set it to a
+    # cosine similarity measured on the embedding model to also serve near matches.
+    answer_cache_similarity: Optional[float] = field(
+        default_factory=lambda: _env_float("ANSWER_CACHE_SIMILARITY", None)
+    )
+
+    # Retrieval used by the search_vector_store tool: "local" searches the
+    # VectorStore of this process, "http" calls RETRIEVAL_HTTP_URL.
+    retrieval_mode: str = field(
+        default_factory=lambda: _env_str("RETRIEVAL_MODE", "local")
+    )
+    retrieval_http_url: Optional[str] = field(
+        default_factory=lambda: _env_str(
+            "RETRIEVAL_HTTP_URL", _env_str("FASTAPI_BACKEND")
+        )
+    )
+    retrieval_http_timeout: float = field(
+        default_factory=lambda: _env_float("RETRIEVAL_HTTP_TIMEOUT", 30.0)
+    )
+    retrieval_http_max_connections: int = field(
+        default_factory=lambda: _env_int("RETRIEVAL_HTTP_MAX_CONNECTIONS", 20)
+    )
+    retrieval_top_k: int = field(default_factory=lambda: _env_int("RETRIEVAL_TOP_K", 3))
+    retrieval_score_threshold: Optional[float] = field(
+        default_factory=lambda: _env_float("RETRIEVAL_SCORE_THRESHOLD", None)
+    )
+    retrieval_max_document_chars: int = field(
+        default_factory=lambda: _env_int("RETRIEVAL_MAX_DOCUMENT_CHARS", 2000)
+    )
+
+    # Retrieval fan-out of the search_collections tool across collections and the
+    # web. With FANOUT_ENOUGH_RESULTS set, it returns once that many results scoring
+    # at least FANOUT_MIN_SCORE arrived, and cancels the slower sources.
+    fanout_timeout: float = field(
+        default_factory=lambda: _env_float("FANOUT_TIMEOUT", 5.0)
+    )
+    fanout_web_timeout: float = field(
+        default_factory=lambda: _env_float("FANOUT_WEB_TIMEOUT", 10.0)
+    )
+    fanout_enough_results: int = field(
+        default_factory=lambda: _env_int("FANOUT_ENOUGH_RESULTS", 0)
+    )
+    fanout_min_score: Optional[float] = field(
+        default_factory=lambda: _env_float("FANOUT_MIN_SCORE", None)
+    )
+
+    # Reranking of retrieved documents: "lexical", "cross-encoder" or "none"
+    reranker: str = field(default_factory=lambda: _env_str("RERANKER", "lexical"))
+    reranker_model: str = field(
+        default_factory=lambda: _env_str(
+            "RERANKER_MODEL", "Xenova/ms-marco-MiniLM-L-6-v2"
+        )
+    )
+    reranker_candidates: int = field(
+        default_factory=lambda: _env_int("RERANKER_CANDIDATES", 20)
+    )
+    # Unset, only the cross-encoder skips the grader for high scores
+    reranker_high_confidence: Optional[float] = field(
+        default_factory=lambda: _env_float("RERANKER_HIGH_CONFIDENCE", None)
+    )
+    reranker_low_confidence: Optional[float] = field(
+        default_factory=lambda: _env_float("RERANKER_LOW_CONFIDENCE", None)
+    )
+
+    # Context assembly: the tool results are cleaned, deduped and packed into a
+    # token budget before they reach the generate node and the grader.
+    context_budget_enabled: bool = field(
+        default_factory=lambda: _env_bool("CONTEXT_BUDGET_ENABLED", True)
+    )
+    context_max_tokens: int = field(
+        default_factory=lambda: _env_int("CONTEXT_MAX_TOKENS", 3000)
+    )
+    context_max_passage_tokens: int = field(
+        default_factory=lambda: _env_int("CONTEXT_MAX_PASSAGE_TOKENS", 800)
+    )
+    context_grader_max_tokens: int = field(
+        default_factory=lambda: _env_int("CONTEXT_GRADER_MAX_TOKENS", 1000)
+    )
+
+    # History sent to the agent model: the latest turns in full, older turns
+    # folded into a rolling summary, within a token budget
+    history_policy_enabled: bool = field(
+        default_factory=lambda: _env_bool("HISTORY_POLICY_ENABLED", True)
+    )
+    history_max_tokens: int = field(
+        default_factory=lambda: _env_int("HISTORY_MAX_TOKENS", 4000)
+    )
+    history_window_turns: int = field(
+        default_factory=lambda: _env_int("HISTORY_WINDOW_TURNS", 4)
+    )
+    history_summary_batch_turns: int = field(
+        default_factory=lambda: _env_int("HISTORY_SUMMARY_BATCH_TURNS", 2)
+    )
+    history_summarize: bool = field(
+        default_factory=lambda: _env_bool("HISTORY_SUMMARIZE", True)
+    )
+
+    # Ingestion
+    ingest_chunk_size: int = field(
+        default_factory=lambda: _env_int("INGEST_CHUNK_SIZE", 256)
+    )
+    ingest_chunk_overlap: int = field(
+        default_factory=lambda: _env_int("INGEST_CHUNK_OVERLAP", 32)
+    )
+    ingest_batch_size: int = field(
+        default_factory=lambda: _env_int("INGEST_BATCH_SIZE", 64)
+    )
+    ingest_flush_interval: float = field(
+        default_factory=lambda: _env_float("INGEST_FLUSH_INTERVAL", 5.0)
+    )
+    # Writes of a chunk before it is dropped, and the buffered chunks above which
+    # failed batches are dropped instead of retried
+    ingest_max_attempts: int = field(
+        default_factory=lambda: _env_int("INGEST_MAX_ATTEMPTS", 3)
+    )
+    ingest_max_buffered_chunks: int = field(
+        default_factory=lambda: _env_int("INGEST_MAX_BUFFERED_CHUNKS", 10_000)
+    )
+
+
+@lru_cache
+def get_settings() -> Settings:
+    """Load the settings once from the environment.
+
+    Returns:
+        Settings: The application settings.
+    """
+    load_dotenv()
+    return Settings()
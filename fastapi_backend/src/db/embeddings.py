@@ -0,0 +1,263 @@
+"""
+Dense embedding backends for the vector store.
+This module contains the embedder interface used by the vector store, a fastembed (ONNX)
+implementation that runs batches in parallel on a CPU thread pool, and a cache of
+passage embeddings keyed by content hash.
+"""
+
+import asyncio
+import hashlib
+import os
+import threading
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from fastembed import TextEmbedding
+from loguru import logger
+from qdrant_client.models import Distance, VectorParams
+
+from fastapi_backend.src.cache import TTLCache
+
+
+def text_hash(text: str) -> str:
+    """Hash a text for the embedding cache.
+
+    Args:
+        text (str): The text.
+
+    Returns:
+        str: The SHA-256 hex digest of the text.
+    """
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class Embedder(ABC):
+    def __init__(
+        self,
+        model_name: str,
+        workers: Optional[int] = None,
+        batch_size: int = 64,
+        cache_size: int = 10000,
+        distance: Distance = Distance.COSINE,
+    ):
+        """Initialize the Embedder.
+
+        Passages are split into batches that are embedded in parallel on a thread
+        pool. Embeddings of passages seen before, such as the unchanged chunks of a
+        re-crawled page, are served from a cache keyed by the hash of their content.
+
+        Args:
+            model_name (str): The name of the embedding model.
+            workers (int, optional): The number of batches embedded at once. Defaults
+                to the number of CPU cores.
+            batch_size (int): The number of passages per batch. Defaults to 64.
+            cache_size (int): The number of cached passage embeddings, 0 to disable
+                the cache. Defaults to 10000.
+            distance (Distance): The distance of the model's vectors. Defaults to
+                cosine.
+        """
+        self.model_name = model_name
+        self.workers = workers or os.cpu_count() or 1
+        self.batch_size = batch_size
+        self.distance = distance
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.workers, thread_name_prefix="embedder"
+        )
+        self._cache = TTLCache(max_entries=cache_size) if cache_size > 0 else None
+        self._dimension: Optional[int] = None
+
+    @property
+    def vector_name(self) -> str:
+        """The name of the dense vector in the collections, as qdrant-client names
+        the vectors of fastembed models, so existing collections stay readable."""
+        return f"fast-{self.model_name.split('/')[-1].lower()}"
+
+    @property
+    def dimension(self) -> int:
+        """The number of dimensions of the model's vectors."""
+        if self._dimension is None:
+            self._dimension = self._model_dimension()
+        return self._dimension
+
+    def vector_params(self) -> dict[str, VectorParams]:
+        """Build the dense vector params of a collection for this model.
+
+        Returns:
+            dict[str, VectorParams]: The vector params keyed by vector name.
+        """
+        return {
+            self.vector_name: VectorParams(size=self.dimension, distance=self.distance)
+        }
+
+    def _model_dimension(self) -> int:
+        """Look up the dimension of the model, by default by embedding a probe."""
+        return len(self._embed_batch(["dimension probe"])[0])
+
+    @abstractmethod
+    def _embed_batch(self, documents: list[str]) -> list[list[float]]:
+        """Embed a batch of passages. Called on the thread pool.
+
+        Args:
+            documents (list[str]): The passages.
+
+        Returns:
+            list[list[float]]: One vector per passage.
+        """
+
+    @abstractmethod
+    def _embed_query(self, query: str) -> list[float]:
+        """Embed a query. Called on the thread pool.
+
+        Args:
+            query (str): The query.
+
+        Returns:
+            list[float]: The query vector.
+        """
+
+    async def embed_passages(
+        self, documents: list[str], batch_size: Optional[int] = None
+    ) -> list[list[float]]:
+        """Embed passages in parallel batches, reusing cached embeddings.
+
+        Args:
+            documents (list[str]): The passages.
+            batch_size (int, optional): The number of passages per batch. Defaults
+                to the batch size of the embedder.
+
+        Returns:
+            list[list[float]]: One vector per passage.
+        """
+        batch_size = batch_size or self.batch_size
+        keys = [text_hash(document) for document in documents]
+        vectors: list[Optional[list[float]]] = [
+            self._cache.get(key) if self._cache is not None else None for key in keys
+        ]
+
+        # Embed each distinct missing passage once
+        missing: dict[str, str] = {}
+        for key, document, vector in zip(keys, documents, vectors):
+            if vector is None:
+                missing.setdefault(key, document)
+        if missing:
+            missing_keys = list(missing)
+            missing_documents = list(missing.values())
+            loop = asyncio.get_running_loop()
+            batches = await asyncio.gather(
+                *(
+                    loop.run_in_executor(
+                        self._executor,
+                        self._embed_batch,
+                        missing_documents[start : start + batch_size],
+                    )
+                    for start in range(0, len(missing_documents), batch_size)
+                )
+            )
+            embedded = dict(
+                zip(missing_keys, (vector for batch in batches for vector in batch))
+            )
+            if self._cache is not None:
+                for key, vector in embedded.items():
+                    self._cache.set(key, vector)
+            vectors = [
+                vector if vector is not None else embedded[key]
+                for key, vector in zip(keys, vectors)
+            ]
+        return vectors
+
+    async def embed_query(self, query: str) -> list[float]:
+        """Embed a query on the thread pool.
+
+        Args:
+            query (str): The query.
+
+        Returns:
+            list[float]: The query vector.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._embed_query, query)
+
+    def stats(self) -> dict:
+        """Get the model, pool size and cache counters of the embedder.
+
+        Returns:
+            dict: The embedder statistics.
+        """
+        return {
+            "model": self.model_name,
+            "dimension": self._dimension,
+            "workers": self.workers,
+            "batch_size": self.batch_size,
+            "cache": self._cache.stats() if self._cache is not None else None,
+        }
+
+    def close(self):
+        """Shut down the thread pool."""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class FastEmbedEmbedder(Embedder):
+    def __init__(self, model_name: str = "BAAI/bge-small-en", **kwargs):
+        """Initialize the FastEmbedEmbedder with a fastembed ONNX model.
+
+        The model is loaded on first use. ONNX Runtime releases the GIL during
+        inference, so the batches run in parallel on the thread pool, and the cores
+        are split between the workers to avoid oversubscription.
+
+        Args:
+            model_name (str): The fastembed model. Defaults to "BAAI/bge-small-en".
+            **kwargs: The arguments of Embedder.
+        """
+        super().__init__(model_name, **kwargs)
+        self.threads_per_worker = max(1, (os.cpu_count() or 1) // self.workers)
+        self._model: Optional[TextEmbedding] = None
+        self._model_lock = threading.Lock()
+
+    def _get_model(self) -> TextEmbedding:
+        with self._model_lock:
+            if self._model is None:
+                logger.info(
+                    f"Loading embedding model {self.model_name} with "
+                    f"{self.workers} workers x {self.threads_per_worker} threads"
+                )
+                self._model = TextEmbedding(
+                    model_name=self.model_name, threads=self.threads_per_worker
+                )
+        return self._model
+
+    def _model_dimension(self) -> int:
+        for description in TextEmbedding.list_supported_models():
+            if description["model"] == self.model_name:
+                return description["dim"]
+        return super()._model_dimension()
+
+    def _embed_batch(self, documents: list[str]) -> list[list[float]]:
+        return [
+            vector.tolist()
+            for vector in self._get_model().passage_embed(
+                documents, batch_size=len(documents)
+            )
+        ]
+
+    def _embed_query(self, query: str) -> list[float]:
+        return next(iter(self._get_model().query_embed(query))).tolist()
+
+
+def create_embedder(kind: str, **kwargs) -> Embedder:
+    """Create the embedder selected in the settings.
+
+    Args:
+        kind (str): The embedding backend. Only "fastembed" is built in; other
+            backends subclass Embedder and are passed to the VectorStore directly.
+        **kwargs: The arguments of the embedder.
+
+    Returns:
+        Embedder: The embedder.
+
+    Raises:
+        ValueError: If the kind is unknown.
+    """
+    if kind == "fastembed":
+        return FastEmbedEmbedder(**kwargs)
+    raise ValueError(f"Unknown embedding backend: {kind}")
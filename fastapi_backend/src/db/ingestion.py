@@ -0,0 +1,693 @@
+"""
+Ingestion pipeline for the vector store.
+This module splits markdown documents into token-bounded chunks, buffers the chunks
+of many pages and flushes them to the vector store in size- and time-bounded batches.
+"""
+
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict, deque
+from collections.abc import AsyncIterator
+from dataclasses import dataclass, asdict
+from typing import Optional
+from urllib.parse import urlsplit
+from uuid import NAMESPACE_URL, uuid4, uuid5
+
+from langchain_text_splitters import MarkdownTextSplitter
+from loguru import logger
+from pydantic import ValidationError
+from qdrant_client.http.exceptions import UnexpectedResponse
+
+from fastapi_backend.src.metrics import CHUNKING_SECONDS
+from fastapi_backend.src.models.vector_store import BulkDocument
+
+# Pages whose latest version, and whose dropped chunks, are remembered per collection
+SOURCE_HISTORY = 10_000
+
+
+@dataclass
+class Chunk:
+    """A single chunk of a document waiting to be written to the vector store."""
+
+    text: str
+    metadata: dict
+    id: str
+    # The failed writes of the chunk, and the add_document call that produced it
+    attempts: int = 0
+    generation: int = 0
+
+
+@dataclass
+class BatchTiming:
+    """Timing of a single batch flushed to the vector store."""
+
+    collection_name: str
+    size: int
+    seconds: float
+    flushed_at: float
+
+
+def make_splitter(chunk_size: int, chunk_overlap: int) -> MarkdownTextSplitter:
+    """Create a markdown splitter that measures chunk length in tokens.
+
+    Args:
+        chunk_size (int): The maximum number of tokens in a chunk.
+        chunk_overlap (int): The number of tokens shared by consecutive chunks.
+
+    Returns:
+        MarkdownTextSplitter: The splitter.
+    """
+    return MarkdownTextSplitter.from_tiktoken_encoder(
+        encoding_name="cl100k_base",
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+    )
+
+
+def is_transient(error: Exception) -> bool:
+    """Check whether a failed write may succeed when it is retried.
+
+    Args:
+        error (Exception): The error of the write.
+
+    Returns:
+        bool: False for invalid requests, e.g. a collection created with another
+            embedding model, which fail the same way on every retry.
+    """
+    if isinstance(error, UnexpectedResponse):
+        status_code = error.status_code
+        return status_code is None or status_code >= 500 or status_code == 429
+    return not isinstance(error, (ValueError, TypeError, KeyError))
+
+
+def content_hash(document: str) -> str:
+    """Hash the content of a document to detect changes between crawls.
+
+    Args:
+        document (str): The document content.
+
+    Returns:
+        str: The SHA-256 hex digest of the content.
+    """
+    return hashlib.sha256(document.encode("utf-8")).hexdigest()
+
+
+def chunk_id(source: str, chunk_index: int) -> str:
+    """Derive a stable point ID for a chunk, so re-ingesting a page overwrites it.
+
+    Args:
+        source (str): The URL the document was crawled from.
+        chunk_index (int): The index of the chunk in the document.
+
+    Returns:
+        str: A UUID derived from the source and the chunk index.
+    """
+    return str(uuid5(NAMESPACE_URL, f"{source}#{chunk_index}"))
+
+
+def url_prefixes(url: str) -> list[str]:
+    """List the path prefixes of a URL, so that searches can filter on a prefix.
+
+    Args:
+        url (str): The URL of a page.
+
+    Returns:
+        list[str]: The URL truncated after each path segment, e.g.
+            ["https://a.dev", "https://a.dev/docs", "https://a.dev/docs/api"].
+    """
+    parts = urlsplit(url)
+    root = f"{parts.scheme}://{parts.netloc}"
+    prefixes = [root]
+    for segment in [segment for segment in parts.path.split("/") if segment]:
+        prefixes.append(f"{prefixes[-1]}/{segment}")
+    return prefixes
+
+
+async def read_lines(
+    stream: AsyncIterator[bytes], max_line_bytes: int = 16 * 2**20
+) -> AsyncIterator[Optional[bytes]]:
+    """Split a byte stream into lines without reading it all into memory.
+
+    Args:
+        stream (AsyncIterator[bytes]): The byte stream, e.g. a request body.
+        max_line_bytes (int): The longest line kept. Defaults to 16 MiB.
+
+    Yields:
+        Optional[bytes]: Each line without its line break, or None for a line that
+            was longer than max_line_bytes and has been skipped.
+    """
+    buffer = bytearray()
+    skipping = False
+    async for data in stream:
+        start = 0
+        while (end := data.find(b"\n", start)) != -1:
+            if skipping:
+                skipping = False
+                yield None
+            else:
+                buffer += data[start:end]
+                yield bytes(buffer)
+            buffer.clear()
+            start = end + 1
+        if not skipping:
+            buffer += data[start:]
+            if len(buffer) > max_line_bytes:
+                buffer.clear()
+                skipping = True
+    if skipping:
+        yield None
+    elif buffer:
+        yield bytes(buffer)
+
+
+class IngestionPipeline:
+    def __init__(
+        self,
+        vector_store,
+        chunk_size: int = 256,
+        chunk_overlap: int = 32,
+        batch_size: int = 64,
+        flush_interval: float = 5.0,
+        timing_history: int = 100,
+        max_attempts: int = 3,
+        max_buffered_chunks: int = 10_000,
+    ):
+        """Initialize the IngestionPipeline.
+
+        Args:
+            vector_store: The vector store instance the batches are written to.
+            chunk_size (int): The maximum number of tokens in a chunk. Defaults to 256.
+            chunk_overlap (int): The number of tokens shared by consecutive chunks. Defaults to 32.
+            batch_size (int): The number of chunks that triggers a flush. Defaults to 64.
+            flush_interval (float): The maximum number of seconds a chunk waits in the
+                buffer before it is flushed. Defaults to 5.0.
+            timing_history (int): The number of batch timings kept. Defaults to 100.
+            max_attempts (int): The number of times a chunk is written before it is
+                dropped. Defaults to 3.
+            max_buffered_chunks (int): The number of buffered chunks above which the
+                chunks of failed batches are dropped instead of retried. Defaults to
+                10000.
+        """
+        self.vector_store = vector_store
+        self.splitter = make_splitter(chunk_size, chunk_overlap)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_attempts = max(max_attempts, 1)
+        self.max_buffered_chunks = max_buffered_chunks
+
+        self._flusher: Optional[asyncio.Task] = None
+        self._buffers: dict[str, list[Chunk]] = {}
+        self._buffered_since: dict[str, float] = {}
+        self._timings: deque[BatchTiming] = deque(maxlen=timing_history)
+        self._documents = 0
+        self._chunks = 0
+        self._batches = 0
+        self._failed_batches = 0
+        self._dropped_chunks = 0
+        self._generation = 0
+        self._source_generations: OrderedDict[tuple[str, str], int] = OrderedDict()
+        self._dropped_sources: OrderedDict[tuple[str, str], None] = OrderedDict()
+        self._chunking_seconds: dict[str, float] = {}
+        self._failed_collection_batches: dict[str, int] = {}
+
+    async def start(self):
+        """Start the background task that flushes batches that have waited too long."""
+        if self._flusher is None:
+            self._flusher = asyncio.create_task(self._flush_periodically())
+
+    async def stop(self):
+        """Stop the background flush task and write every buffered chunk."""
+        if self._flusher is not None:
+            self._flusher.cancel()
+            try:
+                await self._flusher
+            except asyncio.CancelledError:
+                pass
+            self._flusher = None
+        try:
+            await self.flush()
+        except RuntimeError as e:
+            logger.error(f"Buffered chunks are lost at shutdown: {e}")
+
+    async def _flush_periodically(self):
+        while True:
+            await asyncio.sleep(self.flush_interval / 2)
+            await self._write_batches(self._take_due_batches())
+
+    def split(self, document: str) -> list[str]:
+        """Split a markdown document into token-bounded chunks.
+
+        Args:
+            document (str): The markdown document.
+
+        Returns:
+            list[str]: The chunks of the document.
+        """
+        return [text for text in self.splitter.split_text(document) if text.strip()]
+
+    def chunk(
+        self, document: str, metadata: dict, source: Optional[str] = None
+    ) -> list[Chunk]:
+        """Split a document into chunks carrying its metadata and their IDs.
+
+        Args:
+            document (str): The markdown content of the document.
+            metadata (dict): Metadata associated with the document.
+            source (str, optional): The URL the document was crawled from, see
+                add_document. Defaults to None.
+
+        Returns:
+            list[Chunk]: The chunks of the document.
+        """
+        start = time.perf_counter()
+        texts = self.split(document)
+        CHUNKING_SECONDS.observe(time.perf_counter() - start)
+        if source is not None:
+            metadata = {
+                **metadata,
+                "source": source,
+                "content_hash": content_hash(document),
+                "url_prefixes": url_prefixes(source),
+            }
+        return [
+            Chunk(
+                text=text,
+                metadata={**metadata, "chunk_index": index, "chunk_count": len(texts)},
+                id=chunk_id(source, index) if source is not None else str(uuid4()),
+            )
+            for index, text in enumerate(texts)
+        ]
+
+    async def add_document(
+        self,
+        collection_name: str,
+        document: str,
+        metadata: dict,
+        source: Optional[str] = None,
+    ) -> int:
+        """Chunk a document and buffer its chunks, flushing any batch that is due.
+
+        Args:
+            collection_name (str): The name of the collection to add the document to.
+            document (str): The markdown content of the document.
+            metadata (dict): Metadata associated with the document. It is copied to
+                every chunk together with the chunk index.
+            source (str, optional): The URL the document was crawled from. When set,
+                chunk IDs are derived from it so that ingesting the page again
+                overwrites its chunks, and the source and content hash are stored
+                with every chunk. Defaults to random IDs.
+
+        Returns:
+            int: The number of chunks produced for the document.
+        """
+        start = time.perf_counter()
+        chunks = await asyncio.to_thread(self.chunk, document, metadata, source)
+        self._chunking_seconds[collection_name] = (
+            self._chunking_seconds.get(collection_name, 0.0)
+            + time.perf_counter()
+            - start
+        )
+
+        self._documents += 1
+        self._generation += 1
+        for chunk in chunks:
+            chunk.generation = self._generation
+        if source is not None:
+            self._replace_source(collection_name, source)
+        if chunks:
+            self._buffers.setdefault(collection_name, []).extend(chunks)
+            self._buffered_since.setdefault(collection_name, time.monotonic())
+
+        await self._write_batches(self._take_due_batches())
+        return len(chunks)
+
+    async def flush(self, collection_name: Optional[str] = None):
+        """Write all buffered chunks to the vector store.
+
+        Args:
+            collection_name (str, optional): Only flush this collection. Defaults to
+                flushing every collection.
+
+        Raises:
+            RuntimeError: If a batch could not be written. The chunks of a transient
+                failure stay buffered for a later flush, until they are dropped, see
+                pop_dropped_sources.
+        """
+        names = (
+            [collection_name]
+            if collection_name is not None
+            else list(self._buffers.keys())
+        )
+        due = []
+        for name in names:
+            chunks = self._buffers.pop(name, [])
+            self._buffered_since.pop(name, None)
+            due.extend(
+                (name, chunks[start : start + self.batch_size])
+                for start in range(0, len(chunks), self.batch_size)
+            )
+
+        failed = await self._write_batches(due)
+        if failed:
+            raise RuntimeError(
+                f"Failed to write {failed} chunks, {self.pending_chunks()} chunks "
+                "are buffered for a retry"
+            )
+
+    async def ingest_stream(
+        self,
+        lines: AsyncIterator[Optional[bytes]],
+        collection_name: Optional[str] = None,
+    ) -> dict:
+        """Ingest a stream of JSON documents, one BulkDocument per line.
+
+        Documents are chunked as the lines arrive and written in batches of
+        batch_size chunks. The next batch is chunked while the previous one is
+        written, so at most two batches are held in memory. The batches bypass the
+        shared buffers, so a failed write is reported on the documents it contained.
+
+        Args:
+            lines (AsyncIterator[Optional[bytes]]): The lines, see read_lines.
+            collection_name (str, optional): The collection of documents that do not
+                name one. Defaults to None.
+
+        Returns:
+            dict: The result of every non-empty line and the throughput of the upload.
+        """
+        start = time.perf_counter()
+        results: list[dict] = []
+        pending: dict[str, list[tuple[int, Chunk]]] = {}
+        failed: set[int] = set()
+        writing: Optional[asyncio.Task] = None
+        size = 0
+
+        async def write(name: str, batch: list[tuple[int, Chunk]]):
+            if await self._write_batch(name, [chunk for _, chunk in batch]):
+                failed.update(index for index, _ in batch)
+
+        async def submit(name: str, batch: list[tuple[int, Chunk]]):
+            nonlocal writing
+            if writing is not None:
+                await writing
+            writing = asyncio.create_task(write(name, batch))
+
+        try:
+            line_number = 0
+            async for line in lines:
+                line_number += 1
+                if line is None:
+                    results.append(
+                        {"line": line_number, "status": "error", "error": "Too long"}
+                    )
+                    continue
+                size += len(line) + 1
+                if not line.strip():
+                    continue
+                try:
+                    item = BulkDocument.model_validate_json(line)
+                    name = item.collection_name or collection_name
+                    if not name:
+                        raise ValueError("collection_name is missing")
+                    document_chunks = await asyncio.to_thread(
+                        self.chunk, item.document, item.metadata, item.source
+                    )
+                except (ValidationError, ValueError) as e:
+                    results.append(
+                        {"line": line_number, "status": "error", "error": str(e)}
+                    )
+                    continue
+
+                index = len(results)
+                results.append(
+                    {
+                        "line": line_number,
+                        "status": "ok",
+                        "collection_name": name,
+                        "source": item.source,
+                        "chunks": len(document_chunks),
+                    }
+                )
+                buffer = pending.setdefault(name, [])
+                buffer.extend((index, chunk) for chunk in document_chunks)
+                while len(buffer) >= self.batch_size:
+                    await submit(name, buffer[: self.batch_size])
+                    del buffer[: self.batch_size]
+
+            for name, buffer in pending.items():
+                if buffer:
+                    await submit(name, buffer)
+        finally:
+            if writing is not None:
+                await writing
+
+        for index in failed:
+            results[index]["status"] = "error"
+            results[index]["error"] = "Failed to write the chunks"
+        succeeded = sum(result["status"] == "ok" for result in results)
+        chunks = sum(result["chunks"] for result in results if result["status"] == "ok")
+        self._documents += succeeded
+        seconds = time.perf_counter() - start
+        stats = {
+            "documents": len(results),
+            "succeeded": succeeded,
+            "failed": len(results) - succeeded,
+            "chunks": chunks,
+            "bytes": size,
+            "seconds": seconds,
+            "documents_per_second": len(results) / seconds if seconds else 0.0,
+            "chunks_per_second": chunks / seconds if seconds else 0.0,
+        }
+        logger.info(f"Bulk upload finished: {stats}")
+        return {"results": results, "stats": stats}
+
+    def _take_due_batches(self) -> list[tuple[str, list[Chunk]]]:
+        """Remove the batches that are full or have waited too long from the buffers.
+
+        Returns:
+            list[tuple[str, list[Chunk]]]: The collection name and chunks of each batch.
+        """
+        now = time.monotonic()
+        due = []
+        for name in list(self._buffers.keys()):
+            chunks = self._buffers[name]
+            while len(chunks) >= self.batch_size:
+                due.append((name, chunks[: self.batch_size]))
+                chunks = chunks[self.batch_size :]
+                self._buffered_since[name] = now
+
+            if chunks and now - self._buffered_since[name] >= self.flush_interval:
+                due.append((name, chunks))
+                chunks = []
+
+            if chunks:
+                self._buffers[name] = chunks
+            else:
+                del self._buffers[name]
+                del self._buffered_since[name]
+        return due
+
+    def _replace_source(self, collection_name: str, source: str):
+        """Record a new version of a page and drop the buffered chunks of older ones,
+        so that a retried batch does not overwrite the new chunks with the same IDs.
+
+        Args:
+            collection_name (str): The name of the collection.
+            source (str): The URL of the page.
+        """
+        key = (collection_name, source)
+        self._source_generations[key] = self._generation
+        self._source_generations.move_to_end(key)
+        if len(self._source_generations) > SOURCE_HISTORY:
+            self._source_generations.popitem(last=False)
+        buffered = self._buffers.get(collection_name)
+        if buffered:
+            kept = [
+                chunk for chunk in buffered if chunk.metadata.get("source") != source
+            ]
+            if kept:
+                self._buffers[collection_name] = kept
+            else:
+                del self._buffers[collection_name]
+                del self._buffered_since[collection_name]
+
+    def _is_stale(self, collection_name: str, chunk: Chunk) -> bool:
+        source = chunk.metadata.get("source")
+        if source is None:
+            return False
+        latest = self._source_generations.get((collection_name, source), 0)
+        return latest > chunk.generation
+
+    def _drop(self, collection_name: str, chunks: list[Chunk], reason: str):
+        sources = {chunk.metadata.get("source") for chunk in chunks} - {None}
+        self._dropped_chunks += len(chunks)
+        for source in sources:
+            self._dropped_sources[(collection_name, source)] = None
+            if len(self._dropped_sources) > SOURCE_HISTORY:
+                self._dropped_sources.popitem(last=False)
+        logger.error(
+            f"Dropped {len(chunks)} chunks of {len(sources)} documents in "
+            f"{collection_name}: {reason}"
+        )
+
+    def pop_dropped_sources(self, collection_name: str, sources) -> set[str]:
+        """Get the pages among sources whose chunks were dropped, and forget them.
+
+        Args:
+            collection_name (str): The name of the collection.
+            sources: The URLs of the pages to check.
+
+        Returns:
+            set[str]: The pages that were not fully written.
+        """
+        dropped = {
+            source
+            for source in sources
+            if (collection_name, source) in self._dropped_sources
+        }
+        for source in dropped:
+            del self._dropped_sources[(collection_name, source)]
+        return dropped
+
+    async def _write_batches(self, batches: list[tuple[str, list[Chunk]]]) -> int:
+        """Write batches taken from the buffers, and put the chunks of the batches
+        that failed back in front of their buffer for a later retry.
+
+        The chunks of a failed batch are dropped instead if the error is not
+        transient, if they were written max_attempts times, or if the buffers hold
+        max_buffered_chunks already. Chunks of a page that was added again since
+        are dropped as well, as they would overwrite its new chunks.
+
+        Args:
+            batches (list[tuple[str, list[Chunk]]]): The collection name and chunks
+                of each batch.
+
+        Returns:
+            int: The number of chunks that could not be written.
+        """
+        failed = 0
+        retries: dict[str, list[Chunk]] = {}
+        for name, batch in batches:
+            error = await self._write_batch(name, batch)
+            if error is None:
+                continue
+            failed += len(batch)
+            if not is_transient(error):
+                self._drop(name, batch, f"the write cannot succeed: {error}")
+                continue
+            for chunk in batch:
+                chunk.attempts += 1
+            exhausted = [
+                chunk for chunk in batch if chunk.attempts >= self.max_attempts
+            ]
+            if exhausted:
+                self._drop(name, exhausted, f"{self.max_attempts} writes failed")
+            retries.setdefault(name, []).extend(
+                chunk
+                for chunk in batch
+                if chunk.attempts < self.max_attempts
+                and not self._is_stale(name, chunk)
+            )
+
+        room = max(self.max_buffered_chunks - self.pending_chunks(), 0)
+        for name, chunks in retries.items():
+            kept, room = chunks[:room], max(room - len(chunks), 0)
+            if len(kept) < len(chunks):
+                self._drop(name, chunks[len(kept) :], "the buffers are full")
+            if kept:
+                self._buffers[name] = kept + self._buffers.get(name, [])
+                # Retried by the periodic flush once the interval has passed again
+                self._buffered_since[name] = time.monotonic()
+        return failed
+
+    async def _write_batch(
+        self, collection_name: str, batch: list[Chunk]
+    ) -> Optional[Exception]:
+        """Write one batch of chunks to the vector store and record its timing.
+
+        Args:
+            collection_name (str): The name of the collection to write to.
+            batch (list[Chunk]): The chunks to write.
+
+        Returns:
+            Optional[Exception]: The error of the write, or None once it succeeded.
+        """
+        start = time.perf_counter()
+        try:
+            await self.vector_store.add_documents(
+                collection_name=collection_name,
+                documents=[chunk.text for chunk in batch],
+                metadata=[chunk.metadata for chunk in batch],
+                ids=[chunk.id for chunk in batch],
+            )
+        except Exception as e:
+            self._failed_batches += 1
+            self._failed_collection_batches[collection_name] = (
+                self._failed_collection_batches.get(collection_name, 0) + 1
+            )
+            logger.error(
+                f"Failed to write batch of {len(batch)} chunks to {collection_name}: {e}"
+            )
+            return e
+
+        seconds = time.perf_counter() - start
+        self._batches += 1
+        self._chunks += len(batch)
+        self._timings.append(
+            BatchTiming(
+                collection_name=collection_name,
+                size=len(batch),
+                seconds=seconds,
+                flushed_at=time.time(),
+            )
+        )
+        logger.info(
+            f"Wrote batch of {len(batch)} chunks to {collection_name} in {seconds:.3f}s"
+        )
+        return None
+
+    def collection_stats(self, collection_name: str) -> dict:
+        """Get the time spent chunking, embedding and upserting the documents of a
+        collection since the pipeline started.
+
+        Chunking covers documents added with add_document. Embedding and upserting
+        cover every write to the collection.
+
+        Args:
+            collection_name (str): The name of the collection.
+
+        Returns:
+            dict: The stage seconds and the batch counters of the collection.
+        """
+        return {
+            "chunking_seconds": self._chunking_seconds.get(collection_name, 0.0),
+            **self.vector_store.write_stats(collection_name),
+            "failed_batches": self._failed_collection_batches.get(collection_name, 0),
+        }
+
+    def pending_chunks(self) -> int:
+        """Get the number of chunks buffered for the next batch writes.
+
+        Returns:
+            int: The number of buffered chunks.
+        """
+        return sum(len(chunks) for chunks in self._buffers.values())
+
+    def stats(self) -> dict:
+        """Get the counters and the recent batch timings of the pipeline.
+
+        Returns:
+            dict: The ingestion statistics.
+        """
+        timings = list(self._timings)
+        total_seconds = sum(timing.seconds for timing in timings)
+        return {
+            "documents": self._documents,
+            "chunks": self._chunks,
+            "batches": self._batches,
+            "failed_batches": self._failed_batches,
+            "dropped_chunks": self._dropped_chunks,
+            "pending_chunks": self.pending_chunks(),
+            "avg_batch_seconds": total_seconds / len(timings) if timings else 0.0,
+            "batch_timings": [asdict(timing) for timing in timings],
+        }
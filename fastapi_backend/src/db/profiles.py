@@ -0,0 +1,225 @@
+"""
+Collection profiles for the vector store.
+This module describes how the vectors of a collection are stored and searched: in RAM
+or on disk, with or without scalar/binary quantization, and with which HNSW parameters.
+"""
+
+from dataclasses import asdict, dataclass
+from typing import Optional
+
+from qdrant_client.models import (
+    BinaryQuantization,
+    BinaryQuantizationConfig,
+    CollectionConfig,
+    HnswConfigDiff,
+    QuantizationSearchParams,
+    ScalarQuantization,
+    ScalarQuantizationConfig,
+    ScalarType,
+    SearchParams,
+    VectorParams,
+)
+
+
+@dataclass(frozen=True)
+class CollectionProfile:
+    """The storage and search parameters of a collection."""
+
+    name: str
+    description: str
+    on_disk_vectors: bool = False
+    on_disk_payload: bool = False
+    # None, "scalar" (int8, 4x smaller) or "binary" (1 bit per dimension, 32x smaller)
+    quantization: Optional[str] = None
+    # Search the quantized vectors, then rescore the best candidates with the
+    # original vectors. Oversampling is the candidate multiplier of the rescoring.
+    rescore: bool = True
+    oversampling: float = 2.0
+    hnsw_m: int = 16
+    hnsw_ef_construct: int = 100
+    hnsw_on_disk: bool = False
+    search_ef: Optional[int] = None
+
+    def vectors_config(self, base: dict[str, VectorParams]) -> dict[str, VectorParams]:
+        """Apply the profile to the dense vector params of the embedding model.
+
+        Args:
+            base (dict[str, VectorParams]): The vector params keyed by vector name.
+
+        Returns:
+            dict[str, VectorParams]: The vector params stored on disk if requested.
+        """
+        return {
+            name: params.model_copy(update={"on_disk": self.on_disk_vectors})
+            for name, params in base.items()
+        }
+
+    def quantization_config(self):
+        """Build the quantization config of the profile.
+
+        Returns:
+            The scalar or binary quantization config, or None without quantization.
+        """
+        if self.quantization == "scalar":
+            return ScalarQuantization(
+                scalar=ScalarQuantizationConfig(
+                    type=ScalarType.INT8, quantile=0.99, always_ram=True
+                )
+            )
+        if self.quantization == "binary":
+            return BinaryQuantization(binary=BinaryQuantizationConfig(always_ram=True))
+        return None
+
+    def hnsw_config(self) -> HnswConfigDiff:
+        """Build the HNSW index config of the profile.
+
+        Returns:
+            HnswConfigDiff: The HNSW parameters.
+        """
+        return HnswConfigDiff(
+            m=self.hnsw_m,
+            ef_construct=self.hnsw_ef_construct,
+            on_disk=self.hnsw_on_disk,
+        )
+
+    def search_params(self) -> Optional[SearchParams]:
+        """Build the search-time parameters of the profile.
+
+        Returns:
+            Optional[SearchParams]: The HNSW ef and quantization rescoring, or None
+                to use Qdrant's defaults.
+        """
+        if self.quantization is None and self.search_ef is None:
+            return None
+        return SearchParams(
+            hnsw_ef=self.search_ef,
+            quantization=(
+                QuantizationSearchParams(
+                    rescore=self.rescore, oversampling=self.oversampling
+                )
+                if self.quantization is not None
+                else None
+            ),
+        )
+
+    def estimated_ram_bytes(self, points: int, dimensions: int) -> int:
+        """Estimate the RAM needed for the vectors and the HNSW graph.
+
+        Payloads and on-disk data paged in by the OS are not counted.
+
+        Args:
+            points (int): The number of points.
+            dimensions (int): The number of dimensions of the vectors.
+
+        Returns:
+            int: The estimated number of bytes.
+        """
+        ram = 0 if self.on_disk_vectors else points * dimensions * 4
+        if self.quantization == "scalar":
+            ram += points * dimensions
+        elif self.quantization == "binary":
+            ram += points * ((dimensions + 7) // 8)
+        if not self.hnsw_on_disk:
+            # Each node links to up to 2 * m neighbours on layer 0
+            ram += points * self.hnsw_m * 2 * 4
+        return ram
+
+    def to_dict(self) -> dict:
+        """Get the parameters of the profile.
+
+        Returns:
+            dict: The profile parameters.
+        """
+        return asdict(self)
+
+
+PROFILES: dict[str, CollectionProfile] = {
+    profile.name: profile
+    for profile in (
+        CollectionProfile(
+            name="default",
+            description="float32 vectors and HNSW graph in RAM. Fastest and most "
+            "accurate, and the most memory.",
+        ),
+        CollectionProfile(
+            name="scalar",
+            description="int8 scalar quantization in RAM with rescoring from "
+            "float32 vectors on disk. About 4x less vector RAM.",
+            on_disk_vectors=True,
+            quantization="scalar",
+            oversampling=2.0,
+            search_ef=128,
+        ),
+        CollectionProfile(
+            name="binary",
+            description="Binary quantization in RAM with rescoring from float32 "
+            "vectors on disk. About 32x less vector RAM, with a larger recall loss "
+            "on small embedding models.",
+            on_disk_vectors=True,
+            quantization="binary",
+            oversampling=3.0,
+            search_ef=128,
+        ),
+        CollectionProfile(
+            name="on_disk",
+            description="Vectors, payloads and HNSW graph on disk. Least RAM, "
+            "with latency bound by the disk.",
+            on_disk_vectors=True,
+            on_disk_payload=True,
+            hnsw_on_disk=True,
+            hnsw_m=16,
+            search_ef=64,
+        ),
+    )
+}
+
+
+def get_profile(name: str) -> CollectionProfile:
+    """Look up a collection profile by name.
+
+    Args:
+        name (str): The name of the profile.
+
+    Returns:
+        CollectionProfile: The profile.
+
+    Raises:
+        ValueError: If there is no profile with this name.
+    """
+    try:
+        return PROFILES[name]
+    except KeyError:
+        raise ValueError(
+            f"Unknown collection profile {name}, expected one of {list(PROFILES)}"
+        )
+
+
+def infer_profile(config: CollectionConfig) -> CollectionProfile:
+    """Find the profile an existing collection was most likely created with.
+
+    Qdrant does not store the profile name, so it is matched on the quantization
+    and on-disk settings of the collection.
+
+    Args:
+        config (CollectionConfig): The config of the collection.
+
+    Returns:
+        CollectionProfile: The matching profile, or the default profile.
+    """
+    quantization = config.quantization_config
+    kind = (
+        "scalar"
+        if isinstance(quantization, ScalarQuantization)
+        else "binary"
+        if isinstance(quantization, BinaryQuantization)
+        else None
+    )
+    vectors = config.params.vectors
+    params = (
+        next(iter(vectors.values()), None) if isinstance(vectors, dict) else vectors
+    )
+    on_disk_vectors = bool(params is not None and params.on_disk)
+    for profile in PROFILES.values():
+        if profile.quantization == kind and profile.on_disk_vectors == on_disk_vectors:
+            return profile
+    return PROFILES["default"]
@@ -1,66 +1,776 @@
-from qdrant_client import QdrantClient
-from qdrant_client.models import Distance, VectorParams
+import asyncio
+import functools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from collections.abc import Callable
+from typing import Optional
+
+from fastembed import SparseTextEmbedding
+from qdrant_client import AsyncQdrantClient
+from qdrant_client.models import (
+    CollectionParamsDiff,
+    Disabled,
+    FieldCondition,
+    Filter,
+    FilterSelector,
+    Fusion,
+    FusionQuery,
+    MatchAny,
+    MatchText,
+    MatchValue,
+    Modifier,
+    PayloadSchemaType,
+    PayloadSelectorExclude,
+    PointStruct,
+    Prefetch,
+    QueryRequest,
+    Range,
+    ScoredPoint,
+    SparseVector,
+    SparseVectorParams,
+    VectorParamsDiff,
+)
 from loguru import logger
 
+from fastapi_backend.src.cache import TTLCache
+from fastapi_backend.src.db.embeddings import Embedder, FastEmbedEmbedder
+from fastapi_backend.src.db.profiles import (
+    CollectionProfile,
+    get_profile,
+    infer_profile,
+)
+from fastapi_backend.src.metrics import (
+    EMBEDDING_SECONDS,
+    UPSERT_FAILURES,
+    UPSERT_POINTS,
+    UPSERT_SECONDS,
+)
+from fastapi_backend.src.models.vector_store import SearchFilters, SearchResult
+
+# Name of the sparse vector of hybrid collections
+SPARSE_VECTOR_NAME = "bm25"
+# Rank constant of reciprocal rank fusion
+RRF_K = 60
+# Longest metadata string returned by a search
+METADATA_MAX_CHARS = 256
+# Payload fields only used for filtering, never returned
+INTERNAL_FIELDS = ("url_prefixes",)
+
+
+@dataclass
+class CollectionLayout:
+    """The vector layout and the storage profile of a collection."""
+
+    hybrid: bool
+    profile: CollectionProfile
+
+
+@dataclass
+class WriteStats:
+    """The cumulative cost of the writes to a collection."""
+
+    batches: int = 0
+    points: int = 0
+    embedding_seconds: float = 0.0
+    upsert_seconds: float = 0.0
+
 
 class VectorStore:
-    def __init__(self, client: QdrantClient):
-        """Initialize the VectorStore with a Qdrant client.
+    def __init__(
+        self,
+        client: AsyncQdrantClient,
+        embedder: Optional[Embedder] = None,
+        max_workers: int = 4,
+        query_cache_size: int = 1024,
+        search_cache_size: int = 1024,
+        search_cache_ttl: float = 30.0,
+        hybrid: bool = False,
+        sparse_model_name: str = "Qdrant/bm25",
+        dense_weight: float = 1.0,
+        sparse_weight: float = 1.0,
+        prefetch_limit: int = 20,
+        profile: str = "default",
+    ):
+        """Initialize the VectorStore with an async Qdrant client.
+
+        Qdrant requests are awaited on the event loop, while embedding, which is CPU
+        bound, runs on thread pools so that it never blocks the loop. Dense vectors
+        come from the embedder, which also sets the dimension of new collections.
+
+        Repeated queries, such as the ones made again after the agent rewrites a
+        question, are served from an LRU cache of query embeddings and a short-lived
+        cache of search results. Writes to a collection drop its cached results.
 
         Args:
-            client (QdrantClient): The Qdrant client instance.
+            client (AsyncQdrantClient): The async Qdrant client instance.
+            embedder (Embedder, optional): The dense embedding backend. Defaults to a
+                FastEmbedEmbedder with the client's embedding model.
+            max_workers (int): The number of threads used for sparse embedding, and
+                for dense embedding if no embedder is given. Defaults to 4.
+            query_cache_size (int): The number of cached query embeddings. Defaults
+                to 1024.
+            search_cache_size (int): The number of cached search results. Defaults
+                to 1024.
+            search_cache_ttl (float): The lifetime of a cached search result in
+                seconds. Defaults to 30.0.
+            hybrid (bool): Create new collections with a sparse BM25 vector next to
+                the dense vector, and search them with both. Defaults to False.
+            sparse_model_name (str): The fastembed sparse model of hybrid collections.
+                Defaults to "Qdrant/bm25".
+            dense_weight (float): The weight of the dense ranking in the fusion of
+                hybrid results. Defaults to 1.0.
+            sparse_weight (float): The weight of the sparse ranking in the fusion of
+                hybrid results. Defaults to 1.0.
+            prefetch_limit (int): The number of candidates each vector contributes to
+                the fusion. Defaults to 20.
+            profile (str): The collection profile of new collections, see
+                fastapi_backend.src.db.profiles. Defaults to "default".
         """
         self.client = client
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="vector-store"
+        )
+        self.embedder = embedder or FastEmbedEmbedder(
+            client.embedding_model_name, workers=max_workers
+        )
+        self._sparse_model: Optional[SparseTextEmbedding] = None
+        self._model_lock = threading.Lock()
+        self.hybrid = hybrid
+        self.sparse_model_name = sparse_model_name
+        self.dense_weight = dense_weight
+        self.sparse_weight = sparse_weight
+        self.prefetch_limit = prefetch_limit
+        self.profile = get_profile(profile)
+        self._known_collections: dict[str, CollectionLayout] = {}
+        self._write_listeners: list[Callable[[str], None]] = []
+        self._write_stats: dict[str, WriteStats] = {}
+        self._query_embeddings = TTLCache(max_entries=query_cache_size)
+        self._search_results = TTLCache(
+            max_entries=search_cache_size, ttl_seconds=search_cache_ttl
+        )
+        # Bumped on every write so that a search racing a write does not cache
+        # results from before the write.
+        self._generations: dict[str, int] = {}
+
+    def add_write_listener(self, listener: Callable[[str], None]):
+        """Register a function called with the collection name after every write.
+
+        Caches built on top of a collection use this to invalidate their entries.
+
+        Args:
+            listener: The function to call.
+        """
+        self._write_listeners.append(listener)
+
+    def _notify_write(self, collection_name: str):
+        self._generations[collection_name] = (
+            self._generations.get(collection_name, 0) + 1
+        )
+        self._search_results.remove_where(lambda key: key[0] == collection_name)
+        for listener in self._write_listeners:
+            try:
+                listener(collection_name)
+            except Exception as e:
+                logger.error(f"Write listener failed for {collection_name}: {e}")
+
+    async def _run(self, func, *args, **kwargs):
+        """Run a blocking function on the embedding thread pool.
+
+        Args:
+            func: The function to run.
+            *args: Positional arguments for the function.
+            **kwargs: Keyword arguments for the function.
+
+        Returns:
+            The return value of the function.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, functools.partial(func, *args, **kwargs)
+        )
+
+    def _get_sparse_model(self) -> SparseTextEmbedding:
+        with self._model_lock:
+            if self._sparse_model is None:
+                self._sparse_model = SparseTextEmbedding(
+                    model_name=self.sparse_model_name
+                )
+        return self._sparse_model
+
+    def _embed_sparse_passages(
+        self, documents: list[str], batch_size: int
+    ) -> list[SparseVector]:
+        model = self._get_sparse_model()
+        return [
+            SparseVector(indices=vector.indices.tolist(), values=vector.values.tolist())
+            for vector in model.passage_embed(documents, batch_size=batch_size)
+        ]
+
+    def _embed_sparse_query(self, query: str) -> SparseVector:
+        model = self._get_sparse_model()
+        vector = next(iter(model.query_embed(query)))
+        return SparseVector(
+            indices=vector.indices.tolist(), values=vector.values.tolist()
+        )
+
+    async def _create_collection(
+        self, collection_name: str, hybrid: bool, profile: CollectionProfile
+    ):
+        """Create a collection with the embedding model's vector params.
+
+        Args:
+            collection_name (str): The name of the collection.
+            hybrid (bool): Add a sparse BM25 vector next to the dense vector.
+            profile (CollectionProfile): How the vectors are stored and searched.
+        """
+        logger.info(
+            f"Creating {'hybrid ' if hybrid else ''}collection {collection_name} "
+            f"with the {profile.name} profile"
+        )
+        # Unknown models are probed for their dimension, which loads the model
+        await self._run(lambda: self.embedder.dimension)
+        await self.client.create_collection(
+            collection_name=collection_name,
+            vectors_config=profile.vectors_config(self.embedder.vector_params()),
+            sparse_vectors_config=(
+                {SPARSE_VECTOR_NAME: SparseVectorParams(modifier=Modifier.IDF)}
+                if hybrid
+                else None
+            ),
+            on_disk_payload=profile.on_disk_payload,
+            hnsw_config=profile.hnsw_config(),
+            quantization_config=profile.quantization_config(),
+        )
+        # Re-crawls look up and delete the chunks of a page by its source URL, and
+        # searches filter on the URL, title and crawl time.
+        for field_name, field_schema in (
+            ("source", PayloadSchemaType.KEYWORD),
+            ("url_prefixes", PayloadSchemaType.KEYWORD),
+            ("title", PayloadSchemaType.TEXT),
+            ("crawled_at", PayloadSchemaType.FLOAT),
+        ):
+            await self.client.create_payload_index(
+                collection_name=collection_name,
+                field_name=field_name,
+                field_schema=field_schema,
+            )
+        self._known_collections[collection_name] = CollectionLayout(hybrid, profile)
+
+    async def _layout(self, collection_name: str) -> CollectionLayout:
+        """Get the vector layout and profile of a collection.
+
+        Args:
+            collection_name (str): The name of the collection.
+
+        Returns:
+            CollectionLayout: Whether the collection is hybrid, and its profile.
+        """
+        if collection_name not in self._known_collections:
+            info = await self.client.get_collection(collection_name)
+            vectors = info.config.params.vectors
+            params = (
+                vectors.get(self.embedder.vector_name)
+                if isinstance(vectors, dict)
+                else None
+            )
+            if params is None or params.size != self.embedder.dimension:
+                raise ValueError(
+                    f"Collection {collection_name} was not created with the "
+                    f"embedding model {self.embedder.model_name} "
+                    f"({self.embedder.dimension} dimensions)"
+                )
+            sparse_vectors = info.config.params.sparse_vectors or {}
+            self._known_collections[collection_name] = CollectionLayout(
+                hybrid=SPARSE_VECTOR_NAME in sparse_vectors,
+                profile=infer_profile(info.config),
+            )
+        return self._known_collections[collection_name]
+
+    async def _ensure_collection(self, collection_name: str) -> CollectionLayout:
+        """Create the collection with the embedding model's vector params if it is missing.
+
+        Args:
+            collection_name (str): The name of the collection.
+
+        Returns:
+            CollectionLayout: The layout of the collection.
+        """
+        if collection_name not in self._known_collections and not (
+            await self.client.collection_exists(collection_name)
+        ):
+            await self._create_collection(collection_name, self.hybrid, self.profile)
+        return await self._layout(collection_name)
+
+    async def ensure_collection(
+        self, collection_name: str, profile: Optional[str] = None
+    ):
+        """Create a collection with a profile, or switch an existing one to it.
+
+        Switching updates the quantization, on-disk and HNSW settings in place. Qdrant
+        rebuilds the affected indexes in the background.
+
+        Args:
+            collection_name (str): The name of the collection.
+            profile (str, optional): The name of the profile. Defaults to the
+                store's profile for new collections, and no change for existing ones.
+        """
+        if not await self.client.collection_exists(collection_name):
+            await self._create_collection(
+                collection_name,
+                self.hybrid,
+                get_profile(profile) if profile else self.profile,
+            )
+            return
+        layout = await self._layout(collection_name)
+        if profile is None or profile == layout.profile.name:
+            return
+
+        new_profile = get_profile(profile)
+        logger.info(f"Switching collection {collection_name} to the {profile} profile")
+        await self.client.update_collection(
+            collection_name=collection_name,
+            vectors_config={
+                self.embedder.vector_name: VectorParamsDiff(
+                    on_disk=new_profile.on_disk_vectors
+                )
+            },
+            collection_params=CollectionParamsDiff(
+                on_disk_payload=new_profile.on_disk_payload
+            ),
+            hnsw_config=new_profile.hnsw_config(),
+            quantization_config=new_profile.quantization_config() or Disabled.DISABLED,
+        )
+        self._known_collections[collection_name] = CollectionLayout(
+            layout.hybrid, new_profile
+        )
+
+    async def add_documents(
+        self,
+        collection_name: str,
+        documents: list[str],
+        metadata: list[dict],
+        ids: list[str],
+        batch_size: Optional[int] = None,
+    ):
+        """Embed and add a batch of documents to the vector store in one call.
+
+        Args:
+            collection_name (str): The name of the collection to add the documents to.
+            documents (list[str]): The document contents.
+            metadata (list[dict]): Metadata associated with each document.
+            ids (list[str]): The ID for each document.
+            batch_size (int, optional): The number of documents embedded at once.
+                Defaults to the batch size of the embedder.
+        """
+        logger.info(f"Adding {len(documents)} documents to {collection_name}")
+        hybrid = (await self._ensure_collection(collection_name)).hybrid
+        stats = self._write_stats.setdefault(collection_name, WriteStats())
+
+        start = time.perf_counter()
+        vectors = await self.embedder.embed_passages(documents, batch_size)
+        embedded = time.perf_counter()
+        EMBEDDING_SECONDS.observe(embedded - start, vector="dense")
+        sparse_vectors = [None] * len(documents)
+        if hybrid:
+            sparse_vectors = await self._run(
+                self._embed_sparse_passages,
+                documents,
+                batch_size or self.embedder.batch_size,
+            )
+            EMBEDDING_SECONDS.observe(time.perf_counter() - embedded, vector="sparse")
+        stats.embedding_seconds += time.perf_counter() - start
+
+        vector_name = self.embedder.vector_name
+        points = [
+            PointStruct(
+                id=id,
+                vector=(
+                    {vector_name: vector, SPARSE_VECTOR_NAME: sparse_vector}
+                    if sparse_vector is not None
+                    else {vector_name: vector}
+                ),
+                payload={"document": document, **meta},
+            )
+            for id, document, meta, vector, sparse_vector in zip(
+                ids, documents, metadata, vectors, sparse_vectors
+            )
+        ]
+        start = time.perf_counter()
+        try:
+            await self.client.upsert(
+                collection_name=collection_name, points=points, wait=True
+            )
+        except Exception:
+            UPSERT_FAILURES.inc()
+            raise
+        finally:
+            seconds = time.perf_counter() - start
+            stats.upsert_seconds += seconds
+            UPSERT_SECONDS.observe(seconds)
+        stats.batches += 1
+        stats.points += len(points)
+        UPSERT_POINTS.inc(len(points))
+        self._notify_write(collection_name)
+        return ids
+
+    async def get_document_hashes(self, collection_name: str) -> dict[str, dict]:
+        """Get the content hash and chunk count of every page stored in a collection.
 
-    def add_documents(
-        self, collection_name: str, document: str, metadata: dict, id: str
+        Args:
+            collection_name (str): The name of the collection.
+
+        Returns:
+            dict[str, dict]: The content_hash and chunk_count of each page, keyed by
+                its source URL. Empty if the collection does not exist.
+        """
+        if not await self.client.collection_exists(collection_name):
+            return {}
+
+        documents = {}
+        offset = None
+        while True:
+            points, offset = await self.client.scroll(
+                collection_name=collection_name,
+                scroll_filter=Filter(
+                    must=[FieldCondition(key="chunk_index", match=MatchValue(value=0))]
+                ),
+                with_payload=["source", "content_hash", "chunk_count"],
+                with_vectors=False,
+                limit=256,
+                offset=offset,
+            )
+            for point in points:
+                if source := point.payload.get("source"):
+                    documents[source] = {
+                        "content_hash": point.payload.get("content_hash"),
+                        "chunk_count": point.payload.get("chunk_count", 0),
+                    }
+            if offset is None:
+                return documents
+
+    async def delete_documents(
+        self, collection_name: str, sources: list[str], min_chunk_index: int = 0
     ):
-        """Add documents to the vector store.
+        """Delete the chunks of pages by their source URL.
+
+        Args:
+            collection_name (str): The name of the collection.
+            sources (list[str]): The source URLs of the pages.
+            min_chunk_index (int): Only delete chunks from this index on, e.g. the
+                chunks left over after a page got shorter. Defaults to 0.
+        """
+        if not sources:
+            return
+        conditions = [FieldCondition(key="source", match=MatchAny(any=sources))]
+        if min_chunk_index > 0:
+            conditions.append(
+                FieldCondition(key="chunk_index", range=Range(gte=min_chunk_index))
+            )
+        logger.info(f"Deleting chunks of {len(sources)} pages from {collection_name}")
+        await self.client.delete(
+            collection_name=collection_name,
+            points_selector=FilterSelector(filter=Filter(must=conditions)),
+            wait=True,
+        )
+        self._notify_write(collection_name)
+
+    async def embed_query(self, query: str) -> list:
+        """Embed a query with the model used for the collections.
+
+        Args:
+            query (str): The query.
+
+        Returns:
+            list: The query embedding.
+        """
+        vector = self._query_embeddings.get(("dense", query))
+        if vector is None:
+            vector = await self.embedder.embed_query(query)
+            self._query_embeddings.set(("dense", query), vector)
+        return vector
+
+    async def _embed_sparse_query_cached(self, query: str) -> SparseVector:
+        vector = self._query_embeddings.get(("sparse", query))
+        if vector is None:
+            vector = await self._run(self._embed_sparse_query, query)
+            self._query_embeddings.set(("sparse", query), vector)
+        return vector
+
+    def _build_filter(self, filters: Optional[SearchFilters]) -> Optional[Filter]:
+        """Translate the payload filters of a search into a Qdrant filter.
+
+        Args:
+            filters (SearchFilters, optional): The payload filters.
+
+        Returns:
+            Optional[Filter]: The Qdrant filter, or None if no filter is set.
+        """
+        if filters is None:
+            return None
+        conditions = []
+        if filters.url_prefix:
+            conditions.append(
+                FieldCondition(
+                    key="url_prefixes",
+                    match=MatchValue(value=filters.url_prefix.rstrip("/")),
+                )
+            )
+        if filters.title:
+            conditions.append(
+                FieldCondition(key="title", match=MatchText(text=filters.title))
+            )
+        if filters.crawled_after is not None or filters.crawled_before is not None:
+            conditions.append(
+                FieldCondition(
+                    key="crawled_at",
+                    range=Range(gte=filters.crawled_after, lte=filters.crawled_before),
+                )
+            )
+        return Filter(must=conditions) if conditions else None
+
+    async def _query(
+        self,
+        collection_name: str,
+        query: str,
+        limit: int,
+        score_threshold: Optional[float] = None,
+        query_filter: Optional[Filter] = None,
+        with_payload=True,
+    ) -> list[ScoredPoint]:
+        """Query a collection with the dense vector, or with both vectors if it is hybrid.
 
         Args:
-            collection_name (str): The name of the collection to add the document to.
-            document (str): The document content.
-            metadata (dict): Metadata associated with the document.
-            id (str): The ID for the document.
+            collection_name (str): The name of the collection to search in.
+            query (str): The search query.
+            limit (int): The number of results.
+            score_threshold (float, optional): Drop points scoring below this value.
+                For hybrid collections it applies to the fused score.
+            query_filter (Filter, optional): Only consider points matching this filter.
+            with_payload: The payload fields to return. Defaults to all fields.
+
+        Returns:
+            list[ScoredPoint]: The best matching points.
         """
-        logger.info(f"Adding document to {collection_name} with ID {id}")
-        return self.client.add(
+        dense_name = self.embedder.vector_name
+        dense = await self.embed_query(query)
+        layout = await self._layout(collection_name)
+        search_params = layout.profile.search_params()
+        if not layout.hybrid:
+            response = await self.client.query_points(
+                collection_name=collection_name,
+                query=dense,
+                using=dense_name,
+                query_filter=query_filter,
+                search_params=search_params,
+                score_threshold=score_threshold,
+                limit=limit,
+                with_payload=with_payload,
+            )
+            return response.points
+
+        sparse = await self._embed_sparse_query_cached(query)
+        if self.dense_weight == self.sparse_weight:
+            # Equal weights are fused by Qdrant in a single query
+            response = await self.client.query_points(
+                collection_name=collection_name,
+                prefetch=[
+                    Prefetch(
+                        query=dense,
+                        using=dense_name,
+                        filter=query_filter,
+                        params=search_params,
+                        limit=self.prefetch_limit,
+                    ),
+                    Prefetch(
+                        query=sparse,
+                        using=SPARSE_VECTOR_NAME,
+                        filter=query_filter,
+                        limit=self.prefetch_limit,
+                    ),
+                ],
+                query=FusionQuery(fusion=Fusion.RRF),
+                limit=limit,
+                with_payload=with_payload,
+            )
+            return [
+                point
+                for point in response.points
+                if score_threshold is None or point.score >= score_threshold
+            ]
+
+        # Qdrant's fusion has no weights, so fetch both rankings in one batch
+        # request and fuse them here.
+        responses = await self.client.query_batch_points(
             collection_name=collection_name,
-            documents=[document],
-            metadata=[metadata],
-            ids=[id],
+            requests=[
+                QueryRequest(
+                    query=dense,
+                    using=dense_name,
+                    filter=query_filter,
+                    params=search_params,
+                    limit=self.prefetch_limit,
+                    with_payload=with_payload,
+                ),
+                QueryRequest(
+                    query=sparse,
+                    using=SPARSE_VECTOR_NAME,
+                    filter=query_filter,
+                    limit=self.prefetch_limit,
+                    with_payload=with_payload,
+                ),
+            ],
         )
+        scores: dict = {}
+        points: dict = {}
+        for weight, response in zip((self.dense_weight, self.sparse_weight), responses):
+            for rank, point in enumerate(response.points):
+                scores[point.id] = scores.get(point.id, 0.0) + weight / (
+                    RRF_K + rank + 1
+                )
+                points.setdefault(point.id, point)
+        best = sorted(scores, key=scores.get, reverse=True)[:limit]
+        return [
+            points[id].model_copy(update={"score": scores[id]})
+            for id in best
+            if score_threshold is None or scores[id] >= score_threshold
+        ]
 
-    async def search_result(self, collection_name: str, query: str):
-        """Search for a result in the vector store.
+    async def search_result(
+        self,
+        collection_name: str,
+        query: str,
+        limit: int = 1,
+        score_threshold: Optional[float] = None,
+        filters: Optional[SearchFilters] = None,
+        fields: Optional[list[str]] = None,
+        max_document_chars: Optional[int] = None,
+    ) -> list[SearchResult]:
+        """Search for results in the vector store.
 
         Args:
             collection_name (str): The name of the collection to search in.
             query (str): The search query.
+            limit (int): The maximum number of results. Defaults to 1.
+            score_threshold (float, optional): Drop results scoring below this value.
+            filters (SearchFilters, optional): Payload filters of the search.
+            fields (list[str], optional): The metadata fields to return. Defaults to
+                all fields.
+            max_document_chars (int, optional): Truncate the returned documents to
+                this many characters. Defaults to the full documents.
+
+        Returns:
+            list[SearchResult]: The search results, best first.
+        """
+        key = (
+            collection_name,
+            query,
+            limit,
+            score_threshold,
+            filters.model_dump_json() if filters is not None else None,
+            tuple(fields) if fields is not None else None,
+            max_document_chars,
+        )
+        cached = self._search_results.get(key)
+        if cached is not None:
+            return list(cached)
+
+        generation = self._generations.get(collection_name, 0)
+        points = await self._query(
+            collection_name,
+            query,
+            limit=limit,
+            score_threshold=score_threshold,
+            query_filter=self._build_filter(filters),
+            with_payload=(
+                ["document", *fields]
+                if fields is not None
+                else PayloadSelectorExclude(exclude=list(INTERNAL_FIELDS))
+            ),
+        )
+        results = [self._to_result(point, max_document_chars) for point in points]
+        if self._generations.get(collection_name, 0) == generation:
+            self._search_results.set(key, results)
+        return list(results)
+
+    def _to_result(
+        self, point: ScoredPoint, max_document_chars: Optional[int]
+    ) -> SearchResult:
+        """Turn a scored point into a compact search result.
+
+        Args:
+            point (ScoredPoint): The point returned by Qdrant.
+            max_document_chars (int, optional): Truncate the document to this many
+                characters.
 
         Returns:
-            The search results from the vector store.
+            SearchResult: The search result with truncated payload values.
         """
-        return self.client.query(
-            collection_name=collection_name, query_text=query, limit=1
+        payload = point.payload or {}
+        document = payload.get("document", "")
+        return SearchResult(
+            id=point.id,
+            score=point.score,
+            document=(
+                document[:max_document_chars] if max_document_chars else document
+            ),
+            metadata={
+                key: (value[:METADATA_MAX_CHARS] if isinstance(value, str) else value)
+                for key, value in payload.items()
+                if key != "document" and key not in INTERNAL_FIELDS
+            },
         )
 
-    def create_collection(self, collection_name: str):
+    def cache_stats(self) -> dict:
+        """Get the size and hit/miss counters of the embedding and search caches.
+
+        Returns:
+            dict: The statistics of each cache.
+        """
+        return {
+            "embedder": self.embedder.stats(),
+            "query_embeddings": self._query_embeddings.stats(),
+            "search_results": self._search_results.stats(),
+        }
+
+    def write_stats(self, collection_name: str) -> dict:
+        """Get the number of batches written to a collection and the time spent
+        embedding and upserting them since the store started.
+
+        Args:
+            collection_name (str): The name of the collection.
+
+        Returns:
+            dict: The write counters and seconds of the collection.
+        """
+        return asdict(self._write_stats.get(collection_name, WriteStats()))
+
+    async def create_collection(
+        self,
+        collection_name: str,
+        hybrid: Optional[bool] = None,
+        profile: Optional[str] = None,
+    ):
         """Create a new collection in the vector store.
 
         Args:
             collection_name (str): The name of the collection to create.
+            hybrid (bool, optional): Add a sparse BM25 vector next to the dense
+                vector. Defaults to the hybrid setting of the store.
+            profile (str, optional): The collection profile. Defaults to the profile
+                of the store.
         """
-        logger.info(f"Creating collection: {collection_name}")
         try:
-            self.client.create_collection(
-                collection_name=collection_name,
-                vectors_config=VectorParams(size=384, distance=Distance.COSINE),
+            await self._create_collection(
+                collection_name,
+                self.hybrid if hybrid is None else hybrid,
+                get_profile(profile) if profile else self.profile,
             )
         except Exception as e:
             logger.error(f"Failed to create collection {collection_name}: {e}")
 
-    def get_collections(self):
+    async def get_collections(self):
         """Get all collections in the vector store.
 
         Args:
@@ -70,4 +780,10 @@ class VectorStore:
             List of all collections in the vector store.
         """
         logger.info("Fetching all collections")
-        return self.client.get_collections()
+        return await self.client.get_collections()
+
+    async def close(self):
+        """Close the Qdrant client and shut down the embedding thread pools."""
+        await self.client.close()
+        self.embedder.close()
+        self._executor.shutdown(wait=False, cancel_futures=True)
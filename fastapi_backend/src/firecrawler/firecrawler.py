@@ -2,91 +2,480 @@
 Firecrawl service for crawling and processing web pages.
 """
 
+import asyncio
+import time
 from firecrawl import FirecrawlApp
+from firecrawl.firecrawl import CrawlWatcher
 from loguru import logger
-from uuid import uuid4
 from typing import Optional
 
+from fastapi_backend.src.db.ingestion import content_hash
+from fastapi_backend.src.firecrawler.importer import LocalImporter
+from fastapi_backend.src.firecrawler.jobs import CrawlJob
+from fastapi_backend.src.metrics import (
+    CRAWL_BACKPRESSURE_WAITS,
+    CRAWL_DOCUMENTS,
+    CRAWL_DOCUMENTS_PROCESSED,
+    CRAWL_ERRORS,
+    CRAWL_PROCESSING_SECONDS,
+    CRAWL_QUEUE_WAIT_SECONDS,
+)
+
+
+class BackpressuredCrawlWatcher(CrawlWatcher):
+    def __init__(self, id: str, app: FirecrawlApp, on_document, on_error):
+        """Initialize a CrawlWatcher that awaits its event handlers.
+
+        The stock watcher dispatches documents to synchronous handlers and keeps every
+        page in memory. This one awaits the handler instead, so a full processing queue
+        stops reading from the Firecrawl websocket until there is room again.
+
+        Args:
+            id (str): The Firecrawl ID of the crawl.
+            app (FirecrawlApp): The Firecrawl client.
+            on_document: An async function called with the detail of every document.
+            on_error: An async function called with the detail of an error.
+        """
+        super().__init__(id, app)
+        self.on_document = on_document
+        self.on_error = on_error
+
+    async def _handle_message(self, msg: dict):
+        if msg["type"] == "document":
+            await self.on_document({"data": msg["data"], "id": self.id})
+        elif msg["type"] == "catchup":
+            self.status = msg["data"]["status"]
+            for doc in msg["data"].get("data", []):
+                await self.on_document({"data": doc, "id": self.id})
+        elif msg["type"] == "error":
+            self.status = "failed"
+            await self.on_error(
+                {"status": self.status, "error": msg["error"], "id": self.id}
+            )
+        else:
+            await super()._handle_message(msg)
+
 
 class FirecrawlService:
-    def __init__(self, firecrawl_api_url: str, vector_store):
+    def __init__(
+        self,
+        firecrawl_api_url: Optional[str],
+        ingestion_pipeline,
+        queue_size: int = 100,
+        workers: int = 4,
+        importer: Optional[LocalImporter] = None,
+    ):
         """Initialize FirecrawlService with the Firecrawl API URL.
 
+        Crawled documents go through a bounded queue to a fixed pool of ingestion
+        workers shared by every crawl. When the queue is full, crawls wait for room
+        before they read more documents from Firecrawl.
+
+        Args:
+            firecrawl_api_url (str, optional): The URL for the Firecrawl API. Without
+                it only local imports can run.
+            ingestion_pipeline: The ingestion pipeline that chunks crawled documents
+                and writes them to the vector store in batches.
+            queue_size (int): The number of documents waiting for a worker. Defaults
+                to 100.
+            workers (int): The number of ingestion workers. Defaults to 4.
+            importer (LocalImporter, optional): Reads local files and crawl dumps for
+                jobs with a source path. Defaults to a LocalImporter with one process
+                per core.
+        """
+        self.app = (
+            FirecrawlApp(api_url=firecrawl_api_url) if firecrawl_api_url else None
+        )
+        self.importer = importer or LocalImporter()
+        self.ingestion_pipeline = ingestion_pipeline
+        self.workers = workers
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self._worker_tasks: list[asyncio.Task] = []
+
+    async def start(self):
+        """Start the ingestion workers."""
+        if not self._worker_tasks:
+            self._worker_tasks = [
+                asyncio.create_task(self._work()) for _ in range(self.workers)
+            ]
+
+    async def stop(self):
+        """Process the queued documents and stop the ingestion workers."""
+        if self._worker_tasks:
+            await self._queue.join()
+            for task in self._worker_tasks:
+                task.cancel()
+            await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+            self._worker_tasks = []
+        self.importer.close()
+
+    async def _work(self):
+        while True:
+            job, detail, enqueued_at = await self._queue.get()
+            started_at = time.monotonic()
+            try:
+                await self._process_document(job, detail)
+            finally:
+                finished_at = time.monotonic()
+                job.record_processed(
+                    wait_seconds=started_at - enqueued_at,
+                    process_seconds=finished_at - started_at,
+                )
+                CRAWL_QUEUE_WAIT_SECONDS.observe(started_at - enqueued_at)
+                CRAWL_PROCESSING_SECONDS.observe(finished_at - started_at)
+                self._queue.task_done()
+            await job.emit(
+                "progress",
+                queue_depth=self._queue.qsize(),
+                queue_size=self._queue.maxsize,
+                **job.progress(),
+            )
+
+    def queue_stats(self) -> dict:
+        """Get the depth of the document queue.
+
+        Returns:
+            dict: The queue depth, capacity and number of workers.
+        """
+        return {
+            "queue_depth": self._queue.qsize(),
+            "queue_size": self._queue.maxsize,
+            "workers": len(self._worker_tasks),
+        }
+
+    def job_stats(self, job: CrawlJob) -> dict:
+        """Get the throughput of a job, the time its collection spent in each
+        ingestion stage since the job started, and the queue depth.
+
+        The stage timings cover every write to the job's collection, so they include
+        other jobs crawling the same site at the same time.
+
         Args:
-            firecrawl_api_url (str): The URL for the Firecrawl API.
-            vector_store: The vector store instance for storing crawled documents.
+            job (CrawlJob): The crawl job.
+
+        Returns:
+            dict: The job statistics.
         """
-        self.app = FirecrawlApp(firecrawl_api_url)
-        self.vector_store = vector_store
-        self.root_url = None
+        stages = self.ingestion_pipeline.collection_stats(job.collection_name)
+        baseline = job.stage_baseline
+        stages = {
+            name: value - baseline.get(name, 0) if baseline is not None else 0
+            for name, value in stages.items()
+        }
+        return {
+            **job.progress(),
+            **job.throughput(),
+            "failed_documents": job.failed_documents,
+            "errors": len(job.errors),
+            **stages,
+            "avg_upsert_seconds": (
+                stages["upsert_seconds"] / stages["batches"]
+                if stages["batches"]
+                else 0.0
+            ),
+            **self.queue_stats(),
+        }
 
-    def _process_document(self, detail):
+    async def _process_document(self, job: CrawlJob, detail):
         """Async handler for document processing.
 
         Args:
+            job (CrawlJob): The crawl job the document belongs to.
             detail: The detail of the document event.
         """
         try:
             document = detail["data"].get("markdown", "")
             metadata = {
                 **detail["data"].get("metadata", {}),
-                "root_url": self.root_url,
+                "root_url": job.root_url,
+                "crawled_at": time.time(),
             }
             # drop document key from metadata if it exists
             metadata.pop("document", None)
 
-            self.vector_store.add_documents(
-                collection_name="".join(
-                    [char for char in self.root_url if char.isalnum()]
-                ),
+            source = metadata.get("url") or metadata.get("sourceURL")
+            known = job.known_documents.get(source) if source else None
+            if source:
+                job.seen_sources.add(source)
+            if (
+                job.recrawl
+                and known is not None
+                and known["content_hash"] == content_hash(document)
+            ):
+                job.unchanged += 1
+                job.processed_sources[source] = 0
+                CRAWL_DOCUMENTS_PROCESSED.inc(outcome="unchanged")
+                return
+
+            chunks = await self.ingestion_pipeline.add_document(
+                collection_name=job.collection_name,
                 document=document,
                 metadata=metadata,
-                id=str(uuid4()),
+                source=source,
             )
+            job.chunks += chunks
+
+            # The page got shorter, so drop the chunks that will not be overwritten
+            if known is not None and known["chunk_count"] > chunks:
+                await self.ingestion_pipeline.vector_store.delete_documents(
+                    job.collection_name, [source], min_chunk_index=chunks
+                )
+            if source:
+                job.processed_sources[source] = chunks
+            CRAWL_DOCUMENTS_PROCESSED.inc(outcome="ingested")
         except Exception as e:
+            job.failed_documents += 1
+            CRAWL_DOCUMENTS_PROCESSED.inc(outcome="failed")
             logger.error(f"Failed to upload document: {e}")
 
-    def on_document(self, detail):
-        """Synchronous wrapper for document events that schedules async processing.
+    async def on_document(self, job: CrawlJob, detail):
+        """Handle document events by queueing the document for the ingestion workers.
+
+        Waits while the queue is full, and tells the job's subscribers about it.
 
         Args:
+            job (CrawlJob): The crawl job the document belongs to.
             detail: The detail of the document event.
         """
-        self._process_document(detail)
+        metadata = detail["data"].get("metadata", {})
+        source = metadata.get("url") or metadata.get("sourceURL")
+        if source in job.completed_sources:
+            # Ingested before the job was interrupted
+            return
+
+        job.documents += 1
+        CRAWL_DOCUMENTS.inc(source="import" if job.source_path else "firecrawl")
+        await job.emit("document", url=metadata.get("url", "unknown"))
+        if self._queue.full():
+            job.backpressure_waits += 1
+            CRAWL_BACKPRESSURE_WAITS.inc()
+            await job.emit(
+                "backpressure",
+                queue_depth=self._queue.qsize(),
+                queue_size=self._queue.maxsize,
+            )
+        # Counted once queued, so a put cancelled while the queue is full does not
+        # leave a document pending that no worker will ever process
+        await self._queue.put((job, detail, time.monotonic()))
+        job.pending += 1
+
+    async def checkpoint(self, job: CrawlJob):
+        """Flush the chunks of the pages the job has processed and mark the pages
+        as completed, so a resumed job skips them.
+
+        Args:
+            job (CrawlJob): The crawl job.
+
+        Raises:
+            RuntimeError: If the flush failed. The pages stay processed but not
+                completed, so a resumed job processes them again.
+        """
+        # Pages processed from here on may still have chunks in the buffers after
+        # the flush, so they wait for the next checkpoint
+        processed, job.processed_sources = job.processed_sources, {}
+        try:
+            await self.ingestion_pipeline.flush(job.collection_name)
+        except BaseException:
+            job.processed_sources.update(processed)
+            raise
+        finally:
+            # Pages whose chunks were dropped are neither completed nor retried by
+            # the next checkpoint, so a resumed job processes them again
+            dropped = self.ingestion_pipeline.pop_dropped_sources(
+                job.collection_name, processed
+            )
+            for source in dropped:
+                processed.pop(source, None)
+                job.processed_sources.pop(source, None)
+            if dropped:
+                job.errors.append(f"Failed to write {len(dropped)} pages")
+        job.completed_sources.update(processed)
 
-    def on_error(self, detail):
+    async def on_error(self, job: CrawlJob, detail):
         """Handle error events.
 
         Args:
+            job (CrawlJob): The crawl job that reported the error.
             detail: The detail of the error event.
         """
-        logger.error(detail["error"])
+        error = detail.get("error", "unknown error")
+        logger.error(error)
+        job.errors.append(error)
+        CRAWL_ERRORS.inc()
+        await job.emit("error", error=error)
 
-    def on_done(self, detail):
+    async def on_done(self, job: CrawlJob, detail):
         """Handle completion events.
 
         Args:
+            job (CrawlJob): The crawl job that finished.
             detail: The detail of the completion event.
         """
-        logger.info(f"Crawl finished: {detail['status']}")
+        logger.info(f"Crawl {job.id} finished: {detail['status']}")
+        await self.ingestion_pipeline.flush(job.collection_name)
+
+    async def run_job(self, job: CrawlJob):
+        """Run a crawl job until Firecrawl reports that it has finished.
+
+        Pages are stored with IDs derived from their URL, so crawling a site again
+        overwrites its pages. A re-crawl job also skips pages whose content has not
+        changed and, once the crawl completed, deletes pages that are gone.
+
+        Documents are queued for the ingestion workers as they arrive. Their
+        ingestion is awaited, and the job's collection flushed, before this returns.
+
+        A job with a source path reads a local directory or crawl dump instead of
+        crawling, and its documents take the same path as crawled ones.
+
+        Args:
+            job (CrawlJob): The crawl job to run.
+
+        Raises:
+            RuntimeError: If Firecrawl reports that the crawl failed.
+        """
+        vector_store = self.ingestion_pipeline.vector_store
+        await vector_store.ensure_collection(job.collection_name, profile=job.profile)
+        job.stage_baseline = self.ingestion_pipeline.collection_stats(
+            job.collection_name
+        )
+        job.known_documents = await vector_store.get_document_hashes(
+            job.collection_name
+        )
+
+        if job.source_path is not None:
+            status = await self._import(job)
+        else:
+            status = await self._crawl(job)
+
+        if status == "failed":
+            raise RuntimeError(job.errors[-1] if job.errors else "Crawl failed")
+
+        if job.recrawl:
+            await self._delete_vanished(job)
+
+    async def _crawl(self, job: CrawlJob) -> str:
+        """Crawl the job's URL with Firecrawl and queue the documents.
+
+        Args:
+            job (CrawlJob): The crawl job.
+
+        Returns:
+            str: The final status reported by Firecrawl.
+        """
+        if self.app is None:
+            raise RuntimeError("FIRECRAWL_API_URL is not set, only imports can run")
+
+        if job.firecrawl_id is not None and not await self._is_resumable(job):
+            job.firecrawl_id = None
+        if job.firecrawl_id is None:
+            # Starting a crawl is a blocking HTTP request
+            response = await asyncio.to_thread(
+                self.app.async_crawl_url, job.root_url, {"limit": job.limit}
+            )
+            if not response.get("success") or "id" not in response:
+                raise RuntimeError(f"Failed to start crawl: {response}")
+            job.firecrawl_id = response["id"]
+
+        watcher = BackpressuredCrawlWatcher(
+            job.firecrawl_id,
+            self.app,
+            on_document=lambda detail: self.on_document(job, detail),
+            on_error=lambda detail: self.on_error(job, detail),
+        )
+
+        try:
+            await watcher.connect()
+        finally:
+            # Keep the documents received so far, even if the job was cancelled
+            await job.wait_processed()
+            await self.on_done(job, {"status": watcher.status})
+        return watcher.status
+
+    async def _is_resumable(self, job: CrawlJob) -> bool:
+        """Check whether the Firecrawl crawl of a resumed job can be reconnected to.
+
+        Reconnecting replays the pages crawled so far, and the completed ones are
+        skipped. A crawl that failed, or that Firecrawl no longer knows, is started
+        again instead.
+
+        Args:
+            job (CrawlJob): The resumed job.
+
+        Returns:
+            bool: Whether the crawl is still running or completed.
+        """
+        try:
+            status = await asyncio.to_thread(
+                self.app.check_crawl_status, job.firecrawl_id
+            )
+        except Exception as e:
+            logger.warning(f"Crawl {job.firecrawl_id} cannot be resumed: {e}")
+            return False
+        return status.get("status") in ("scraping", "completed")
+
+    async def _import(self, job: CrawlJob) -> str:
+        """Read the job's local directory or crawl dump and queue the documents.
+
+        Args:
+            job (CrawlJob): The import job.
+
+        Returns:
+            str: "completed".
+        """
+        documents = self.importer.documents(job.source_path, job.root_url)
+        try:
+            async for detail in documents:
+                if job.documents >= job.limit:
+                    break
+                await self.on_document(job, detail)
+        finally:
+            await documents.aclose()
+            await job.wait_processed()
+            await self.on_done(job, {"status": "completed"})
+        return "completed"
+
+    async def _delete_vanished(self, job: CrawlJob):
+        """Delete the pages stored by earlier crawls that this crawl did not find.
+
+        Args:
+            job (CrawlJob): The finished re-crawl job.
+        """
+        if job.documents >= job.limit:
+            # The crawl stopped at its page limit, so missing pages may still exist
+            logger.info(
+                f"Crawl {job.id} reached its limit, keeping pages it did not visit"
+            )
+            return
+        vanished = sorted(set(job.known_documents) - job.seen_sources)
+        if vanished:
+            await self.ingestion_pipeline.vector_store.delete_documents(
+                job.collection_name, vanished
+            )
+            job.deleted_pages = len(vanished)
+
+    async def cancel_job(self, job: CrawlJob):
+        """Ask Firecrawl to stop a crawl job.
+
+        Args:
+            job (CrawlJob): The crawl job to cancel.
+        """
+        if job.firecrawl_id is None:
+            return
+        try:
+            await asyncio.to_thread(self.app.cancel_crawl, job.firecrawl_id)
+        except Exception as e:
+            logger.error(f"Failed to cancel crawl {job.firecrawl_id}: {e}")
 
     async def crawl_url(self, url: str, limit: Optional[int] = 10):
-        """Start crawling the given URL.
+        """Crawl the given URL and wait until the crawl has finished.
 
         Args:
             url (str): The URL to crawl.
             limit (int, optional): The maximum number of pages to crawl. Defaults to 10.
         """
-        self.root_url = str(url).rstrip("/")
         try:
-            watcher = self.app.crawl_url_and_watch(str(url), {"limit": limit})
-
-            watcher.add_event_listener("document", self.on_document)
-            watcher.add_event_listener("error", self.on_error)
-            watcher.add_event_listener("done", self.on_done)
-
-            await watcher.connect()
-            return {"status": "success", "message": f"Started crawling {url}"}
+            await self.run_job(CrawlJob(url=str(url), limit=limit))
+            return {"status": "success", "message": f"Crawled {url}"}
         except Exception as e:
             logger.error(f"Crawl failed: {e}")
             raise
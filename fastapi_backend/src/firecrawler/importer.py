@@ -0,0 +1,509 @@
+"""
+Offline import for the Firecrawl service.
+This module turns a local directory of markdown/HTML files, or a saved Firecrawl crawl
+dump, into the same document events a live crawl produces, parsing files in parallel
+worker processes.
+
+Run it without a server to bulk-load or benchmark ingestion:
+
+    python -m fastapi_backend.src.firecrawler.importer ./docs --url https://docs.example.com
+"""
+
+import asyncio
+import json
+import os
+import re
+import threading
+from collections import deque
+from collections.abc import AsyncIterator, Iterator
+from concurrent.futures import ProcessPoolExecutor
+from html.parser import HTMLParser
+from pathlib import Path
+from typing import Optional, TextIO
+
+MARKDOWN_SUFFIXES = (".md", ".markdown", ".mdx")
+HTML_SUFFIXES = (".html", ".htm")
+
+# Characters read from a JSON crawl dump at a time
+JSON_READ_SIZE = 1 << 16
+JSON_WHITESPACE = " \t\n\r"
+
+
+class _MarkdownConverter(HTMLParser):
+    """Converts the readable parts of an HTML page to markdown."""
+
+    SKIPPED = {"script", "style", "noscript", "svg", "nav", "header", "footer", "head"}
+    BLOCKS = {"p", "div", "section", "article", "main", "blockquote", "table", "tr"}
+    EMPHASIS = {"strong": "**", "b": "**", "em": "*", "i": "*"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts: list[str] = []
+        self.title = ""
+        self._in_title = False
+        self._skipped = 0
+        self._pre = False
+        self._lists = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "title":
+            self._in_title = True
+        if tag in self.SKIPPED:
+            self._skipped += 1
+        if self._skipped:
+            return
+        if re.fullmatch(r"h[1-6]", tag):
+            self.parts.append("\n\n" + "#" * int(tag[1]) + " ")
+        elif tag == "pre":
+            self._pre = True
+            self.parts.append("\n\n```\n")
+        elif tag == "code" and not self._pre:
+            self.parts.append("`")
+        elif tag in ("ul", "ol"):
+            self._lists += 1
+            self.parts.append("\n")
+        elif tag == "li":
+            self.parts.append("\n" + "  " * max(0, self._lists - 1) + "- ")
+        elif tag == "br":
+            self.parts.append("\n")
+        elif tag in self.EMPHASIS:
+            self.parts.append(self.EMPHASIS[tag])
+        elif tag in self.BLOCKS:
+            self.parts.append("\n\n")
+
+    def handle_endtag(self, tag):
+        if tag == "title":
+            self._in_title = False
+        if tag in self.SKIPPED:
+            self._skipped = max(0, self._skipped - 1)
+            return
+        if self._skipped:
+            return
+        if re.fullmatch(r"h[1-6]", tag) or tag in self.BLOCKS:
+            self.parts.append("\n\n")
+        elif tag == "pre":
+            self._pre = False
+            self.parts.append("\n```\n\n")
+        elif tag == "code" and not self._pre:
+            self.parts.append("`")
+        elif tag in ("ul", "ol"):
+            self._lists = max(0, self._lists - 1)
+            self.parts.append("\n")
+        elif tag in self.EMPHASIS:
+            self.parts.append(self.EMPHASIS[tag])
+
+    def handle_data(self, data):
+        if self._in_title:
+            self.title += data
+        if self._skipped:
+            return
+        self.parts.append(data if self._pre else re.sub(r"\s+", " ", data))
+
+    def markdown(self) -> str:
+        text = "".join(self.parts)
+        text = "\n".join(line.rstrip() for line in text.splitlines())
+        return re.sub(r"\n{3,}", "\n\n", text).strip()
+
+
+def html_to_markdown(html: str) -> tuple[str, str]:
+    """Convert an HTML page to markdown, dropping scripts, styles and navigation.
+
+    Args:
+        html (str): The HTML page.
+
+    Returns:
+        tuple[str, str]: The markdown content and the page title.
+    """
+    converter = _MarkdownConverter()
+    converter.feed(html)
+    converter.close()
+    return converter.markdown(), converter.title.strip()
+
+
+def find_files(root: Path) -> list[Path]:
+    """List the markdown and HTML files under a directory.
+
+    Args:
+        root (Path): The directory.
+
+    Returns:
+        list[Path]: The files in a stable order.
+    """
+    suffixes = MARKDOWN_SUFFIXES + HTML_SUFFIXES
+    return sorted(
+        path
+        for path in root.rglob("*")
+        if path.is_file() and path.suffix.lower() in suffixes
+    )
+
+
+def url_for(path: Path, root: Path, base_url: str) -> str:
+    """Derive the URL of a file from its path below the root directory.
+
+    Args:
+        path (Path): The file.
+        root (Path): The root directory of the import.
+        base_url (str): The URL the root directory is published at.
+
+    Returns:
+        str: The URL, e.g. docs/api/index.md -> {base_url}/docs/api.
+    """
+    relative = path.relative_to(root).with_suffix("")
+    parts = list(relative.parts)
+    if parts and parts[-1].lower() == "index":
+        parts.pop()
+    return "/".join([base_url.rstrip("/"), *parts])
+
+
+def parse_file(path: str, root: str, base_url: str) -> dict:
+    """Read a markdown or HTML file into a Firecrawl document event.
+
+    Runs in a worker process.
+
+    Args:
+        path (str): The file.
+        root (str): The root directory of the import.
+        base_url (str): The URL the root directory is published at.
+
+    Returns:
+        dict: The event detail, with the markdown and metadata of the page.
+    """
+    file = Path(path)
+    text = file.read_text(encoding="utf-8", errors="replace")
+    if file.suffix.lower() in HTML_SUFFIXES:
+        markdown, title = html_to_markdown(text)
+    else:
+        markdown = text
+        heading = re.search(r"^#\s+(.+)$", text, re.MULTILINE)
+        title = heading.group(1).strip() if heading else ""
+    url = url_for(file, Path(root), base_url)
+    return {
+        "data": {
+            "markdown": markdown,
+            "metadata": {
+                "url": url,
+                "sourceURL": url,
+                "title": title or file.stem,
+                "source_path": str(file.relative_to(root)),
+            },
+        }
+    }
+
+
+class _JSONReader:
+    def __init__(self, file: TextIO, read_size: int = JSON_READ_SIZE):
+        """Initialize the _JSONReader.
+
+        Decodes the values of a JSON file one at a time, so only the value being
+        decoded and the rest of the current read are held in memory.
+
+        Args:
+            file (TextIO): The file.
+            read_size (int): The number of characters read at a time. Defaults to
+                JSON_READ_SIZE.
+        """
+        self.file = file
+        self.read_size = read_size
+        self._buffer = ""
+        self._position = 0
+        self._decoder = json.JSONDecoder()
+
+    def _read(self, size: int) -> bool:
+        data = self.file.read(size)
+        if not data:
+            return False
+        self._buffer = self._buffer[self._position :] + data
+        self._position = 0
+        return True
+
+    def peek(self) -> str:
+        """Skip whitespace and get the next character.
+
+        Returns:
+            str: The character, or "" at the end of the file.
+        """
+        while True:
+            while (
+                self._position < len(self._buffer)
+                and self._buffer[self._position] in JSON_WHITESPACE
+            ):
+                self._position += 1
+            if self._position < len(self._buffer) or not self._read(self.read_size):
+                return self._buffer[self._position : self._position + 1]
+
+    def expect(self, characters: str) -> str:
+        """Consume the next character, which must be one of the given ones.
+
+        Args:
+            characters (str): The allowed characters.
+
+        Returns:
+            str: The character.
+
+        Raises:
+            ValueError: If the next character is another one.
+        """
+        character = self.peek()
+        if not character or character not in characters:
+            raise ValueError(
+                f"Expected one of {characters!r} in the JSON dump, found {character!r}"
+            )
+        self._position += 1
+        return character
+
+    def value(self):
+        """Decode the next value, reading on until it is complete.
+
+        Returns:
+            The value.
+
+        Raises:
+            json.JSONDecodeError: If the value is invalid.
+        """
+        self.peek()
+        size = self.read_size
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._position)
+            except json.JSONDecodeError:
+                if not self._read(size):
+                    raise
+                size *= 2
+                continue
+            # A number at the end of the read may go on in the next one
+            if end < len(self._buffer) or not self._read(size):
+                self._position = end
+                return value
+
+    def array(self) -> Iterator:
+        """Decode the items of the array that starts at the next character.
+
+        Yields:
+            The value of each item.
+        """
+        self.expect("[")
+        if self.peek() == "]":
+            self._position += 1
+            return
+        while True:
+            yield self.value()
+            if self.expect(",]") == "]":
+                return
+
+
+def read_json_documents(file: TextIO) -> Iterator[dict]:
+    """Read the documents of a JSON crawl dump incrementally.
+
+    Args:
+        file (TextIO): The JSON of a crawl status response ({"data": [...]}), or a
+            JSON list of documents.
+
+    Yields:
+        dict: Each document.
+    """
+    reader = _JSONReader(file)
+    if reader.peek() == "[":
+        yield from reader.array()
+        return
+    reader.expect("{")
+    if reader.peek() == "}":
+        return
+    while True:
+        key = reader.value()
+        reader.expect(":")
+        if key == "data" and reader.peek() == "[":
+            yield from reader.array()
+        else:
+            reader.value()
+        if reader.expect(",}") == "}":
+            return
+
+
+def read_dump(path: Path) -> Iterator[dict]:
+    """Read the documents of a saved Firecrawl crawl.
+
+    Accepts the JSON of a crawl status response ({"data": [...]}), a JSON list of
+    documents, or JSON Lines of documents or of watcher "document" events. Both are
+    read incrementally, so a large dump is never held in memory. The file is closed
+    once the generator is exhausted or closed.
+
+    Args:
+        path (Path): The dump file.
+
+    Yields:
+        dict: The event detail of each document.
+    """
+    with path.open(encoding="utf-8") as file:
+        if path.suffix.lower() == ".json":
+            for document in read_json_documents(file):
+                yield {"data": document}
+            return
+        for line in file:
+            if not line.strip():
+                continue
+            document = json.loads(line)
+            if document.get("type") == "document" and "data" in document:
+                document = document["data"]
+            yield {"data": document}
+
+
+class LocalImporter:
+    def __init__(self, workers: Optional[int] = None, root: Optional[str] = None):
+        """Initialize the LocalImporter.
+
+        Args:
+            workers (int, optional): The number of processes parsing files. Defaults
+                to the number of CPU cores.
+            root (str, optional): The directory that imports requested over the API
+                must be inside. Defaults to None, which rejects them.
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self.root = root
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def resolve(self, path: str) -> str:
+        """Resolve a path requested over the API against the import root.
+
+        Args:
+            path (str): The path, relative to the import root.
+
+        Returns:
+            str: The absolute path.
+
+        Raises:
+            ValueError: If imports are disabled or the path leaves the import root.
+        """
+        if self.root is None:
+            raise ValueError("Imports are disabled, set IMPORT_ROOT to enable them")
+        root = Path(self.root).resolve()
+        resolved = (root / path).resolve()
+        if not resolved.is_relative_to(root):
+            raise ValueError(f"{path} is outside the import root")
+        return str(resolved)
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self._executor
+
+    async def documents(self, path: str, base_url: str) -> AsyncIterator[dict]:
+        """Read the documents of a directory or a crawl dump, in order.
+
+        Files are parsed in parallel, with a bounded number in flight, so a slow
+        consumer holds back the parsing.
+
+        Args:
+            path (str): A directory of markdown/HTML files, or a crawl dump.
+            base_url (str): The URL a directory is published at.
+
+        Yields:
+            dict: The event detail of each document.
+
+        Raises:
+            FileNotFoundError: If the path does not exist.
+        """
+        root = Path(path).resolve()
+        if not root.exists():
+            raise FileNotFoundError(f"No such file or directory: {path}")
+
+        loop = asyncio.get_running_loop()
+        if root.is_file():
+            dump = read_dump(root)
+            # The dump is read and closed on worker threads, one call at a time
+            lock = threading.Lock()
+
+            def read_next() -> Optional[dict]:
+                with lock:
+                    return next(dump, None)
+
+            def close():
+                with lock:
+                    dump.close()
+
+            try:
+                while (detail := await asyncio.to_thread(read_next)) is not None:
+                    yield detail
+            finally:
+                await asyncio.to_thread(close)
+            return
+
+        files = await asyncio.to_thread(find_files, root)
+        in_flight: deque[asyncio.Future] = deque()
+        try:
+            for file in files:
+                in_flight.append(
+                    loop.run_in_executor(
+                        self._get_executor(), parse_file, str(file), str(root), base_url
+                    )
+                )
+                if len(in_flight) >= self.workers * 2:
+                    yield await in_flight.popleft()
+            while in_flight:
+                yield await in_flight.popleft()
+        finally:
+            for future in in_flight:
+                future.cancel()
+
+    def close(self):
+        """Shut down the worker processes."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+async def _main(args):
+    from qdrant_client import AsyncQdrantClient
+
+    from fastapi_backend.src.db.embeddings import create_embedder
+    from fastapi_backend.src.db.ingestion import IngestionPipeline
+    from fastapi_backend.src.db.vector_store import VectorStore
+    from fastapi_backend.src.firecrawler.firecrawler import FirecrawlService
+    from fastapi_backend.src.firecrawler.jobs import CrawlJobManager
+
+    vector_store = VectorStore(
+        AsyncQdrantClient(location=args.qdrant_url),
+        embedder=create_embedder("fastembed", model_name=args.embedding_model),
+        hybrid=args.hybrid,
+    )
+    pipeline = IngestionPipeline(vector_store)
+    await pipeline.start()
+    service = FirecrawlService(
+        None, pipeline, importer=LocalImporter(args.workers), workers=args.workers
+    )
+    await service.start()
+    jobs = CrawlJobManager(service)
+    try:
+        job = jobs.submit(
+            args.url or Path(args.path).resolve().as_uri(),
+            limit=args.limit,
+            recrawl=args.recrawl,
+            source_path=args.path,
+        )
+        await jobs.wait(job)
+        report = job.to_dict()
+        seconds = (job.finished_at or 0) - (job.started_at or 0)
+        report["documents_per_second"] = job.processed / seconds if seconds else 0.0
+        report["chunks_per_second"] = job.chunks / seconds if seconds else 0.0
+        print(json.dumps(report, indent=2))
+    finally:
+        await jobs.close()
+        await service.stop()
+        await pipeline.stop()
+        await vector_store.close()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Import a local docs tree or a Firecrawl dump."
+    )
+    parser.add_argument("path", help="A directory of markdown/HTML, or a crawl dump")
+    parser.add_argument("--url", help="The URL the directory is published at")
+    parser.add_argument("--qdrant-url", default=":memory:")
+    parser.add_argument("--embedding-model", default="BAAI/bge-small-en")
+    parser.add_argument("--hybrid", action="store_true")
+    parser.add_argument("--recrawl", action="store_true")
+    parser.add_argument("--limit", type=int, default=1_000_000)
+    parser.add_argument("--workers", type=int, default=None)
+    asyncio.run(_main(parser.parse_args()))
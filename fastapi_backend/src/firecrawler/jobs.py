@@ -0,0 +1,613 @@
+"""
+Crawl jobs for the Firecrawl service.
+This module contains the state of a single crawl and a manager that runs many crawls
+concurrently up to a global cap.
+"""
+
+import asyncio
+import time
+import uuid
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Optional
+
+from loguru import logger
+
+from fastapi_backend.src.db.profiles import get_profile
+from fastapi_backend.src.firecrawler.store import CrawlJobStore
+
+CrawlListener = Callable[[dict], Awaitable[None]]
+
+# Events held for a subscriber that has not sent them yet
+SUBSCRIBER_QUEUE_SIZE = 1000
+
+
+class CrawlStatus(str, Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+
+FINISHED_STATUSES = (CrawlStatus.COMPLETED, CrawlStatus.FAILED, CrawlStatus.CANCELLED)
+
+# Fields of a CrawlJob saved at a checkpoint, besides its status and completed pages
+PERSISTED_FIELDS = (
+    "url",
+    "limit",
+    "recrawl",
+    "profile",
+    "source_path",
+    "id",
+    "firecrawl_id",
+    "documents",
+    "chunks",
+    "failed_documents",
+    "unchanged",
+    "deleted_pages",
+    "processed",
+    "backpressure_waits",
+    "queue_wait_seconds",
+    "processing_seconds",
+    "errors",
+    "created_at",
+    "started_at",
+    "finished_at",
+    "checkpointed_at",
+)
+
+
+class CrawlSubscriber:
+    def __init__(
+        self, listener: CrawlListener, max_events: int = SUBSCRIBER_QUEUE_SIZE
+    ):
+        """Initialize the CrawlSubscriber and start its sender task.
+
+        The events of a job are queued for each subscriber and sent by its own task,
+        so a slow subscriber never holds up the crawl or the ingestion workers.
+
+        Args:
+            listener: The async function called with every event.
+            max_events (int): The number of events queued before the subscriber is
+                closed for falling behind. Defaults to SUBSCRIBER_QUEUE_SIZE.
+        """
+        self.listener = listener
+        self.overflowed = False
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_events)
+        self._task = asyncio.create_task(self._send())
+
+    @property
+    def closed(self) -> bool:
+        return self._task.done()
+
+    async def _send(self):
+        while True:
+            payload = await self._queue.get()
+            try:
+                await self.listener(payload)
+            except Exception as e:
+                logger.warning(f"Crawl job subscriber failed: {e}")
+                return
+            finally:
+                self._queue.task_done()
+
+    def put(self, payload: dict) -> bool:
+        """Queue an event for the listener.
+
+        Args:
+            payload (dict): The event.
+
+        Returns:
+            bool: False if the subscriber is closed, or has been closed because
+                its queue is full.
+        """
+        if self.closed:
+            return False
+        try:
+            self._queue.put_nowait(payload)
+        except asyncio.QueueFull:
+            self.overflowed = True
+            self.close()
+            return False
+        return True
+
+    async def drain(self, timeout: float):
+        """Wait until the queued events have been sent, or the timeout elapsed.
+
+        Args:
+            timeout (float): The maximum number of seconds to wait.
+        """
+        if self.closed:
+            return
+        sent = asyncio.ensure_future(self._queue.join())
+        await asyncio.wait({sent, self._task}, timeout=timeout)
+        sent.cancel()
+
+    async def wait_closed(self):
+        """Wait until the subscriber is closed, by an error, an overflow or close."""
+        await asyncio.wait({self._task})
+
+    def close(self):
+        """Stop sending events."""
+        self._task.cancel()
+
+
+def collection_name_for(root_url: str) -> str:
+    """Derive the collection name of a crawl from its root URL.
+
+    Args:
+        root_url (str): The root URL of the crawl.
+
+    Returns:
+        str: The alphanumeric characters of the root URL.
+    """
+    return "".join([char for char in root_url if char.isalnum()])
+
+
+@dataclass
+class CrawlJob:
+    """The state of a single crawl: its target, counters and subscribers.
+
+    Pages count as completed once their chunks have been flushed at a checkpoint. A
+    job resumed after a restart skips the completed pages.
+    """
+
+    url: str
+    limit: int = 10
+    recrawl: bool = False
+    profile: Optional[str] = None
+    source_path: Optional[str] = None
+    id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    status: CrawlStatus = CrawlStatus.QUEUED
+    firecrawl_id: Optional[str] = None
+    documents: int = 0
+    chunks: int = 0
+    failed_documents: int = 0
+    unchanged: int = 0
+    deleted_pages: int = 0
+    pending: int = 0
+    processed: int = 0
+    backpressure_waits: int = 0
+    queue_wait_seconds: float = 0.0
+    processing_seconds: float = 0.0
+    errors: list[str] = field(default_factory=list)
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    _subscribers: list[CrawlSubscriber] = field(default_factory=list, repr=False)
+    known_documents: dict[str, dict] = field(default_factory=dict, repr=False)
+    seen_sources: set[str] = field(default_factory=set, repr=False)
+    # The number of chunks written for each completed or processed page
+    completed_sources: dict[str, int] = field(default_factory=dict, repr=False)
+    processed_sources: dict[str, int] = field(default_factory=dict, repr=False)
+    resumed: bool = False
+    checkpointed_at: Optional[float] = None
+    # The stage stats of the job's collection when the job started, see
+    # FirecrawlService.job_stats
+    stage_baseline: Optional[dict] = field(default=None, repr=False)
+    _task: Optional[asyncio.Task] = field(default=None, repr=False)
+    _processed_event: asyncio.Event = field(default_factory=asyncio.Event, repr=False)
+
+    @property
+    def root_url(self) -> str:
+        return str(self.url).rstrip("/")
+
+    @property
+    def collection_name(self) -> str:
+        return collection_name_for(self.root_url)
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED_STATUSES
+
+    def record_processed(self, wait_seconds: float, process_seconds: float):
+        """Record that a queued document of the job has been ingested.
+
+        Args:
+            wait_seconds (float): The time the document waited in the queue.
+            process_seconds (float): The time it took to ingest the document.
+        """
+        self.pending -= 1
+        self.processed += 1
+        self.queue_wait_seconds += wait_seconds
+        self.processing_seconds += process_seconds
+        if self.pending == 0:
+            self._processed_event.set()
+
+    async def wait_processed(self):
+        """Wait until every queued document of the job has been ingested."""
+        while self.pending > 0:
+            self._processed_event.clear()
+            await self._processed_event.wait()
+
+    def progress(self) -> dict:
+        """Get the ingestion progress of the job.
+
+        Returns:
+            dict: The document counters and average latencies.
+        """
+        return {
+            "documents": self.documents,
+            "processed": self.processed,
+            "pending": self.pending,
+            "chunks": self.chunks,
+            "unchanged": self.unchanged,
+            "avg_queue_wait_seconds": (
+                self.queue_wait_seconds / self.processed if self.processed else 0.0
+            ),
+            "avg_processing_seconds": (
+                self.processing_seconds / self.processed if self.processed else 0.0
+            ),
+            "backpressure_waits": self.backpressure_waits,
+        }
+
+    def throughput(self) -> dict:
+        """Get the average rates of the job since it started.
+
+        Returns:
+            dict: The elapsed seconds and the pages received, pages ingested and
+                chunks produced per second.
+        """
+        if self.started_at is None:
+            elapsed = 0.0
+        else:
+            elapsed = (self.finished_at or time.time()) - self.started_at
+        return {
+            "elapsed_seconds": elapsed,
+            "pages_per_second": self.documents / elapsed if elapsed else 0.0,
+            "ingested_per_second": self.processed / elapsed if elapsed else 0.0,
+            "chunks_per_second": self.chunks / elapsed if elapsed else 0.0,
+        }
+
+    def subscribe(
+        self, listener: CrawlListener, max_events: int = SUBSCRIBER_QUEUE_SIZE
+    ) -> CrawlSubscriber:
+        """Register an async function called with every event of the job.
+
+        Args:
+            listener: The function to call.
+            max_events (int): The number of events queued for the function before
+                it is dropped for falling behind. Defaults to SUBSCRIBER_QUEUE_SIZE.
+
+        Returns:
+            CrawlSubscriber: The subscriber, which is closed once it is dropped.
+        """
+        subscriber = CrawlSubscriber(listener, max_events)
+        self._subscribers.append(subscriber)
+        return subscriber
+
+    def unsubscribe(self, listener: CrawlListener):
+        """Remove a function registered with subscribe.
+
+        Args:
+            listener: The function to remove.
+        """
+        for subscriber in list(self._subscribers):
+            if subscriber.listener == listener:
+                subscriber.close()
+                self._subscribers.remove(subscriber)
+
+    async def emit(self, event: str, **data):
+        """Queue an event for every subscriber, without waiting for it to be sent.
+
+        A subscriber that failed, or whose queue is full, is dropped.
+
+        Args:
+            event (str): The event type.
+            **data: The fields of the event.
+        """
+        payload = {"event": event, "job_id": self.id, **data}
+        for subscriber in list(self._subscribers):
+            if subscriber.put(payload):
+                continue
+            reason = "too slow" if subscriber.overflowed else "failed"
+            logger.warning(f"Dropping subscriber of crawl job {self.id}: {reason}")
+            self._subscribers.remove(subscriber)
+
+    def to_dict(self) -> dict:
+        """Get the public state of the job.
+
+        Returns:
+            dict: The job state.
+        """
+        return {
+            "id": self.id,
+            "url": self.root_url,
+            "limit": self.limit,
+            "recrawl": self.recrawl,
+            "profile": self.profile,
+            "source_path": self.source_path,
+            "collection_name": self.collection_name,
+            "status": self.status.value,
+            "firecrawl_id": self.firecrawl_id,
+            **self.progress(),
+            "failed_documents": self.failed_documents,
+            "deleted_pages": self.deleted_pages,
+            "errors": self.errors[-10:],
+            "resumed": self.resumed,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "checkpointed_at": self.checkpointed_at,
+        }
+
+    def to_state(self) -> dict:
+        """Get the state of the job that is persisted at a checkpoint.
+
+        Returns:
+            dict: The job settings, status, counters and completed pages.
+        """
+        return {
+            **{name: getattr(self, name) for name in PERSISTED_FIELDS},
+            "status": self.status.value,
+            "completed_sources": self.completed_sources,
+        }
+
+    @classmethod
+    def from_state(cls, state: dict) -> "CrawlJob":
+        """Restore a job from its persisted state.
+
+        The page counters of an unfinished job are reset to its completed pages, as
+        the pages processed after the last checkpoint are processed again.
+
+        Args:
+            state (dict): The state saved by to_state.
+
+        Returns:
+            CrawlJob: The job, without subscribers or a running task.
+        """
+        job = cls(**{name: state[name] for name in PERSISTED_FIELDS if name in state})
+        job.status = CrawlStatus(state["status"])
+        job.completed_sources = dict(state.get("completed_sources", {}))
+        job.seen_sources = set(job.completed_sources)
+        if not job.finished:
+            job.documents = job.processed = len(job.completed_sources)
+            job.chunks = sum(job.completed_sources.values())
+            job.unchanged = 0
+        return job
+
+
+class CrawlJobManager:
+    def __init__(
+        self,
+        firecrawl_service,
+        max_concurrent_crawls: int = 4,
+        max_finished_jobs: int = 100,
+        store: Optional[CrawlJobStore] = None,
+        checkpoint_interval: float = 10.0,
+        stats_interval: float = 2.0,
+    ):
+        """Initialize the CrawlJobManager.
+
+        Jobs run as background tasks, independent of the clients watching them. With
+        a store, the state of every job is saved when it changes status and at a
+        checkpoint every checkpoint_interval seconds, and unfinished jobs are resumed
+        by resume() after a restart. Running jobs send a "stats" event with their
+        throughput and stage timings every stats_interval seconds.
+
+        Args:
+            firecrawl_service: The FirecrawlService that runs the crawls.
+            max_concurrent_crawls (int): The number of crawls running at once across
+                the deployment. Further jobs wait in the queued state. Defaults to 4.
+            max_finished_jobs (int): The number of finished jobs kept for inspection.
+                Defaults to 100.
+            store (CrawlJobStore, optional): Persists the jobs. Defaults to None.
+            checkpoint_interval (float): The number of seconds between two checkpoints
+                of a running job. Defaults to 10.0.
+            stats_interval (float): The number of seconds between two "stats"
+                events of a running job. Defaults to 2.0.
+        """
+        self.firecrawl_service = firecrawl_service
+        self.max_concurrent_crawls = max_concurrent_crawls
+        self.max_finished_jobs = max_finished_jobs
+        self.store = store
+        self.checkpoint_interval = checkpoint_interval
+        self.stats_interval = stats_interval
+        self._semaphore = asyncio.Semaphore(max_concurrent_crawls)
+        self._closing = False
+        self.jobs: OrderedDict[str, CrawlJob] = OrderedDict()
+
+    def submit(
+        self,
+        url: str,
+        limit: int = 10,
+        recrawl: bool = False,
+        profile: Optional[str] = None,
+        source_path: Optional[str] = None,
+    ) -> CrawlJob:
+        """Create a crawl job and start it once a crawl slot is free.
+
+        Args:
+            url (str): The URL to crawl.
+            limit (int): The maximum number of pages to crawl. Defaults to 10.
+            recrawl (bool): Skip pages that have not changed since the last crawl and
+                delete pages that are gone. Defaults to False.
+            profile (str, optional): The storage profile of the job's collection,
+                applied before the crawl starts. Defaults to None, which keeps the
+                profile of an existing collection.
+            source_path (str, optional): Import this local directory of
+                markdown/HTML files, or this Firecrawl crawl dump, instead of
+                crawling. The URL is then where the files are published. Defaults
+                to None.
+
+        Returns:
+            CrawlJob: The new job.
+
+        Raises:
+            ValueError: If the profile is unknown.
+        """
+        if profile is not None:
+            get_profile(profile)
+        job = CrawlJob(
+            url=str(url),
+            limit=limit,
+            recrawl=recrawl,
+            profile=profile,
+            source_path=source_path,
+        )
+        self._start(job)
+        logger.info(f"Submitted crawl job {job.id} for {job.root_url}")
+        return job
+
+    def _start(self, job: CrawlJob):
+        self.jobs[job.id] = job
+        self._prune_finished()
+        job._task = asyncio.create_task(self._run(job))
+
+    async def resume(self):
+        """Load the stored jobs and resume the ones that had not finished."""
+        if self.store is None:
+            return
+        for state in await self.store.aload_all():
+            job = CrawlJob.from_state(state)
+            if job.finished:
+                self.jobs[job.id] = job
+                continue
+            job.status = CrawlStatus.QUEUED
+            job.resumed = True
+            logger.info(
+                f"Resuming crawl job {job.id} for {job.root_url} with "
+                f"{len(job.completed_sources)} completed pages"
+            )
+            self._start(job)
+
+    async def checkpoint(self, job: CrawlJob):
+        """Flush the job's ingested pages and save its state.
+
+        Args:
+            job (CrawlJob): The job.
+        """
+        if self.store is None:
+            return
+        try:
+            await self.firecrawl_service.checkpoint(job)
+        finally:
+            # Saved even if the flush failed, without marking its pages completed
+            job.checkpointed_at = time.time()
+            await self.store.asave(job.to_state())
+
+    async def _checkpoint_periodically(self, job: CrawlJob):
+        while True:
+            await asyncio.sleep(self.checkpoint_interval)
+            try:
+                await self.checkpoint(job)
+            except Exception as e:
+                logger.error(f"Failed to checkpoint crawl job {job.id}: {e}")
+
+    async def _report_periodically(self, job: CrawlJob):
+        while True:
+            await asyncio.sleep(self.stats_interval)
+            await job.emit("stats", **self.firecrawl_service.job_stats(job))
+
+    async def _run(self, job: CrawlJob):
+        try:
+            if self.store is not None:
+                await self.store.asave(job.to_state())
+            async with self._semaphore:
+                job.status = CrawlStatus.RUNNING
+                job.started_at = job.started_at or time.time()
+                await job.emit("started", url=job.root_url, resumed=job.resumed)
+                checkpoints = asyncio.create_task(self._checkpoint_periodically(job))
+                reports = asyncio.create_task(self._report_periodically(job))
+                try:
+                    await self.firecrawl_service.run_job(job)
+                finally:
+                    checkpoints.cancel()
+                    reports.cancel()
+                    await asyncio.gather(checkpoints, reports, return_exceptions=True)
+                job.status = CrawlStatus.COMPLETED
+        except asyncio.CancelledError:
+            if self._closing:
+                # Shutting down: leave the Firecrawl crawl running and resume the
+                # job after the restart
+                job.status = CrawlStatus.QUEUED
+            else:
+                job.status = CrawlStatus.CANCELLED
+                await self.firecrawl_service.cancel_job(job)
+        except Exception as e:
+            logger.error(f"Crawl job {job.id} failed: {e}")
+            job.status = CrawlStatus.FAILED
+            job.errors.append(str(e))
+        finally:
+            if job.finished:
+                job.finished_at = time.time()
+            try:
+                await self.checkpoint(job)
+            except Exception as e:
+                logger.error(f"Failed to checkpoint crawl job {job.id}: {e}")
+            if job.finished:
+                await job.emit("stats", **self.firecrawl_service.job_stats(job))
+                await job.emit("done", status=job.status.value)
+
+    def _prune_finished(self):
+        finished = [job_id for job_id, job in self.jobs.items() if job.finished]
+        for job_id in finished[: max(0, len(finished) - self.max_finished_jobs)]:
+            del self.jobs[job_id]
+
+    def get(self, job_id: str) -> Optional[CrawlJob]:
+        """Get a job by ID.
+
+        Args:
+            job_id (str): The ID of the job.
+
+        Returns:
+            Optional[CrawlJob]: The job, or None if it is unknown.
+        """
+        return self.jobs.get(job_id)
+
+    def list(self) -> list[CrawlJob]:
+        """Get all known jobs, oldest first.
+
+        Returns:
+            list[CrawlJob]: The jobs.
+        """
+        return list(self.jobs.values())
+
+    async def wait(self, job: CrawlJob):
+        """Wait until a job has finished.
+
+        Args:
+            job (CrawlJob): The job.
+        """
+        if job._task is not None:
+            await asyncio.shield(job._task)
+
+    async def cancel(self, job_id: str) -> bool:
+        """Cancel a queued or running job.
+
+        Args:
+            job_id (str): The ID of the job.
+
+        Returns:
+            bool: Whether the job was cancelled.
+        """
+        job = self.jobs.get(job_id)
+        if job is None or job.finished or job._task is None:
+            return False
+        job._task.cancel()
+        try:
+            await job._task
+        except asyncio.CancelledError:
+            pass
+        return True
+
+    def stats(self) -> dict:
+        """Get the number of jobs in each state.
+
+        Returns:
+            dict: The job counts and the concurrency cap.
+        """
+        counts = {status.value: 0 for status in CrawlStatus}
+        for job in self.jobs.values():
+            counts[job.status.value] += 1
+        return {"max_concurrent_crawls": self.max_concurrent_crawls, **counts}
+
+    async def close(self):
+        """Stop every unfinished job. With a store they resume after a restart,
+        otherwise they are cancelled."""
+        self._closing = self.store is not None
+        for job_id in [job.id for job in self.jobs.values() if not job.finished]:
+            await self.cancel(job_id)
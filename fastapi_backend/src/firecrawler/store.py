@@ -0,0 +1,91 @@
+"""
+Persistent store of crawl jobs.
+This module saves the state and progress checkpoints of crawl jobs in SQLite, so that
+jobs can be listed after a restart and unfinished ones resumed.
+"""
+
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+
+
+class CrawlJobStore:
+    def __init__(self, path: str, max_finished_jobs: int = 100):
+        """Initialize the CrawlJobStore.
+
+        Args:
+            path (str): The path of the SQLite database file.
+            max_finished_jobs (int): The number of finished jobs kept. Older ones are
+                deleted when a job is saved. Defaults to 100.
+        """
+        self.path = path
+        self.max_finished_jobs = max_finished_jobs
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.executescript(
+            """
+            PRAGMA journal_mode=WAL;
+            PRAGMA synchronous=NORMAL;
+            CREATE TABLE IF NOT EXISTS crawl_jobs (
+                id TEXT PRIMARY KEY,
+                finished INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                state TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS crawl_jobs_finished
+                ON crawl_jobs (finished, updated_at);
+            """
+        )
+
+    def save(self, state: dict):
+        """Insert or replace the state of a job.
+
+        Args:
+            state (dict): The state of the job, see CrawlJob.to_state.
+        """
+        finished = int(state["status"] in ("completed", "failed", "cancelled"))
+        with self._lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO crawl_jobs "
+                "(id, finished, created_at, updated_at, state) VALUES (?, ?, ?, ?, ?)",
+                (
+                    state["id"],
+                    finished,
+                    state["created_at"],
+                    time.time(),
+                    json.dumps(state),
+                ),
+            )
+            if finished:
+                self.conn.execute(
+                    "DELETE FROM crawl_jobs WHERE finished = 1 AND id NOT IN ("
+                    "SELECT id FROM crawl_jobs WHERE finished = 1 "
+                    "ORDER BY updated_at DESC LIMIT ?)",
+                    (self.max_finished_jobs,),
+                )
+
+    def load_all(self) -> list[dict]:
+        """Load the state of every stored job, oldest first.
+
+        Returns:
+            list[dict]: The job states.
+        """
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT state FROM crawl_jobs ORDER BY created_at"
+            ).fetchall()
+        return [json.loads(state) for (state,) in rows]
+
+    async def asave(self, state: dict):
+        await asyncio.to_thread(self.save, state)
+
+    async def aload_all(self) -> list[dict]:
+        return await asyncio.to_thread(self.load_all)
+
+    def close(self):
+        """Close the database connection."""
+        with self._lock:
+            self.conn.close()
@@ -7,15 +7,36 @@ from fastapi import FastAPI
 from loguru import logger
 from dotenv import load_dotenv
 from fastapi.middleware.cors import CORSMiddleware
-import os
-from qdrant_client import QdrantClient
+import httpx
+from qdrant_client import AsyncQdrantClient
+from fastapi_backend.src.config import get_settings
 from fastapi_backend.src.db.vector_store import VectorStore
+from fastapi_backend.src.db.embeddings import create_embedder
+from fastapi_backend.src.db.ingestion import IngestionPipeline
 from fastapi_backend.src.firecrawler.firecrawler import FirecrawlService
+from fastapi_backend.src.firecrawler.importer import LocalImporter
+from fastapi_backend.src.firecrawler.jobs import CrawlJobManager
+from fastapi_backend.src.firecrawler.store import CrawlJobStore
+from fastapi_backend.src.askthedocs_agent.utils.answer_cache import AnswerCache
+from fastapi_backend.src.askthedocs_agent.utils.context import ContextBudget
+from fastapi_backend.src.askthedocs_agent.utils.history import HistoryPolicy
+from fastapi_backend.src.askthedocs_agent.utils.rerankers import create_reranker
+from fastapi_backend.src.askthedocs_agent.utils.checkpointers import (
+    create_checkpointer,
+)
+from fastapi_backend.src.askthedocs_agent.utils.llms import ModelRegistry
+from fastapi_backend.src.askthedocs_agent.utils.tools import search_web
+from fastapi_backend.src.askthedocs_agent.utils.retrievers import (
+    FanOutRetriever,
+    HttpRetriever,
+    LocalRetriever,
+)
 from fastapi_backend.src.routers.vector_store.router import (
     router as vector_store_router,
 )
 from fastapi_backend.src.routers.firecrawler.router import router as firecrawl_router
 from fastapi_backend.src.routers.agent.router import router as agent_router
+from fastapi_backend.src.routers.metrics.router import router as metrics_router
 
 # Import the refactored LangGraph agent
 from fastapi_backend.src.askthedocs_agent.agent import create_graph
@@ -32,33 +53,188 @@ async def lifespan(app: FastAPI):
     """
     # Startup
     load_dotenv()
+    settings = get_settings()
 
     # Check required environment variables
-    if not os.environ.get("QDRANT_URL"):
+    if not settings.qdrant_url:
         raise ValueError("QDRANT_URL environment variable is not set")
-    if not os.environ.get("FIRECRAWL_API_URL"):
-        raise ValueError("FIRECRAWL_API_URL environment variable is not set")
+    if not settings.firecrawl_api_url:
+        logger.warning("FIRECRAWL_API_URL is not set, only local imports can run")
 
     # Initialize Vector Store
-    qdrant_client = QdrantClient(url=os.environ.get("QDRANT_URL"))
-    app.state.vector_store = VectorStore(qdrant_client)
+    qdrant_client = AsyncQdrantClient(
+        url=settings.qdrant_url,
+        timeout=settings.qdrant_timeout,
+        limits=httpx.Limits(
+            max_connections=settings.qdrant_max_connections,
+            max_keepalive_connections=settings.qdrant_max_keepalive_connections,
+        ),
+    )
+    embedder = create_embedder(
+        settings.embedding_backend,
+        model_name=settings.embedding_model,
+        workers=settings.embedding_workers,
+        batch_size=settings.embedding_batch_size,
+        cache_size=settings.embedding_cache_size,
+    )
+    app.state.vector_store = VectorStore(
+        qdrant_client,
+        embedder=embedder,
+        max_workers=settings.embedding_workers,
+        query_cache_size=settings.query_cache_size,
+        search_cache_size=settings.search_cache_size,
+        search_cache_ttl=settings.search_cache_ttl,
+        hybrid=settings.hybrid_search,
+        sparse_model_name=settings.sparse_model,
+        dense_weight=settings.hybrid_dense_weight,
+        sparse_weight=settings.hybrid_sparse_weight,
+        prefetch_limit=settings.hybrid_prefetch_limit,
+        profile=settings.collection_profile,
+    )
     logger.info("Vector store initialized")
 
+    # Initialize the batched ingestion pipeline
+    app.state.ingestion_pipeline = IngestionPipeline(
+        vector_store=app.state.vector_store,
+        chunk_size=settings.ingest_chunk_size,
+        chunk_overlap=settings.ingest_chunk_overlap,
+        batch_size=settings.ingest_batch_size,
+        flush_interval=settings.ingest_flush_interval,
+        max_attempts=settings.ingest_max_attempts,
+        max_buffered_chunks=settings.ingest_max_buffered_chunks,
+    )
+    await app.state.ingestion_pipeline.start()
+    logger.info("Ingestion pipeline initialized")
+
     # Initialize Firecrawl Service
     app.state.firecrawl_service = FirecrawlService(
-        firecrawl_api_url=os.environ.get("FIRECRAWL_API_URL"),
-        vector_store=app.state.vector_store,
+        firecrawl_api_url=settings.firecrawl_api_url,
+        ingestion_pipeline=app.state.ingestion_pipeline,
+        queue_size=settings.crawl_queue_size,
+        workers=settings.crawl_ingest_workers,
+        importer=LocalImporter(
+            workers=settings.import_workers, root=settings.import_root
+        ),
     )
+    await app.state.firecrawl_service.start()
     logger.info("Firecrawl service initialized")
+    app.state.crawl_job_store = CrawlJobStore(settings.crawl_jobs_path)
+    app.state.crawl_jobs = CrawlJobManager(
+        app.state.firecrawl_service,
+        max_concurrent_crawls=settings.max_concurrent_crawls,
+        store=app.state.crawl_job_store,
+        checkpoint_interval=settings.crawl_checkpoint_interval,
+        stats_interval=settings.crawl_stats_interval,
+    )
+    await app.state.crawl_jobs.resume()
+
+    # Initialize the retriever used by the search_vector_store tool
+    if settings.retrieval_mode == "http":
+        if not settings.retrieval_http_url:
+            raise ValueError("RETRIEVAL_HTTP_URL environment variable is not set")
+        app.state.retriever = HttpRetriever(
+            base_url=settings.retrieval_http_url,
+            timeout=settings.retrieval_http_timeout,
+            max_connections=settings.retrieval_http_max_connections,
+            limit=settings.retrieval_top_k,
+            score_threshold=settings.retrieval_score_threshold,
+            max_document_chars=settings.retrieval_max_document_chars,
+        )
+    else:
+        app.state.retriever = LocalRetriever(
+            app.state.vector_store,
+            limit=settings.retrieval_top_k,
+            score_threshold=settings.retrieval_score_threshold,
+            max_document_chars=settings.retrieval_max_document_chars,
+        )
+    logger.info(f"Retriever initialized in {settings.retrieval_mode} mode")
+    app.state.fanout_retriever = FanOutRetriever(
+        app.state.retriever,
+        web_search=search_web,
+        timeout=settings.fanout_timeout,
+        web_timeout=settings.fanout_web_timeout,
+        enough_results=settings.fanout_enough_results or None,
+        min_score=settings.fanout_min_score,
+        source_top_k=settings.retrieval_top_k,
+    )
+    app.state.reranker = create_reranker(
+        settings.reranker,
+        model_name=settings.reranker_model,
+        candidates=settings.reranker_candidates,
+        top_n=settings.retrieval_top_k,
+        high_confidence=settings.reranker_high_confidence,
+        low_confidence=settings.reranker_low_confidence,
+    )
+
+    # Initialize the budget the retrieved context is packed into
+    app.state.context_budget = None
+    if settings.context_budget_enabled:
+        app.state.context_budget = ContextBudget(
+            max_tokens=settings.context_max_tokens,
+            max_passage_tokens=settings.context_max_passage_tokens,
+            grader_max_tokens=settings.context_grader_max_tokens,
+        )
+
+    # Initialize the policy that bounds the history sent to the agent model
+    app.state.history_policy = None
+    if settings.history_policy_enabled:
+        app.state.history_policy = HistoryPolicy(
+            max_tokens=settings.history_max_tokens,
+            window_turns=settings.history_window_turns,
+            summary_batch_turns=settings.history_summary_batch_turns,
+            summarize=settings.history_summarize,
+        )
+
+    # Initialize the chat models and chains shared by every graph run
+    app.state.models = ModelRegistry(
+        agent_model=settings.agent_model,
+        rewrite_model=settings.rewrite_model,
+        generate_model=settings.generate_model,
+        grader_model=settings.grader_model,
+        summary_model=settings.summary_model,
+        temperature=settings.llm_temperature,
+        timeout=settings.llm_timeout,
+        max_retries=settings.llm_max_retries,
+        max_connections=settings.llm_max_connections,
+    )
+    logger.info("Model registry initialized")
+
+    # Initialize the answer cache, invalidated by writes to a collection
+    app.state.answer_cache = None
+    if settings.answer_cache_enabled:
+        app.state.answer_cache = AnswerCache(
+            embed=app.state.vector_store.embed_query,
+            max_entries=settings.answer_cache_max_entries,
+            ttl_seconds=settings.answer_cache_ttl,
+            similarity_threshold=settings.answer_cache_similarity,
+        )
+        app.state.vector_store.add_write_listener(app.state.answer_cache.invalidate)
+        logger.info("Answer cache initialized")
 
     # Initialize the refactored LangGraph agent using the lifespan event
-    app.state.graph = create_graph()
+    app.state.checkpointer = create_checkpointer(
+        backend=settings.checkpointer_backend,
+        path=settings.checkpointer_path,
+        max_threads=settings.checkpointer_max_threads,
+        memory_ttl_seconds=settings.checkpointer_memory_ttl,
+        disk_ttl_seconds=settings.checkpointer_disk_ttl,
+        max_checkpoints_per_thread=settings.checkpointer_max_checkpoints,
+        max_messages_per_thread=settings.checkpointer_max_messages,
+    )
+    app.state.graph = create_graph(checkpointer=app.state.checkpointer)
     logger.info("LangGraph initialized")
 
     yield
 
     # Cleanup
-    await qdrant_client.close()
+    await app.state.crawl_jobs.close()
+    await app.state.firecrawl_service.stop()
+    app.state.crawl_job_store.close()
+    await app.state.retriever.close()
+    await app.state.models.aclose()
+    await app.state.checkpointer.aclose()
+    await app.state.ingestion_pipeline.stop()
+    await app.state.vector_store.close()
     logger.info("Vector store connection closed")
 
 
@@ -76,3 +252,4 @@ app.add_middleware(
 app.include_router(vector_store_router)
 app.include_router(firecrawl_router)
 app.include_router(agent_router)
+app.include_router(metrics_router)
@@ -0,0 +1,362 @@
+"""
+Process metrics in the Prometheus text format.
+This module contains minimal counters, gauges and histograms with labels, a registry
+that renders them for the /metrics endpoint, and the metrics of the crawl and
+ingestion pipeline and of the agent graph.
+"""
+
+import math
+import threading
+from collections.abc import Iterator, Sequence
+from typing import Optional
+
+# Latency buckets in seconds, from a fast cache hit to a slow embedding batch
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(
+        '{}="{}"'.format(
+            name,
+            str(value).replace("\\", r"\\").replace("\n", r"\n").replace('"', r"\""),
+        )
+        for name, value in zip(names, values)
+    )
+    return "{" + pairs + "}"
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, description: str, labels: Sequence[str] = ()):
+        """Initialize a metric.
+
+        Args:
+            name (str): The metric name.
+            description (str): The help text of the metric.
+            labels (Sequence[str]): The label names. Defaults to no labels.
+        """
+        self.name = name
+        self.description = description
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict[str, str]) -> tuple[str, ...]:
+        if set(labels) != set(self.label_names):
+            raise ValueError(
+                f"{self.name} expects the labels {self.label_names}, got {tuple(labels)}"
+            )
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def samples(self) -> Iterator[tuple[str, str, float]]:
+        """Yield the name suffix, the formatted labels and the value of each sample."""
+        raise NotImplementedError
+
+    def render(self) -> str:
+        """Render the metric in the Prometheus text format.
+
+        Returns:
+            str: The HELP and TYPE lines followed by one line per sample.
+        """
+        lines = [
+            f"# HELP {self.name} {self.description}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        lines.extend(
+            f"{self.name}{suffix}{labels} {_format_value(value)}"
+            for suffix, labels, value in self.samples()
+        )
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, description: str, labels: Sequence[str] = ()):
+        super().__init__(name, description, labels)
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str):
+        """Increase the counter.
+
+        Args:
+            amount (float): The increment, which must not be negative. Defaults to 1.
+            **labels: The label values.
+        """
+        if amount < 0:
+            raise ValueError("Counters can only increase")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        """Get the current value of the counter.
+
+        Args:
+            **labels: The label values.
+
+        Returns:
+            float: The value, 0 if it was never increased.
+        """
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> Iterator[tuple[str, str, float]]:
+        with self._lock:
+            values = list(self._values.items())
+        for key, value in values:
+            yield "", _format_labels(self.label_names, key), value
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def inc(self, amount: float = 1.0, **labels: str):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: str):
+        """Decrease the gauge.
+
+        Args:
+            amount (float): The decrement. Defaults to 1.
+            **labels: The label values.
+        """
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels: str):
+        """Set the gauge.
+
+        Args:
+            value (float): The new value.
+            **labels: The label values.
+        """
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        description: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        """Initialize a histogram.
+
+        Args:
+            name (str): The metric name.
+            description (str): The help text of the metric.
+            labels (Sequence[str]): The label names. Defaults to no labels.
+            buckets (Sequence[float]): The upper bounds of the buckets. Defaults to
+                DEFAULT_BUCKETS.
+        """
+        super().__init__(name, description, labels)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: the count of each bucket, the sum and the count
+        self._values: dict[tuple[str, ...], tuple[list[int], float, int]] = {}
+
+    def observe(self, value: float, **labels: str):
+        """Record an observation.
+
+        Args:
+            value (float): The observed value, e.g. a latency in seconds.
+            **labels: The label values.
+        """
+        key = self._key(labels)
+        with self._lock:
+            counts, total, count = self._values.get(
+                key, ([0] * len(self.buckets), 0.0, 0)
+            )
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+                    break
+            self._values[key] = (counts, total + value, count + 1)
+
+    def samples(self) -> Iterator[tuple[str, str, float]]:
+        with self._lock:
+            values = [
+                (key, list(counts), total, count)
+                for key, (counts, total, count) in self._values.items()
+            ]
+        names = (*self.label_names, "le")
+        for key, counts, total, count in values:
+            cumulative = 0
+            for bound, bucket in zip(self.buckets, counts):
+                cumulative += bucket
+                yield "_bucket", _format_labels(names, (*key, bound)), cumulative
+            yield "_bucket", _format_labels(names, (*key, "+Inf")), count
+            yield "_sum", _format_labels(self.label_names, key), total
+            yield "_count", _format_labels(self.label_names, key), count
+
+
+class MetricsRegistry:
+    def __init__(self):
+        """Initialize an empty MetricsRegistry."""
+        self._metrics: dict[str, _Metric] = {}
+
+    def _register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(
+        self, name: str, description: str, labels: Sequence[str] = ()
+    ) -> Counter:
+        """Create and register a counter."""
+        return self._register(Counter(name, description, labels))
+
+    def gauge(self, name: str, description: str, labels: Sequence[str] = ()) -> Gauge:
+        """Create and register a gauge."""
+        return self._register(Gauge(name, description, labels))
+
+    def histogram(
+        self,
+        name: str,
+        description: str,
+        labels: Sequence[str] = (),
+        buckets: Optional[Sequence[float]] = None,
+    ) -> Histogram:
+        """Create and register a histogram."""
+        return self._register(
+            Histogram(name, description, labels, buckets or DEFAULT_BUCKETS)
+        )
+
+    def render(self) -> str:
+        """Render every registered metric in the Prometheus text format.
+
+        Returns:
+            str: The exposition, ending with a line break.
+        """
+        return "\n".join(metric.render() for metric in self._metrics.values()) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+CRAWL_DOCUMENTS = REGISTRY.counter(
+    "askthedocs_crawl_documents_received_total",
+    "Documents received from Firecrawl or a local import.",
+    ("source",),
+)
+CRAWL_DOCUMENTS_PROCESSED = REGISTRY.counter(
+    "askthedocs_crawl_documents_processed_total",
+    "Crawled documents handled by the ingestion workers, by outcome.",
+    ("outcome",),
+)
+CRAWL_ERRORS = REGISTRY.counter(
+    "askthedocs_crawl_errors_total", "Errors reported by Firecrawl crawls."
+)
+CRAWL_BACKPRESSURE_WAITS = REGISTRY.counter(
+    "askthedocs_crawl_backpressure_waits_total",
+    "Documents that waited for room in the full ingestion queue.",
+)
+CRAWL_QUEUE_WAIT_SECONDS = REGISTRY.histogram(
+    "askthedocs_crawl_queue_wait_seconds",
+    "Time crawled documents waited in the ingestion queue.",
+)
+CRAWL_PROCESSING_SECONDS = REGISTRY.histogram(
+    "askthedocs_crawl_processing_seconds",
+    "Time the ingestion workers took to process a crawled document.",
+)
+CRAWL_QUEUE_DEPTH = REGISTRY.gauge(
+    "askthedocs_crawl_queue_depth", "Documents waiting in the ingestion queue."
+)
+CRAWL_JOBS = REGISTRY.gauge(
+    "askthedocs_crawl_jobs", "Known crawl jobs by status.", ("status",)
+)
+CHUNKING_SECONDS = REGISTRY.histogram(
+    "askthedocs_ingest_chunking_seconds", "Time taken to split a document into chunks."
+)
+INGEST_PENDING_CHUNKS = REGISTRY.gauge(
+    "askthedocs_ingest_pending_chunks", "Chunks buffered for the next batch write."
+)
+EMBEDDING_SECONDS = REGISTRY.histogram(
+    "askthedocs_embedding_seconds",
+    "Time taken to embed a batch of passages.",
+    ("vector",),
+)
+UPSERT_SECONDS = REGISTRY.histogram(
+    "askthedocs_qdrant_upsert_seconds", "Latency of Qdrant upserts."
+)
+UPSERT_POINTS = REGISTRY.counter(
+    "askthedocs_qdrant_upserted_points_total", "Points written to Qdrant."
+)
+UPSERT_FAILURES = REGISTRY.counter(
+    "askthedocs_qdrant_upsert_failures_total", "Failed Qdrant upserts."
+)
+WEBSOCKET_SUBSCRIBERS = REGISTRY.gauge(
+    "askthedocs_crawl_websocket_subscribers",
+    "Websocket clients watching a crawl job.",
+)
+WEBSOCKET_EVENTS = REGISTRY.counter(
+    "askthedocs_crawl_websocket_events_total",
+    "Crawl job events sent to websocket clients, by event type.",
+    ("event",),
+)
+AGENT_STEP_SECONDS = REGISTRY.histogram(
+    "askthedocs_agent_step_seconds",
+    "Wall time of a step of the agent graph.",
+    ("step",),
+)
+AGENT_LLM_SECONDS = REGISTRY.histogram(
+    "askthedocs_agent_llm_seconds",
+    "Latency of the LLM calls of a step of the agent graph.",
+    ("step",),
+)
+AGENT_LLM_FIRST_TOKEN_SECONDS = REGISTRY.histogram(
+    "askthedocs_agent_llm_first_token_seconds",
+    "Time to the first streamed token of the LLM calls of a step.",
+    ("step",),
+)
+AGENT_TOKENS = REGISTRY.counter(
+    "askthedocs_agent_tokens_total",
+    "LLM tokens used by a step of the agent graph, by kind (prompt or completion).",
+    ("step", "kind"),
+)
+AGENT_RETRIEVED_DOCUMENTS = REGISTRY.histogram(
+    "askthedocs_agent_retrieved_documents",
+    "Documents returned by a tool call of the agent graph.",
+    ("step",),
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50),
+)
+CONTEXT_TOKENS = REGISTRY.counter(
+    "askthedocs_agent_context_tokens_total",
+    "Tokens of the tool results (retrieved) and of the context packed from them "
+    "(packed), by step.",
+    ("step", "kind"),
+)
+HISTORY_TOKENS = REGISTRY.counter(
+    "askthedocs_agent_history_tokens_total",
+    "Tokens of the full thread history (full) and of the history sent to the agent "
+    "model after windowing and summarization (sent).",
+    ("kind",),
+)
+HISTORY_SUMMARIES = REGISTRY.counter(
+    "askthedocs_agent_history_summaries_total",
+    "Rolling summaries of long threads.",
+)
+FANOUT_SOURCES = REGISTRY.counter(
+    "askthedocs_retrieval_fanout_sources_total",
+    "Sources searched by a retrieval fan-out, by kind (collection or web) and "
+    "outcome (ok, timeout, error or cancelled).",
+    ("kind", "status"),
+)
+FANOUT_SOURCE_SECONDS = REGISTRY.histogram(
+    "askthedocs_retrieval_fanout_source_seconds",
+    "Time from the start of a retrieval fan-out to the answer of a source.",
+    ("kind",),
+)
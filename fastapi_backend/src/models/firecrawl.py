@@ -2,14 +2,25 @@
 Pydantic Models for the firecrawl API.
 """
 
-from pydantic import BaseModel, HttpUrl
+from pydantic import BaseModel, Field, HttpUrl
 from typing import Optional
 
 
 class CrawlRequest(BaseModel):
     """
     Request model for initiating a crawl.
+
+    Attributes:
+        url (HttpUrl): The URL to crawl, or the URL the imported files are published at.
+        limit (int): The maximum number of pages.
+        recrawl (bool): Skip unchanged pages and delete pages that are gone.
+        profile (str, optional): The storage profile of the collection.
+        path (str, optional): Import this directory or crawl dump, relative to
+            IMPORT_ROOT, instead of crawling.
     """
 
     url: HttpUrl
-    limit: Optional[int] = 10
+    limit: int = Field(default=10, ge=1)
+    recrawl: bool = False
+    profile: Optional[str] = None
+    path: Optional[str] = None
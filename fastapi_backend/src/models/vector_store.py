@@ -2,7 +2,9 @@
 Vector Store Pydantic Models
 """
 
-from pydantic import BaseModel
+from typing import Optional, Union
+
+from pydantic import BaseModel, Field
 
 
 class DocumentInput(BaseModel):
@@ -21,6 +23,43 @@ class DocumentInput(BaseModel):
     id: str
 
 
+class BulkDocument(BaseModel):
+    """
+    A single line of a bulk upload.
+
+    Attributes:
+        collection_name (str, optional): Name of the collection to add the document
+            to. Defaults to the collection of the upload.
+        document (str): The markdown content of the document.
+        metadata (dict): Metadata copied to every chunk of the document.
+        source (str, optional): The URL or another stable identifier of the
+            document. Uploading the same source again overwrites its chunks.
+    """
+
+    collection_name: Optional[str] = None
+    document: str
+    metadata: dict = Field(default_factory=dict)
+    source: Optional[str] = None
+
+
+class SearchFilters(BaseModel):
+    """
+    Payload filters of a search. Every filter that is set must match.
+
+    Attributes:
+        url_prefix (str, optional): Only pages whose URL starts with this path,
+            e.g. "https://docs.example.com/api". Matched on whole path segments.
+        title (str, optional): Only pages whose title contains these words.
+        crawled_after (float, optional): Only pages crawled at or after this Unix time.
+        crawled_before (float, optional): Only pages crawled at or before this Unix time.
+    """
+
+    url_prefix: Optional[str] = None
+    title: Optional[str] = None
+    crawled_after: Optional[float] = None
+    crawled_before: Optional[float] = None
+
+
 class SearchQuery(BaseModel):
     """
     Input model for searching in the vector store.
@@ -28,7 +67,36 @@ class SearchQuery(BaseModel):
     Attributes:
         collection_name (str): Name of the collection to search in.
         query (str): The search query string.
+        limit (int): The maximum number of results.
+        score_threshold (float, optional): Drop results scoring below this value.
+        filters (SearchFilters, optional): Payload filters of the search.
+        fields (list[str], optional): The metadata fields to return. Defaults to
+            all fields.
+        max_document_chars (int, optional): Truncate the returned documents to this
+            many characters.
     """
 
     collection_name: str
     query: str
+    limit: int = Field(default=1, ge=1, le=100)
+    score_threshold: Optional[float] = None
+    filters: Optional[SearchFilters] = None
+    fields: Optional[list[str]] = None
+    max_document_chars: Optional[int] = Field(default=2000, ge=1)
+
+
+class SearchResult(BaseModel):
+    """
+    A single search result, without vectors.
+
+    Attributes:
+        id (Union[str, int]): The ID of the point.
+        score (float): The score of the result.
+        document (str): The chunk text, possibly truncated.
+        metadata (dict): The projected and truncated metadata of the chunk.
+    """
+
+    id: Union[str, int]
+    score: float
+    document: str
+    metadata: dict
@@ -5,13 +5,125 @@ It includes the chat endpoint that streams agent responses.
 
 from fastapi import APIRouter, Request, HTTPException
 from fastapi.responses import StreamingResponse
-import pprint
+from langchain_core.messages import AIMessage
+from collections.abc import Awaitable, Callable
+from typing import Literal, Optional
+from loguru import logger
+import json
+
+from fastapi_backend.src.askthedocs_agent.utils.history import SUMMARY_TAG
+from fastapi_backend.src.askthedocs_agent.utils.tracing import GraphTracer
 
 router = APIRouter(prefix="/agent", tags=["agent"])
 
+# Nodes whose LLM tokens are streamed to the client as they are generated
+TOKEN_STREAMING_NODES = ("agent", "generate")
+GRAPH_NODES = ("agent", "retrieve", "rewrite", "generate")
+
+
+def sse(event: str, **data) -> str:
+    """Format a typed server-sent event.
+
+    Args:
+        event (str): The type of the event.
+        **data: The fields of the event.
+
+    Returns:
+        str: The server-sent event.
+    """
+    return f"data: {json.dumps({'event': event, **data}, default=str)}\n\n"
+
+
+def trim_thread(checkpointer, values: dict) -> dict:
+    """Get the state update that trims the oldest turns of a long thread.
+
+    The summary still covers the removed messages, and the index of its end moves
+    with the removals. When they reach past it, the summary covers none of the
+    remaining messages.
+
+    Args:
+        checkpointer: The checkpointer, which bounds the messages of a thread.
+        values (dict): The state of the thread.
+
+    Returns:
+        dict: The removals and the new summarized_messages, or an empty dict if
+            the thread is within the bound.
+    """
+    removals = checkpointer.trim_messages(values.get("messages", []))
+    if not removals:
+        return {}
+    return {
+        "messages": removals,
+        "summarized_messages": max(
+            values.get("summarized_messages", 0) - len(removals), 0
+        ),
+    }
+
+
+async def stream_events(
+    graph,
+    state: dict,
+    config: dict,
+    on_final: Optional[Callable[[AIMessage], Awaitable[None]]] = None,
+    tracer: Optional[GraphTracer] = None,
+):
+    """Stream typed events for a graph run, including the LLM tokens as they arrive.
+
+    Args:
+        graph: The compiled agent graph.
+        state (dict): The input state of the run.
+        config (dict): The run config.
+        on_final (optional): An async function called with the final message.
+        tracer (GraphTracer, optional): Send the trace of the run before the final
+            event. Defaults to None.
+
+    Yields:
+        str: node_start, tool_call, token, trace, final and error server-sent events.
+    """
+    try:
+        async for event in graph.astream_events(state, config=config, version="v2"):
+            kind = event["event"]
+            node = event.get("metadata", {}).get("langgraph_node")
+
+            if (
+                kind == "on_chain_start"
+                and node in GRAPH_NODES
+                and event["name"] == node
+            ):
+                yield sse("node_start", node=event["name"])
+            elif kind == "on_tool_start":
+                yield sse(
+                    "tool_call", name=event["name"], args=event["data"].get("input")
+                )
+            elif (
+                kind == "on_chat_model_stream"
+                and node in TOKEN_STREAMING_NODES
+                and SUMMARY_TAG not in event.get("tags", [])
+            ):
+                content = event["data"]["chunk"].content
+                if content:
+                    yield sse("token", node=node, content=content)
+
+        snapshot = await graph.aget_state(config)
+        last_message = snapshot.values["messages"][-1]
+        if tracer is not None:
+            yield sse("trace", **tracer.summary())
+        yield sse("final", content=last_message.content)
+        if on_final is not None:
+            await on_final(last_message)
+    except Exception as e:
+        logger.error(f"Error while streaming agent events: {e}")
+        yield sse("error", error=str(e))
+
 
 @router.post("/chat/{thread_id}")
-async def chat(thread_id: str, request: Request, payload: dict):
+async def chat(
+    thread_id: str,
+    request: Request,
+    payload: dict,
+    stream_mode: Literal["updates", "events"] = "updates",
+    trace: bool = False,
+):
     """
     Endpoint to stream agent responses.
 
@@ -25,23 +137,42 @@ async def chat(thread_id: str, request: Request, payload: dict):
                 "collection_name": "your_collection_name"
             }
 
+            To ask about several collections at once, send "collection_names" with
+            a list of names instead. The agent then searches them concurrently.
+
+        stream_mode (str): "updates" streams the output message of every node once
+            it finishes. "events" streams typed JSON events (node_start, tool_call,
+            token, final) with the LLM tokens of the agent and generate nodes as
+            they arrive.
+        trace (bool): Also send a trace event with the wall time, LLM latency,
+            token usage and retrieval size of every step of the run. Steps are
+            traced into the metrics either way.
+
 
     Returns:
         StreamingResponse: A streaming response that yields the agent's responses.
     """
     message = payload.get("message")
-    collection_name = payload.get("collection_name")
-    if not message or not collection_name:
+    collection_names = payload.get("collection_names") or [
+        name for name in [payload.get("collection_name")] if name
+    ]
+    if not message or not collection_names:
         raise HTTPException(
             status_code=400, detail="Missing message or collection_name"
         )
+    collection_name = collection_names[0]
 
     # Build the initial state for the agent graph with a system message included.
+    if len(collection_names) == 1:
+        system_prompt = f"You are an assistant helping with documentation. Use the '{collection_name}' collection to query relevant information from the vector store ONLY IF you deem that it is required. If you query from the vector store, please provide the source of the information that can be found in the metadata."
+    else:
+        quoted = ", ".join(f"'{name}'" for name in collection_names)
+        system_prompt = f"You are an assistant helping with documentation. Use the {quoted} collections to query relevant information from the vector store ONLY IF you deem that it is required. Search them together in a single search_collections call, with include_web if the web may help. If you query from the vector store, please provide the source of the information that can be found in the metadata."
     state = {
         "messages": [
             {
                 "role": "system",
-                "content": f"You are an assistant helping with documentation. Use the '{collection_name}' collection to query relevant information from the vector store ONLY IF you deem that it is required. If you query from the vector store, please provide the source of the information that can be found in the metadata.",
+                "content": system_prompt,
             },
             {"role": "user", "content": message},
         ],
@@ -49,17 +180,140 @@ async def chat(thread_id: str, request: Request, payload: dict):
     }
 
     graph = request.app.state.graph
+    answer_cache = request.app.state.answer_cache
+
+    config = {
+        "configurable": {
+            "thread_id": thread_id,
+            "retriever": request.app.state.retriever,
+            "fanout_retriever": request.app.state.fanout_retriever,
+            "models": request.app.state.models,
+            "reranker": request.app.state.reranker,
+            "context_budget": request.app.state.context_budget,
+            "history_policy": request.app.state.history_policy,
+        }
+    }
+
+    # Cached answers are only served on the first turn of a thread, since later
+    # questions may refer back to the conversation. Answers drawn from several
+    # collections are not cached, as the cache is invalidated per collection.
+    snapshot = await graph.aget_state(config)
+    first_turn = not snapshot.values.get("messages")
+
+    # Trim the oldest turns of a long thread before the new turn is added
+    trimmed = trim_thread(request.app.state.checkpointer, snapshot.values)
+    if trimmed:
+        state["messages"] = [*trimmed["messages"], *state["messages"]]
+        state["summarized_messages"] = trimmed["summarized_messages"]
+    use_cache = answer_cache is not None and first_turn and len(collection_names) == 1
+
+    cached_answer = (
+        await answer_cache.get(collection_name, message) if use_cache else None
+    )
+    if cached_answer is not None:
+        answer = AIMessage(content=cached_answer)
+        # Record the turn so that follow-up questions in the thread have context
+        await graph.aupdate_state(
+            config,
+            {"messages": [*state["messages"], answer]},
+            as_node="generate",
+        )
+
+        async def cached_generator():
+            if stream_mode == "events":
+                yield sse("final", content=cached_answer, cached=True)
+            else:
+                yield f"data: {answer}\n\n"
+
+        return StreamingResponse(cached_generator(), media_type="text/event-stream")
 
-    config = {"configurable": {"thread_id": thread_id}}
+    tracer = GraphTracer()
+    config["callbacks"] = [tracer]
 
-    def event_generator(config=config):
+    async def remember_answer(final_message):
+        if use_cache and not getattr(final_message, "tool_calls", None):
+            await answer_cache.put(collection_name, message, final_message.content)
+
+    async def event_generator(config=config):
         # Iterate over the graph's streaming output
-        for output in graph.stream(state, config=config):
+        last_message = None
+        async for output in graph.astream(state, config=config):
             for key, value in output.items():
-                # Log the output from each node
-                pprint.pprint(f"Output from node '{key}':")
-                pprint.pprint(value)
+                logger.debug(f"Output from node '{key}'")
+                last_message = value["messages"][0]
                 # Yield the output as a server-sent event
-                yield f"data: {value["messages"][0]}\n\n"
+                yield f"data: {last_message}\n\n"
+        if trace:
+            yield sse("trace", **tracer.summary())
+        if last_message is not None:
+            await remember_answer(last_message)
 
+    if stream_mode == "events":
+        return StreamingResponse(
+            stream_events(
+                graph,
+                state,
+                config,
+                on_final=remember_answer,
+                tracer=tracer if trace else None,
+            ),
+            media_type="text/event-stream",
+        )
     return StreamingResponse(event_generator(), media_type="text/event-stream")
+
+
+@router.get("/threads/{thread_id}/usage")
+async def thread_usage(thread_id: str, request: Request):
+    """
+    Endpoint to get the token usage of a thread and the size of its history.
+
+    Args:
+        thread_id (str): The ID of the thread.
+        request (Request): The FastAPI request object.
+
+    Returns:
+        dict: The number of messages, the number of them covered by the summary,
+            and the LLM calls, prompt, completion and history tokens of the thread.
+    """
+    snapshot = await request.app.state.graph.aget_state(
+        {"configurable": {"thread_id": thread_id}}
+    )
+    if not snapshot.values.get("messages"):
+        raise HTTPException(status_code=404, detail="Thread not found")
+    values = snapshot.values
+    return {
+        "thread_id": thread_id,
+        "messages": len(values["messages"]),
+        "summarized_messages": values.get("summarized_messages", 0),
+        "summary": values.get("summary", ""),
+        "usage": values.get("usage", {}),
+    }
+
+
+@router.get("/checkpointer/stats")
+async def checkpointer_stats(request: Request):
+    """
+    Endpoint to get the memory and eviction statistics of the checkpointer.
+
+    Args:
+        request (Request): The FastAPI request object.
+
+    Returns:
+        dict: The checkpointer statistics.
+    """
+    return request.app.state.checkpointer.stats()
+
+
+@router.get("/cache/stats")
+async def answer_cache_stats(request: Request):
+    """
+    Endpoint to get the size and hit/miss counters of the answer cache.
+
+    Args:
+        request (Request): The FastAPI request object.
+
+    Returns:
+        dict: The answer cache statistics.
+    """
+    answer_cache = request.app.state.answer_cache
+    return answer_cache.stats() if answer_cache is not None else {"enabled": False}
@@ -1,36 +1,124 @@
 """
-WebSocket endpoint for Firecrawl service.
+REST and WebSocket endpoints for the Firecrawl service.
 """
 
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+from fastapi import APIRouter, HTTPException, Request, WebSocket, WebSocketDisconnect
 from loguru import logger
 from dotenv import load_dotenv
 import asyncio
 
+from fastapi_backend.src.firecrawler.jobs import CrawlJobManager
+from fastapi_backend.src.metrics import WEBSOCKET_EVENTS, WEBSOCKET_SUBSCRIBERS
+from fastapi_backend.src.models.firecrawl import CrawlRequest
+
 load_dotenv()
 
 router = APIRouter(prefix="/firecrawl", tags=["firecrawl"])
 
 
-@router.websocket("/ws/crawl")
-async def websocket_endpoint(websocket: WebSocket):
+@router.post("/jobs", status_code=202)
+async def submit_job(crawl: CrawlRequest, request: Request):
+    """
+    Submit a crawl job. It runs in the background until it finishes or is
+    cancelled, whether or not a client watches it.
+    """
+    crawl_jobs: CrawlJobManager = request.app.state.crawl_jobs
+    try:
+        source_path = (
+            request.app.state.firecrawl_service.importer.resolve(crawl.path)
+            if crawl.path
+            else None
+        )
+        job = crawl_jobs.submit(
+            str(crawl.url),
+            crawl.limit,
+            recrawl=crawl.recrawl,
+            profile=crawl.profile,
+            source_path=source_path,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return job.to_dict()
+
+
+@router.get("/jobs")
+def list_jobs(request: Request):
+    crawl_jobs: CrawlJobManager = request.app.state.crawl_jobs
+    return [job.to_dict() for job in crawl_jobs.list()]
+
+
+@router.get("/jobs/stats")
+def get_job_stats(request: Request):
+    crawl_jobs: CrawlJobManager = request.app.state.crawl_jobs
+    return {
+        **crawl_jobs.stats(),
+        **request.app.state.firecrawl_service.queue_stats(),
+    }
+
+
+@router.get("/jobs/{job_id}")
+def get_job(job_id: str, request: Request):
+    crawl_jobs: CrawlJobManager = request.app.state.crawl_jobs
+    job = crawl_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown crawl job {job_id}")
+    return job.to_dict()
+
+
+@router.get("/jobs/{job_id}/stats")
+def get_job_throughput(job_id: str, request: Request):
+    """
+    Get the throughput of a crawl job and the time spent chunking, embedding and
+    upserting its documents.
     """
-    WebSocket endpoint for Firecrawl service.
+    crawl_jobs: CrawlJobManager = request.app.state.crawl_jobs
+    job = crawl_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown crawl job {job_id}")
+    return request.app.state.firecrawl_service.job_stats(job)
+
+
+@router.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str, request: Request):
+    crawl_jobs: CrawlJobManager = request.app.state.crawl_jobs
+    job = crawl_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown crawl job {job_id}")
+    if not await crawl_jobs.cancel(job_id):
+        raise HTTPException(
+            status_code=409, detail=f"Crawl job {job_id} has already finished"
+        )
+    return job.to_dict()
+
+
+@router.websocket("/ws/jobs/{job_id}")
+async def websocket_endpoint(websocket: WebSocket, job_id: str):
+    """
+    WebSocket endpoint streaming the events of a crawl job. Disconnecting only
+    stops the stream, the job keeps running.
 
     Args:
         websocket (WebSocket): The WebSocket connection object.
+        job_id (str): The ID of the job to watch.
     """
     await websocket.accept()
-    try:
-        firecrawl_app = websocket.app.state.firecrawl_service
-        logger.info("WebSocket connection established")
-    except Exception as e:
-        logger.error(f"Error initializing Firecrawl app: {e}")
+    crawl_jobs: CrawlJobManager = websocket.app.state.crawl_jobs
+    job = crawl_jobs.get(job_id)
+    if job is None:
+        await websocket.send_json(
+            {"event": "error", "error": f"Unknown crawl job {job_id}"}
+        )
         await websocket.close()
         return
+    logger.info(f"WebSocket subscribed to crawl job {job_id}")
 
     # Add ping/pong keepalive handler
     ping_task = None
+    subscribed = False
+
+    async def forward(event):
+        await websocket.send_json(event)
+        WEBSOCKET_EVENTS.inc(event=event["event"])
 
     async def send_periodic_pings():
         try:
@@ -43,75 +131,47 @@ async def websocket_endpoint(websocket: WebSocket):
         except Exception as e:
             logger.error(f"Error in ping task: {e}")
 
+    async def watch_client():
+        # Return when the client disconnects
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+
     try:
         # Start ping keepalive task
         ping_task = asyncio.create_task(send_periodic_pings())
 
-        data = await websocket.receive_json()
-        url = data.get("url")
-        limit = data.get("limit", 500)
-
-        # Define WebSocket event handlers that don't block
-        async def on_document(detail):
-            try:
-                await websocket.send_json(
-                    {
-                        "event": "document",
-                        "url": detail["data"]["metadata"].get("url", "unknown"),
-                    }
-                )
-                # Process document in a separate task to avoid blocking
-                asyncio.create_task(process_document_async(detail))
-            except Exception as e:
-                logger.error(f"Error in document handler: {e}")
-
-        async def process_document_async(detail):
-            # Process document asynchronously to avoid blocking
-            try:
-                firecrawl_app.on_document(detail)
-            except Exception as e:
-                logger.error(f"Error processing document: {e}")
-
-        async def on_error(detail):
-            try:
-                await websocket.send_json(
-                    {"event": "error", "error": detail.get("error", "unknown error")}
-                )
-                firecrawl_app.on_error(detail)
-            except Exception as e:
-                logger.error(f"Error in error handler: {e}")
-
-        async def on_done(detail):
-            try:
-                await websocket.send_json(
-                    {"event": "done", "status": detail.get("status", "done")}
-                )
-                firecrawl_app.on_done(detail)
-            except Exception as e:
-                logger.error(f"Error in done handler: {e}")
-
-        # Set root_url before crawling
-        firecrawl_app.root_url = url.rstrip("/")
-
-        # Send initial success message
+        # Send the current state first, as the job may have started long ago
+        await websocket.send_json({"event": "status", **job.to_dict()})
         await websocket.send_json(
-            {"event": "success", "message": f"Starting crawl of {url}"}
-        )
-
-        # Get the watcher and set up event listeners with async handlers
-        watcher = firecrawl_app.app.crawl_url_and_watch(url, {"limit": limit})
-        watcher.add_event_listener(
-            "document", lambda detail: asyncio.create_task(on_document(detail))
+            {
+                "event": "stats",
+                "job_id": job.id,
+                **websocket.app.state.firecrawl_service.job_stats(job),
+            }
         )
-        watcher.add_event_listener(
-            "error", lambda detail: asyncio.create_task(on_error(detail))
+        if job.finished:
+            await websocket.send_json({"event": "done", "status": job.status.value})
+            return
+
+        subscriber = job.subscribe(forward)
+        WEBSOCKET_SUBSCRIBERS.inc()
+        subscribed = True
+        client_task = asyncio.create_task(watch_client())
+        job_task = asyncio.create_task(crawl_jobs.wait(job))
+        closed_task = asyncio.create_task(subscriber.wait_closed())
+        await asyncio.wait(
+            {client_task, job_task, closed_task}, return_when=asyncio.FIRST_COMPLETED
         )
-        watcher.add_event_listener(
-            "done", lambda detail: asyncio.create_task(on_done(detail))
-        )
-
-        # Start the watcher
-        await watcher.connect()
+        client_task.cancel()
+        closed_task.cancel()
+        if job_task.done():
+            # Send the last events of the job, which are queued when it finishes
+            await subscriber.drain(timeout=5.0)
+        job_task.cancel()
+        if subscriber.overflowed:
+            logger.warning(f"WebSocket of crawl job {job_id} fell behind, closing it")
 
     except WebSocketDisconnect:
         logger.info("WebSocket disconnected")
@@ -122,10 +182,16 @@ async def websocket_endpoint(websocket: WebSocket):
 
     finally:
         # Ensure proper cleanup
+        if subscribed:
+            WEBSOCKET_SUBSCRIBERS.dec()
+        job.unsubscribe(forward)
         if ping_task:
             ping_task.cancel()
             try:
                 await ping_task
             except asyncio.CancelledError:
                 pass
-        await websocket.close()
+        try:
+            await websocket.close()
+        except RuntimeError:
+            pass
@@ -0,0 +1,33 @@
+"""
+Prometheus metrics endpoint.
+"""
+
+from fastapi import APIRouter, Request
+from fastapi.responses import PlainTextResponse
+
+from fastapi_backend.src.metrics import (
+    CRAWL_JOBS,
+    CRAWL_QUEUE_DEPTH,
+    INGEST_PENDING_CHUNKS,
+    REGISTRY,
+)
+
+router = APIRouter(tags=["metrics"])
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def get_metrics(request: Request):
+    """
+    Expose the crawl and ingestion metrics in the Prometheus text format. Gauges of
+    the current queue depth and job counts are read at scrape time.
+    """
+    CRAWL_QUEUE_DEPTH.set(
+        request.app.state.firecrawl_service.queue_stats()["queue_depth"]
+    )
+    INGEST_PENDING_CHUNKS.set(request.app.state.ingestion_pipeline.pending_chunks())
+    for status, count in request.app.state.crawl_jobs.stats().items():
+        if status != "max_concurrent_crawls":
+            CRAWL_JOBS.set(count, status=status)
+    return PlainTextResponse(
+        REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
@@ -1,6 +1,10 @@
+from typing import Optional
+
 from fastapi import APIRouter, HTTPException
 from fastapi_backend.src.models.vector_store import DocumentInput, SearchQuery
 from fastapi_backend.src.db.vector_store import VectorStore
+from fastapi_backend.src.db.ingestion import IngestionPipeline, read_lines
+from fastapi_backend.src.db.profiles import PROFILES
 from fastapi import Request
 
 router = APIRouter(prefix="/vector-store", tags=["vector-store"])
@@ -12,30 +16,74 @@ async def add_document(doc: DocumentInput, request: Request):
         vector_store: VectorStore = request.app.state.vector_store
         await vector_store.add_documents(
             collection_name=doc.collection_name,
-            document=doc.document,
-            metadata=doc.metadata,
-            id=doc.id,
+            documents=[doc.document],
+            metadata=[doc.metadata],
+            ids=[doc.id],
         )
         return {"message": f"Document {doc.id} added successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/documents:bulk")
+async def add_documents_bulk(request: Request, collection_name: Optional[str] = None):
+    """
+    Add many documents from a streamed NDJSON (JSON Lines) body, one BulkDocument
+    per line. The body is chunked, embedded and upserted in batches as it is read.
+    """
+    try:
+        ingestion_pipeline: IngestionPipeline = request.app.state.ingestion_pipeline
+        return await ingestion_pipeline.ingest_stream(
+            read_lines(request.stream()), collection_name=collection_name
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @router.post("/search")
 async def search(query: SearchQuery, request: Request):
     try:
         vector_store: VectorStore = request.app.state.vector_store
         return await vector_store.search_result(
-            collection_name=query.collection_name, query=query.query
+            collection_name=query.collection_name,
+            query=query.query,
+            limit=query.limit,
+            score_threshold=query.score_threshold,
+            filters=query.filters,
+            fields=query.fields,
+            max_document_chars=query.max_document_chars,
         )
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/ingestion/stats")
+def get_ingestion_stats(request: Request):
+    try:
+        ingestion_pipeline: IngestionPipeline = request.app.state.ingestion_pipeline
+        return ingestion_pipeline.stats()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/cache/stats")
+def get_cache_stats(request: Request):
+    try:
+        vector_store: VectorStore = request.app.state.vector_store
+        return vector_store.cache_stats()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/profiles")
+def get_profiles():
+    return [profile.to_dict() for profile in PROFILES.values()]
+
+
 @router.post("/collections")
-def get_collections(request: Request):
+async def get_collections(request: Request):
     try:
         vector_store: VectorStore = request.app.state.vector_store
-        return vector_store.get_collections()
+        return await vector_store.get_collections()
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
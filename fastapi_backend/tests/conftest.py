@@ -0,0 +1,33 @@
+"""
+Shared fixtures of the backend tests.
+"""
+
+import os
+import re
+
+import pytest
+import tiktoken
+
+# The agent tools read the Tavily key when they are imported
+os.environ.setdefault("TAVILY_API_KEY", "test")
+
+
+class WordEncoding:
+    """Counts every word, with the whitespace before it, as one token."""
+
+    def encode(self, text: str, **kwargs) -> list[str]:
+        return re.findall(r"\s*\S+|\s+$", text)
+
+    def decode(self, tokens: list[str]) -> str:
+        return "".join(tokens)
+
+
+@pytest.fixture
+def word_tokens(monkeypatch):
+    """Count tokens by words, so that the tests do not download a tiktoken encoding."""
+    from fastapi_backend.src.askthedocs_agent.utils import context
+
+    monkeypatch.setattr(tiktoken, "get_encoding", lambda name: WordEncoding())
+    context._encoding.cache_clear()
+    yield
+    context._encoding.cache_clear()
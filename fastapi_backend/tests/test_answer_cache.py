@@ -0,0 +1,148 @@
+"""
+Tests of the answer cache: exact and similarity matches, expiry, eviction and the
+invalidation of a collection, and the question index behind the similarity matches.
+"""
+
+import asyncio
+import time
+
+import numpy as np
+
+from fastapi_backend.src.askthedocs_agent.utils.answer_cache import (
+    AnswerCache,
+    QuestionIndex,
+)
+
+# Questions that differ in one word, with vectors closer than a generic threshold
+VECTORS = {
+    "how do i enable tracing": [1.0, 0.1, 0.0],
+    "how do i disable tracing": [1.0, 0.12, 0.0],
+    "how can i enable tracing": [1.0, 0.1, 0.001],
+    "what is a collection": [0.0, 0.0, 1.0],
+}
+
+
+async def embed(question: str) -> list[float]:
+    return VECTORS[question.lower().rstrip("?")]
+
+
+def test_exact_match_after_normalization():
+    cache = AnswerCache()
+
+    async def run():
+        await cache.put("docs", "How do I enable tracing?", "Set TRACING=1")
+        return (
+            await cache.get("docs", "  how do i   ENABLE tracing "),
+            await cache.get("other", "How do I enable tracing?"),
+        )
+
+    assert asyncio.run(run()) == ("Set TRACING=1", None)
+    assert cache.stats()["exact_hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_similar_questions_miss_without_a_threshold():
+    cache = AnswerCache(embed=embed)
+
+    async def run():
+        await cache.put("docs", "How do I enable tracing?", "Set TRACING=1")
+        return await cache.get("docs", "How do I disable tracing?")
+
+    assert asyncio.run(run()) is None
+    assert cache.stats()["indexed_questions"] == 0
+
+
+def test_similar_questions_hit_above_the_threshold():
+    cache = AnswerCache(embed=embed, similarity_threshold=0.99999)
+
+    async def run():
+        await cache.put("docs", "How do I enable tracing?", "Set TRACING=1")
+        return (
+            await cache.get("docs", "How can I enable tracing?"),
+            await cache.get("docs", "How do I disable tracing?"),
+            await cache.get("docs", "What is a collection?"),
+        )
+
+    assert asyncio.run(run()) == ("Set TRACING=1", None, None)
+    stats = cache.stats()
+    assert stats["semantic_hits"] == 1
+    assert stats["misses"] == 2
+
+
+def test_expired_answers_are_not_served():
+    cache = AnswerCache(embed=embed, ttl_seconds=0.05, similarity_threshold=0.9)
+
+    async def run():
+        await cache.put("docs", "How do I enable tracing?", "Set TRACING=1")
+        time.sleep(0.1)
+        return (
+            await cache.get("docs", "How do I enable tracing?"),
+            await cache.get("docs", "How can I enable tracing?"),
+        )
+
+    assert asyncio.run(run()) == (None, None)
+    # The expired question was dropped from the index by the lookup
+    assert cache.stats()["indexed_questions"] == 0
+
+
+def test_evicts_least_recently_used_answer():
+    cache = AnswerCache(embed=embed, max_entries=1, similarity_threshold=0.9)
+
+    async def run():
+        await cache.put("docs", "How do I enable tracing?", "Set TRACING=1")
+        await cache.put("docs", "What is a collection?", "A set of points")
+        return (
+            await cache.get("docs", "How can I enable tracing?"),
+            await cache.get("docs", "What is a collection?"),
+        )
+
+    assert asyncio.run(run()) == (None, "A set of points")
+    assert cache.stats()["evictions"] == 1
+
+
+def test_evicted_questions_are_pruned_from_the_index():
+    cache = AnswerCache(embed=embed, max_entries=1, similarity_threshold=0.9)
+
+    async def run():
+        for question in VECTORS:
+            await cache.put("docs", question, question)
+
+    asyncio.run(run())
+    assert cache.stats()["indexed_questions"] <= 2
+
+
+def test_invalidation_drops_only_the_written_collection():
+    cache = AnswerCache(embed=embed, similarity_threshold=0.9)
+
+    async def run():
+        await cache.put("docs", "How do I enable tracing?", "Set TRACING=1")
+        await cache.put("other", "How do I enable tracing?", "Use --trace")
+        removed = cache.invalidate("docs")
+        return removed, (
+            await cache.get("docs", "How do I enable tracing?"),
+            await cache.get("docs", "How can I enable tracing?"),
+            await cache.get("other", "How do I enable tracing?"),
+        )
+
+    removed, answers = asyncio.run(run())
+    assert removed == 1
+    assert answers == (None, None, "Use --trace")
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_question_index_reuses_and_grows_rows():
+    index = QuestionIndex(dimension=2, rows=2)
+    for question, vector in [("a", [1.0, 0.0]), ("b", [0.0, 1.0])]:
+        index.add(question, np.asarray(vector, dtype=np.float32))
+
+    index.remove("a")
+    index.add("c", np.asarray([1.0, 0.0], dtype=np.float32))
+    assert index.vectors.shape == (2, 2)
+    assert index.nearest(np.asarray([1.0, 0.0], dtype=np.float32)) == ("c", 1.0)
+
+    index.add("d", np.asarray([0.6, 0.8], dtype=np.float32))
+    assert index.vectors.shape == (4, 2)
+    assert len(index) == 3
+    question, similarity = index.nearest(np.asarray([0.6, 0.8], dtype=np.float32))
+    assert question == "d"
+    assert np.isclose(similarity, 1.0)
@@ -0,0 +1,149 @@
+"""
+Tests of the checkpointers of the agent workflow: a thread written through a graph is
+read back, evicted, pruned, kept across a restart and bounded in messages.
+"""
+
+import time
+from typing import Annotated, Sequence
+
+import pytest
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+from langgraph.graph import END, START, StateGraph
+from langgraph.graph.message import add_messages
+from typing_extensions import TypedDict
+
+from fastapi_backend.src.askthedocs_agent.utils.checkpointers import (
+    BoundedMemorySaver,
+    SqliteSaver,
+    TieredSaver,
+    create_checkpointer,
+)
+
+
+class State(TypedDict):
+    messages: Annotated[Sequence[BaseMessage], add_messages]
+
+
+def answer(state: State) -> dict:
+    return {"messages": [AIMessage(f"answer {len(state['messages'])}")]}
+
+
+def make_graph(checkpointer):
+    workflow = StateGraph(State)
+    workflow.add_node("answer", answer)
+    workflow.add_edge(START, "answer")
+    workflow.add_edge("answer", END)
+    return workflow.compile(checkpointer=checkpointer)
+
+
+def ask(graph, thread_id: str, question: str, removals: Sequence = ()) -> list:
+    config = {"configurable": {"thread_id": thread_id}}
+    graph.invoke({"messages": [*removals, HumanMessage(question)]}, config)
+    return graph.get_state(config).values["messages"]
+
+
+def contents(messages: Sequence[BaseMessage]) -> list[str]:
+    return [message.content for message in messages]
+
+
+@pytest.mark.parametrize("backend", ["memory", "sqlite", "tiered"])
+def test_round_trip(tmp_path, backend):
+    checkpointer = create_checkpointer(backend, str(tmp_path / "checkpoints.sqlite"))
+    graph = make_graph(checkpointer)
+
+    ask(graph, "t1", "first")
+    messages = ask(graph, "t1", "second")
+
+    assert contents(messages) == ["first", "answer 1", "second", "answer 3"]
+    assert ask(graph, "t2", "other")[0].content == "other"
+    assert checkpointer.stats()["backend"] == backend
+
+
+def test_memory_evicts_least_recently_used_thread():
+    checkpointer = BoundedMemorySaver(max_threads=2)
+    graph = make_graph(checkpointer)
+
+    for thread_id in ("t1", "t2", "t3"):
+        ask(graph, thread_id, thread_id)
+
+    assert not checkpointer.has_thread("t1")
+    assert checkpointer.has_thread("t3")
+    assert checkpointer.stats()["lru_evictions"] == 1
+    assert graph.get_state({"configurable": {"thread_id": "t1"}}).values == {}
+
+
+def test_memory_evicts_idle_thread():
+    checkpointer = BoundedMemorySaver(ttl_seconds=0.05)
+    graph = make_graph(checkpointer)
+
+    ask(graph, "t1", "first")
+    time.sleep(0.1)
+    ask(graph, "t2", "second")
+
+    assert not checkpointer.has_thread("t1")
+    assert checkpointer.stats()["ttl_evictions"] == 1
+
+
+@pytest.mark.parametrize("backend", ["memory", "sqlite"])
+def test_prunes_old_checkpoints(tmp_path, backend):
+    checkpointer = create_checkpointer(
+        backend, str(tmp_path / "checkpoints.sqlite"), max_checkpoints_per_thread=3
+    )
+    graph = make_graph(checkpointer)
+
+    for turn in range(4):
+        messages = ask(graph, "t1", f"question {turn}")
+
+    stats = checkpointer.stats()
+    assert stats["checkpoints"] == 3
+    assert stats["pruned_checkpoints"] > 0
+    # The latest checkpoint still holds the whole thread
+    assert len(messages) == 8
+
+
+def test_sqlite_keeps_threads_across_restart(tmp_path):
+    path = str(tmp_path / "checkpoints.sqlite")
+    checkpointer = SqliteSaver(path)
+    ask(make_graph(checkpointer), "t1", "first")
+    checkpointer.conn.close()
+
+    restarted = SqliteSaver(path)
+    messages = ask(make_graph(restarted), "t1", "second")
+
+    assert contents(messages) == ["first", "answer 1", "second", "answer 3"]
+
+
+def test_tiered_reads_disk_after_restart(tmp_path):
+    path = str(tmp_path / "checkpoints.sqlite")
+    checkpointer = create_checkpointer("tiered", path)
+    ask(make_graph(checkpointer), "t1", "first")
+    checkpointer.disk.conn.close()
+
+    restarted = TieredSaver(memory=BoundedMemorySaver(), disk=SqliteSaver(path))
+    graph = make_graph(restarted)
+    messages = ask(graph, "t1", "second")
+
+    assert contents(messages) == ["first", "answer 1", "second", "answer 3"]
+    assert restarted.memory_misses >= 1
+    # The thread is held in memory again once it is written
+    assert restarted.memory.has_thread("t1")
+    assert contents(ask(graph, "t1", "third"))[-2:] == ["third", "answer 5"]
+
+
+@pytest.mark.parametrize("backend", ["memory", "sqlite", "tiered"])
+def test_trims_oldest_turns(tmp_path, backend):
+    checkpointer = create_checkpointer(
+        backend, str(tmp_path / "checkpoints.sqlite"), max_messages_per_thread=3
+    )
+    graph = make_graph(checkpointer)
+    config = {"configurable": {"thread_id": "t1"}}
+
+    ask(graph, "t1", "first")
+    ask(graph, "t1", "second")
+    removals = checkpointer.trim_messages(graph.get_state(config).values["messages"])
+    messages = ask(graph, "t1", "third", removals)
+
+    # Only whole turns are removed, so the thread starts with a question
+    assert contents(messages) == ["second", "answer 3", "third", "answer 3"]
+    assert checkpointer.stats()["trimmed_messages"] == 2
+    assert checkpointer.trim_messages(messages[:3]) == []
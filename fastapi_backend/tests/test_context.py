@@ -0,0 +1,158 @@
+"""
+Tests of the context budget: tool results are cleaned, deduped across tool calls and
+packed into a bounded number of tokens, truncating or dropping passages that do not fit.
+"""
+
+import json
+
+import pytest
+
+from fastapi_backend.src.askthedocs_agent.utils.context import ContextBudget
+
+
+class ByteEncoding:
+    """Counts every UTF-8 byte as one token, so characters span several tokens."""
+
+    def encode(self, text: str, **kwargs) -> list[int]:
+        return list(text.encode("utf-8"))
+
+    def decode(self, tokens: list[int]) -> str:
+        return bytes(tokens).decode("utf-8", errors="replace")
+
+
+def result(*passages: tuple[str, str]) -> str:
+    return json.dumps(
+        [
+            {"document": text, "metadata": {"source": source, "title": source}}
+            for source, text in passages
+        ]
+    )
+
+
+def words(prefix: str, count: int) -> str:
+    return " ".join(f"{prefix}{index}" for index in range(count))
+
+
+@pytest.fixture
+def budget(word_tokens):
+    def create(**kwargs):
+        return ContextBudget(
+            **{"max_tokens": 100, "max_passage_tokens": 100, "min_passage_tokens": 5}
+            | kwargs
+        )
+
+    return create
+
+
+@pytest.mark.parametrize("results", [[], [""], ["[]"], [result()], ["   "]])
+def test_empty_results(budget, results):
+    packed = budget().pack(results)
+
+    assert packed.text == ""
+    assert packed.passages == packed.candidates == 0
+    assert packed.sources == []
+
+
+def test_packs_passages_by_rank_across_tool_calls(budget):
+    first = result(("a.md", "alpha one"), ("b.md", "beta two"))
+    second = result(("c.md", "gamma three"))
+
+    packed = budget().pack([first, second])
+
+    assert packed.text == (
+        "[1] a.md (a.md)\nalpha one\n\n"
+        "[2] c.md (c.md)\ngamma three\n\n"
+        "[3] b.md (b.md)\nbeta two"
+    )
+    assert packed.sources == ["a.md", "c.md", "b.md"]
+    assert packed.truncated == 0
+
+
+def test_sends_passages_repeated_across_tool_calls_once(budget):
+    page = "Qdrant stores vectors with a payload."
+    first = result(("a.md", page), ("b.md", "Other text."))
+    # The same page from another tool, and an overlapping chunk contained in it
+    second = result(("https://a.dev/a", page.upper()), ("a.md", "stores vectors"))
+
+    packed = budget().pack([first, second])
+
+    assert packed.candidates == 4
+    assert packed.duplicates == 2
+    assert packed.passages == 2
+    assert packed.text.count("stores vectors") == 1
+    assert packed.sources == ["a.md", "b.md"]
+
+
+def test_longer_passage_replaces_the_one_it_contains(budget):
+    first = result(("a.md", "stores vectors"))
+    second = result(("a.md", "Qdrant stores vectors with a payload."))
+
+    packed = budget().pack([first, second])
+
+    assert packed.passages == 1
+    assert "Qdrant stores vectors with a payload." in packed.text
+
+
+def test_truncates_the_passage_that_overflows_the_budget(budget):
+    context_budget = budget(max_tokens=30)
+    results = [result(("a.md", words("a", 10)), ("b.md", words("b", 40)))]
+
+    packed = context_budget.pack(results)
+
+    assert packed.passages == 2
+    assert packed.truncated == 1
+    assert packed.context_tokens <= 30
+    second = packed.text.split("\n\n")[1].split("\n")[1]
+    assert second.endswith(" ...")
+    # Only whole words of the passage are kept
+    assert (
+        second[: -len(" ...")].split()
+        == words("b", 40).split()[: len(second.split()) - 1]
+    )
+
+
+def test_drops_passages_once_the_budget_is_spent(budget):
+    context_budget = budget(max_tokens=30, min_passage_tokens=10)
+    results = [result(("a.md", words("a", 20)), ("b.md", words("b", 40)))]
+
+    packed = context_budget.pack(results)
+
+    assert packed.passages == 1
+    assert packed.sources == ["a.md"]
+    assert "b0" not in packed.text
+    assert packed.context_tokens <= 30
+
+
+def test_caps_every_passage(budget):
+    context_budget = budget(max_tokens=1000, max_passage_tokens=10)
+    results = [result(("a.md", words("a", 50)), ("b.md", words("b", 50)))]
+
+    packed = context_budget.pack(results)
+
+    assert packed.passages == 2
+    assert packed.truncated == 2
+    assert packed.saved_tokens > 0
+
+
+def test_grader_gets_the_smaller_budget(budget):
+    context_budget = budget(max_tokens=200, grader_max_tokens=30)
+    results = [result(("a.md", words("a", 100)))]
+
+    assert context_budget.grader_max_tokens == 30
+    assert context_budget.pack(results, 30).context_tokens <= 30
+    assert context_budget.pack(results).context_tokens > 30
+
+
+def test_never_splits_a_character(monkeypatch):
+    from fastapi_backend.src.askthedocs_agent.utils import context
+
+    monkeypatch.setattr(context, "_encoding", lambda name: ByteEncoding())
+    context_budget = ContextBudget(
+        max_tokens=1000, max_passage_tokens=12, min_passage_tokens=1
+    )
+
+    packed = context_budget.pack([result(("a.md", "déjà vu " * 10))])
+
+    assert packed.truncated == 1
+    assert "�" not in packed.text
+    assert packed.text.split("\n")[1].endswith(" ...")
@@ -0,0 +1,328 @@
+"""
+Tests of the crawl jobs: the events sent to their subscribers, and jobs that run an
+import of a crawl dump through the ingestion workers into an in-memory Qdrant, are
+cancelled, recrawl it, or are checkpointed and resumed after a restart.
+"""
+
+import asyncio
+import json
+from contextlib import asynccontextmanager
+from typing import Optional
+
+import pytest
+from qdrant_client import AsyncQdrantClient
+
+from fastapi_backend.benchmarks.stand_ins import HashEmbedder
+from fastapi_backend.src.db.ingestion import IngestionPipeline
+from fastapi_backend.src.db.vector_store import VectorStore
+from fastapi_backend.src.firecrawler.firecrawler import FirecrawlService
+from fastapi_backend.src.firecrawler.importer import LocalImporter
+from fastapi_backend.src.firecrawler.jobs import CrawlJob, CrawlJobManager, CrawlStatus
+from fastapi_backend.src.firecrawler.store import CrawlJobStore
+
+ROOT_URL = "https://docs.example.dev"
+
+
+def write_dump(path, pages: int, changed: Optional[dict[int, str]] = None):
+    changed = changed or {}
+    with path.open("w", encoding="utf-8") as file:
+        for index in range(pages):
+            url = f"{ROOT_URL}/page-{index}"
+            text = changed.get(index, " ".join(["text"] * 30))
+            document = {
+                "markdown": f"# Page {index}\n\n" + text,
+                "metadata": {"url": url, "sourceURL": url, "title": f"Page {index}"},
+            }
+            file.write(json.dumps(document) + "\n")
+    return path
+
+
+class GatedPipeline(IngestionPipeline):
+    """Holds every document after the first `allowed` ones until the gate opens,
+    so that a test can stop a job midway."""
+
+    def __init__(self, *args, allowed: Optional[int] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.allowed = allowed
+        self.gate = asyncio.Event()
+        self.sources: list[str] = []
+
+    async def add_document(self, collection_name, document, metadata, source=None):
+        if self.allowed is not None:
+            if self.allowed <= 0:
+                await self.gate.wait()
+            self.allowed -= 1
+        self.sources.append(source)
+        return await super().add_document(collection_name, document, metadata, source)
+
+
+async def wait_until(predicate, timeout: float = 10.0):
+    async with asyncio.timeout(timeout):
+        while not predicate():
+            await asyncio.sleep(0.01)
+
+
+def make_vector_store() -> VectorStore:
+    return VectorStore(
+        AsyncQdrantClient(location=":memory:"),
+        embedder=HashEmbedder(dimension=32, workers=1),
+    )
+
+
+@pytest.fixture
+def dump(tmp_path):
+    return write_dump(tmp_path / "crawl.jsonl", pages=20)
+
+
+@pytest.fixture
+def crawl_stack(word_tokens):
+    """Create the vector store, ingestion pipeline, Firecrawl service and job
+    manager of a test, and stop them when it ends."""
+
+    @asynccontextmanager
+    async def create(vector_store=None, allowed=None, **kwargs):
+        vector_store = vector_store or make_vector_store()
+        pipeline = GatedPipeline(
+            vector_store,
+            chunk_size=20,
+            chunk_overlap=0,
+            flush_interval=60,
+            allowed=allowed,
+        )
+        service = FirecrawlService(
+            None, pipeline, queue_size=4, workers=2, importer=LocalImporter(workers=1)
+        )
+        await pipeline.start()
+        await service.start()
+        manager = CrawlJobManager(service, **kwargs)
+        try:
+            yield manager
+        finally:
+            pipeline.gate.set()
+            await manager.close()
+            await service.stop()
+            await pipeline.stop()
+
+    return create
+
+
+def test_emit_does_not_wait_for_slow_subscribers():
+    async def run():
+        job = CrawlJob(url=ROOT_URL)
+        blocked = asyncio.Event()
+        received = []
+
+        async def slow(payload):
+            await blocked.wait()
+
+        async def fast(payload):
+            received.append(payload["n"])
+
+        slow_subscriber = job.subscribe(slow, max_events=3)
+        fast_subscriber = job.subscribe(fast)
+        for n in range(10):
+            await asyncio.wait_for(job.emit("progress", n=n), timeout=1)
+        await fast_subscriber.drain(timeout=1)
+        await asyncio.wait_for(slow_subscriber.wait_closed(), timeout=1)
+        return job, slow_subscriber, received
+
+    job, slow_subscriber, received = asyncio.run(run())
+    assert received == list(range(10))
+    assert slow_subscriber.overflowed
+    assert len(job._subscribers) == 1
+
+
+def test_failed_subscriber_is_dropped():
+    async def run():
+        job = CrawlJob(url=ROOT_URL)
+
+        async def broken(payload):
+            raise ConnectionError("client went away")
+
+        subscriber = job.subscribe(broken)
+        await job.emit("progress")
+        await asyncio.wait_for(subscriber.wait_closed(), timeout=1)
+        await job.emit("progress")
+        return job, subscriber
+
+    job, subscriber = asyncio.run(run())
+    assert not subscriber.overflowed
+    assert job._subscribers == []
+
+
+def test_slow_subscriber_does_not_hold_up_the_workers(crawl_stack, dump):
+    async def run():
+        async with crawl_stack() as manager:
+            job = manager.submit(ROOT_URL, limit=100, source_path=str(dump))
+            never = asyncio.Event()
+
+            async def stuck(payload):
+                await never.wait()
+
+            subscriber = job.subscribe(stuck, max_events=5)
+            await asyncio.wait_for(manager.wait(job), timeout=30)
+            return job, subscriber
+
+    job, subscriber = asyncio.run(run())
+    assert job.status == CrawlStatus.COMPLETED
+    assert job.processed == job.documents == 20
+    assert subscriber.overflowed
+
+
+def test_cancels_a_running_job(crawl_stack, dump):
+    events = []
+
+    async def record(payload):
+        events.append(payload)
+
+    async def run():
+        async with crawl_stack(allowed=5) as manager:
+            job = manager.submit(ROOT_URL, limit=100, source_path=str(dump))
+            job.subscribe(record)
+            pipeline = manager.firecrawl_service.ingestion_pipeline
+            await wait_until(lambda: job.processed >= 5)
+            # The queued documents are still ingested once the import stops
+            pipeline.gate.set()
+            assert await manager.cancel(job.id)
+            assert not await manager.cancel(job.id)
+            await wait_until(lambda: events and events[-1]["event"] == "done")
+            return job
+
+    job = asyncio.run(run())
+    assert job.status == CrawlStatus.CANCELLED
+    assert job.finished_at is not None
+    # A document whose put was cancelled on the full queue is counted, never queued
+    assert 5 <= job.processed <= job.documents < 20
+    assert job.pending == 0
+    assert events[-1] == {"event": "done", "job_id": job.id, "status": "cancelled"}
+
+
+def test_queues_jobs_beyond_the_concurrency_cap(crawl_stack, dump):
+    async def run():
+        async with crawl_stack(allowed=1, max_concurrent_crawls=1) as manager:
+            first = manager.submit(ROOT_URL, limit=100, source_path=str(dump))
+            second = manager.submit(f"{ROOT_URL}/v2", limit=100, source_path=str(dump))
+            await wait_until(lambda: first.processed >= 1)
+            statuses = (first.status, second.status)
+            stats = manager.stats()
+
+            # A queued job is cancelled before it starts
+            assert await manager.cancel(second.id)
+            manager.firecrawl_service.ingestion_pipeline.gate.set()
+            await manager.wait(first)
+            return first, second, statuses, stats
+
+    first, second, statuses, stats = asyncio.run(run())
+    assert statuses == (CrawlStatus.RUNNING, CrawlStatus.QUEUED)
+    assert stats["running"] == stats["queued"] == 1
+    assert first.status == CrawlStatus.COMPLETED
+    assert first.processed == 20
+    assert second.status == CrawlStatus.CANCELLED
+    assert second.started_at is None
+    assert second.documents == 0
+
+
+@pytest.mark.parametrize("limit, deleted_pages", [(100, 1), (19, 0)])
+def test_recrawl_updates_only_what_changed(
+    crawl_stack, dump, tmp_path, limit, deleted_pages
+):
+    # Page 0 got shorter and page 19 is gone
+    recrawl_dump = write_dump(tmp_path / "recrawl.jsonl", pages=19, changed={0: "new"})
+
+    async def run():
+        async with crawl_stack() as manager:
+            first = manager.submit(ROOT_URL, limit=100, source_path=str(dump))
+            await manager.wait(first)
+            vector_store = manager.firecrawl_service.ingestion_pipeline.vector_store
+            before = await vector_store.get_document_hashes(first.collection_name)
+
+            job = manager.submit(
+                ROOT_URL, limit=limit, recrawl=True, source_path=str(recrawl_dump)
+            )
+            await manager.wait(job)
+            after = await vector_store.get_document_hashes(job.collection_name)
+            points = await vector_store.client.count(job.collection_name, exact=True)
+            return job, before, after, points.count
+
+    job, before, after, points = asyncio.run(run())
+    assert job.status == CrawlStatus.COMPLETED
+    assert job.unchanged == 18
+    assert job.deleted_pages == deleted_pages
+    page_0, page_19 = f"{ROOT_URL}/page-0", f"{ROOT_URL}/page-19"
+    assert after[page_0]["chunk_count"] == 1 < before[page_0]["chunk_count"]
+    assert after[page_0]["content_hash"] != before[page_0]["content_hash"]
+    # A recrawl that stopped at its limit may not have reached the missing page
+    assert (page_19 in after) is (deleted_pages == 0)
+    assert len(after) == 20 - deleted_pages
+    # No chunk of the old page 0 or of a deleted page is left behind
+    assert points == sum(page["chunk_count"] for page in after.values())
+
+
+def test_resumed_job_skips_the_pages_completed_before_a_restart(
+    crawl_stack, dump, tmp_path
+):
+    path = str(tmp_path / "jobs.sqlite")
+    vector_store = make_vector_store()
+
+    async def interrupt():
+        store = CrawlJobStore(path)
+        try:
+            async with crawl_stack(
+                vector_store, allowed=5, store=store, checkpoint_interval=60
+            ) as manager:
+                job = manager.submit(ROOT_URL, limit=100, source_path=str(dump))
+                await wait_until(lambda: job.processed >= 5)
+                await manager.checkpoint(job)
+                (checkpointed,) = await store.aload_all()
+            # Shutting down requeues the job after a last checkpoint
+            (closed,) = await store.aload_all()
+            return job, checkpointed, closed
+        finally:
+            store.close()
+
+    async def restart():
+        store = CrawlJobStore(path)
+        try:
+            async with crawl_stack(vector_store, store=store) as manager:
+                await manager.resume()
+                (job,) = manager.list()
+                await manager.wait(job)
+                pipeline = manager.firecrawl_service.ingestion_pipeline
+                hashes = await vector_store.get_document_hashes(job.collection_name)
+                return job, pipeline.sources, hashes
+        finally:
+            store.close()
+
+    interrupted, checkpointed, closed = asyncio.run(interrupt())
+    assert interrupted.status == CrawlStatus.QUEUED
+    assert interrupted.finished_at is None
+    assert checkpointed["status"] == "running"
+    assert len(checkpointed["completed_sources"]) == 5
+    assert closed["status"] == "queued"
+    completed = set(closed["completed_sources"])
+    assert completed >= set(checkpointed["completed_sources"])
+    assert len(completed) < 20
+
+    job, sources, hashes = asyncio.run(restart())
+    assert job.id == interrupted.id
+    assert job.resumed
+    assert job.status == CrawlStatus.COMPLETED
+    assert job.documents == job.processed == 20
+    # Only the pages that were not completed before the restart are ingested again
+    assert completed.isdisjoint(sources)
+    assert completed | set(sources) == set(hashes)
+    assert len(hashes) == 20
+
+
+def test_close_without_a_store_cancels_running_jobs(crawl_stack, dump):
+    async def run():
+        async with crawl_stack(allowed=1) as manager:
+            job = manager.submit(ROOT_URL, limit=100, source_path=str(dump))
+            await wait_until(lambda: job.processed >= 1)
+            manager.firecrawl_service.ingestion_pipeline.gate.set()
+            await manager.close()
+            return job
+
+    job = asyncio.run(run())
+    assert job.status == CrawlStatus.CANCELLED
+    assert job.finished_at is not None
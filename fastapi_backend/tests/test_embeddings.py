@@ -0,0 +1,48 @@
+"""
+Tests of the embedder interface: subclasses must implement the model calls, and
+repeated passages are embedded once.
+"""
+
+import asyncio
+
+import pytest
+
+from fastapi_backend.src.db.embeddings import Embedder
+
+
+class CountingEmbedder(Embedder):
+    def __init__(self, **kwargs):
+        super().__init__("test/counting", workers=1, **kwargs)
+        self.embedded: list[str] = []
+
+    def _embed_batch(self, documents):
+        self.embedded.extend(documents)
+        return [[float(len(document)), 1.0] for document in documents]
+
+    def _embed_query(self, query):
+        return [float(len(query)), 0.0]
+
+
+def test_embedder_without_model_calls_cannot_be_created():
+    class Incomplete(Embedder):
+        def _embed_query(self, query):
+            return [0.0]
+
+    with pytest.raises(TypeError):
+        Incomplete("test/incomplete")
+
+
+def test_embeds_each_distinct_passage_once():
+    embedder = CountingEmbedder(batch_size=2)
+
+    async def run():
+        first = await embedder.embed_passages(["a", "bb", "a", "ccc"])
+        second = await embedder.embed_passages(["bb", "dddd"])
+        return first, second
+
+    first, second = asyncio.run(run())
+    embedder.close()
+    assert first == [[1.0, 1.0], [2.0, 1.0], [1.0, 1.0], [3.0, 1.0]]
+    assert second == [[2.0, 1.0], [4.0, 1.0]]
+    assert embedder.embedded == ["a", "bb", "ccc", "dddd"]
+    assert embedder.dimension == 2
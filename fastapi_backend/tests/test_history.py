@@ -0,0 +1,295 @@
+"""
+Tests of the history policy of the agent workflow, and of the trimming of long threads
+by the chat endpoint around the end of their summary.
+"""
+
+import asyncio
+import json
+from typing import Annotated, Sequence
+
+import pytest
+from langchain_core.messages import (
+    AIMessage,
+    BaseMessage,
+    HumanMessage,
+    SystemMessage,
+    ToolMessage,
+)
+from langchain_core.runnables import RunnableLambda
+from langgraph.graph import END, START, StateGraph
+from langgraph.graph.message import add_messages
+from typing_extensions import TypedDict
+
+from fastapi_backend.src.askthedocs_agent.utils.checkpointers import (
+    BoundedMemorySaver,
+)
+from fastapi_backend.src.askthedocs_agent.utils.history import HistoryPolicy
+from fastapi_backend.src.routers.agent.router import trim_thread
+
+SYSTEM = SystemMessage("You are an assistant helping with documentation.")
+
+
+class Summarizer:
+    """Stands in for the summary chain, recording the conversations it folds."""
+
+    def __init__(self, fail: bool = False):
+        self.fail = fail
+        self.conversations: list[str] = []
+        self.chain = RunnableLambda(self._summarize)
+
+    def _summarize(self, inputs: dict) -> AIMessage:
+        if self.fail:
+            raise ConnectionError("model unavailable")
+        self.conversations.append(inputs["conversation"])
+        previous = "" if inputs["summary"] == "(none)" else inputs["summary"] + " "
+        return AIMessage(previous + f"summary{len(self.conversations)}")
+
+
+def thread(turns: int, words: int = 5) -> list[BaseMessage]:
+    messages: list[BaseMessage] = []
+    for turn in range(turns):
+        filler = " ".join(["word"] * words)
+        messages += [
+            SYSTEM,
+            HumanMessage(f"question{turn} {filler}", id=f"q{turn}"),
+            AIMessage(f"answer{turn} {filler}", id=f"a{turn}"),
+        ]
+    return messages
+
+
+def contents(messages: Sequence[BaseMessage]) -> list[str]:
+    return [str(message.content).split()[0] for message in messages]
+
+
+def prepare(policy, messages, summarizer=None, **kwargs):
+    chain = summarizer.chain if summarizer is not None else None
+    return asyncio.run(policy.prepare(messages, summarizer=chain, **kwargs))
+
+
+@pytest.fixture
+def policy(word_tokens):
+    def create(**kwargs):
+        return HistoryPolicy(**{"max_tokens": 10_000, "window_turns": 2, **kwargs})
+
+    return create
+
+
+def test_short_thread_is_sent_whole_without_tool_outputs(policy):
+    messages = [
+        SYSTEM,
+        HumanMessage("question0"),
+        AIMessage("", tool_calls=[{"id": "1", "name": "search", "args": {}}]),
+        ToolMessage(
+            json.dumps([{"document": "long passage", "metadata": {"source": "x.md"}}]),
+            tool_call_id="1",
+        ),
+        AIMessage("answer0"),
+        SYSTEM,
+        HumanMessage("question1"),
+    ]
+
+    history = prepare(policy(), messages, Summarizer())
+
+    assert history.messages[0] is SYSTEM
+    assert [message.content for message in history.messages[1:]] == [
+        "question0",
+        "",
+        "[1 results elided, from x.md]",
+        "answer0",
+        "question1",
+    ]
+    assert history.summary == ""
+    assert history.summarized_messages == 0
+
+
+def test_folds_turns_that_left_the_window_in_batches(policy):
+    summarizer = Summarizer()
+    history_policy = policy(window_turns=2, summary_batch_turns=2)
+
+    # One turn out of the window is not enough for a batch
+    history = prepare(history_policy, thread(4), summarizer)
+    assert summarizer.conversations == []
+    assert history.summarized_messages == 0
+
+    history = prepare(history_policy, thread(5), summarizer)
+    assert summarizer.conversations == [
+        "User: question0 word word word word word\n"
+        "Assistant: answer0 word word word word word\n"
+        "User: question1 word word word word word\n"
+        "Assistant: answer1 word word word word word"
+    ]
+    assert history.summary == "summary1"
+    # The summary covers up to the system message before the first kept question
+    assert history.summarized_messages == 7
+    assert contents(history.messages) == [
+        "You",
+        "Summary",
+        "question2",
+        "answer2",
+        "question3",
+        "answer3",
+        "question4",
+        "answer4",
+    ]
+
+
+def test_folds_older_turns_until_the_history_fits(policy):
+    summarizer = Summarizer()
+    history_policy = policy(max_tokens=60, window_turns=10)
+
+    history = prepare(history_policy, thread(4), summarizer)
+
+    # The budget holds the kept turns, besides the summary written for the others
+    summary_tokens = history_policy.count_tokens(history.messages[1:2])
+    assert history.tokens - summary_tokens <= 60 < history.full_tokens
+    assert history.summarized_messages > 0
+    assert contents(history.messages)[-2:] == ["question3", "answer3"]
+
+
+def test_extends_the_summary_from_where_it_ends(policy):
+    summarizer = Summarizer()
+    messages = thread(6)
+
+    history = prepare(
+        policy(window_turns=1, summary_batch_turns=2),
+        messages,
+        summarizer,
+        summary="earlier",
+        summarized_messages=6,
+    )
+
+    assert summarizer.conversations[0].startswith("User: question2")
+    assert history.summary == "earlier summary1"
+    assert messages[history.summarized_messages - 1] is SYSTEM
+    assert messages[history.summarized_messages].content.startswith("question4")
+
+
+def test_keeps_the_turns_when_the_summarizer_fails(policy):
+    history = prepare(
+        policy(window_turns=1, summary_batch_turns=1),
+        thread(4),
+        Summarizer(fail=True),
+        summary="earlier",
+    )
+
+    assert history.summary == "earlier"
+    assert history.summarized_messages == 0
+    assert contents(history.messages)[2:4] == ["question0", "answer0"]
+
+
+def test_counts_each_message_once(policy, monkeypatch):
+    history_policy = policy()
+    calls = []
+    encode = history_policy.encoding.encode
+    monkeypatch.setattr(
+        history_policy.encoding,
+        "encode",
+        lambda text, **kwargs: calls.append(text) or encode(text, **kwargs),
+    )
+    messages = thread(3)
+
+    first = history_policy.count_tokens(messages)
+    second = history_policy.count_tokens(messages)
+
+    assert first == second
+    # The system message has no ID, so it is counted every time
+    assert len(calls) == 6 + 2 * 3
+
+
+class State(TypedDict):
+    messages: Annotated[Sequence[BaseMessage], add_messages]
+    summary: str
+    summarized_messages: int
+
+
+def make_graph(history_policy, summarizer, checkpointer, sent: list):
+    async def agent(state: State) -> dict:
+        history = await history_policy.prepare(
+            state["messages"],
+            summary=state.get("summary", ""),
+            summarized_messages=state.get("summarized_messages", 0),
+            summarizer=summarizer.chain,
+        )
+        sent.append(history)
+        question = state["messages"][-1].content
+        return {
+            "messages": [AIMessage(question.replace("question", "answer"))],
+            "summary": history.summary,
+            "summarized_messages": history.summarized_messages,
+        }
+
+    workflow = StateGraph(State)
+    workflow.add_node("agent", agent)
+    workflow.add_edge(START, "agent")
+    workflow.add_edge("agent", END)
+    return workflow.compile(checkpointer=checkpointer)
+
+
+def chat(graph, checkpointer, question: str) -> dict:
+    """Run a turn the way the chat endpoint does, trimming the thread first."""
+    config = {"configurable": {"thread_id": "t1"}}
+    values = graph.get_state(config).values
+    state = {"messages": [SYSTEM, HumanMessage(question)]}
+    trimmed = trim_thread(checkpointer, values)
+    if trimmed:
+        state["messages"] = [*trimmed["messages"], *state["messages"]]
+        state["summarized_messages"] = trimmed["summarized_messages"]
+    asyncio.run(graph.ainvoke(state, config))
+    return graph.get_state(config).values
+
+
+def test_trim_moves_the_summary_boundary_with_the_removals():
+    checkpointer = BoundedMemorySaver(max_messages_per_thread=12)
+    values = {"messages": thread(5), "summarized_messages": 9}
+
+    trimmed = trim_thread(checkpointer, values)
+
+    # The first of the last 12 messages is a system message, so one turn goes
+    assert len(trimmed["messages"]) == 3
+    assert trimmed["summarized_messages"] == 6
+    remaining = values["messages"][3:]
+    assert remaining[6] is values["messages"][9]
+
+
+def test_trim_past_the_summary_boundary_resets_it():
+    checkpointer = BoundedMemorySaver(max_messages_per_thread=6)
+
+    trimmed = trim_thread(
+        checkpointer, {"messages": thread(5), "summarized_messages": 3}
+    )
+
+    assert len(trimmed["messages"]) == 9
+    assert trimmed["summarized_messages"] == 0
+
+
+def test_trim_within_the_bound_changes_nothing():
+    checkpointer = BoundedMemorySaver(max_messages_per_thread=100)
+
+    assert trim_thread(checkpointer, {"messages": thread(5)}) == {}
+
+
+@pytest.mark.parametrize("max_messages", [6, 9, 14])
+def test_summary_never_points_past_the_trimmed_thread(word_tokens, max_messages):
+    checkpointer = BoundedMemorySaver(max_messages_per_thread=max_messages)
+    summarizer = Summarizer()
+    sent = []
+    graph = make_graph(
+        HistoryPolicy(window_turns=1, summary_batch_turns=1),
+        summarizer,
+        checkpointer,
+        sent,
+    )
+
+    for turn in range(12):
+        values = chat(graph, checkpointer, f"question{turn}")
+        messages = values["messages"]
+        assert 0 <= values["summarized_messages"] <= len(messages)
+        # The messages after the summary are the window and the current turn
+        assert contents(sent[-1].messages)[-1] == f"question{turn}"
+        assert contents(messages[values["summarized_messages"] :])[-2:] == [
+            f"question{turn}",
+            f"answer{turn}",
+        ]
+
+    assert summarizer.conversations
+    assert checkpointer.stats()["trimmed_messages"] > 0
@@ -0,0 +1,129 @@
+"""
+Tests of the reading of saved Firecrawl crawl dumps: JSON Lines, and JSON that is
+decoded one document at a time.
+"""
+
+import asyncio
+import io
+import json
+
+import pytest
+
+from fastapi_backend.src.firecrawler import importer
+from fastapi_backend.src.firecrawler.importer import (
+    LocalImporter,
+    _JSONReader,
+    read_dump,
+)
+
+DOCUMENTS = [
+    {
+        "markdown": f"# Page {index}\n\nSee [x](https://a.dev/{index}), {{braces}} ]",
+        "metadata": {"url": f"https://a.dev/{index}", "tags": ["a", "b"], "n": index},
+    }
+    for index in range(5)
+]
+
+
+def details(documents) -> list[dict]:
+    return [{"data": document} for document in documents]
+
+
+def test_reads_json_lines(tmp_path):
+    path = tmp_path / "crawl.jsonl"
+    lines = [
+        json.dumps(DOCUMENTS[0]),
+        "",
+        json.dumps({"type": "document", "data": DOCUMENTS[1]}),
+        json.dumps(DOCUMENTS[2]),
+    ]
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+    assert list(read_dump(path)) == details(DOCUMENTS[:3])
+
+
+def test_reads_json_list(tmp_path):
+    path = tmp_path / "crawl.json"
+    path.write_text(json.dumps(DOCUMENTS, indent=2), encoding="utf-8")
+
+    assert list(read_dump(path)) == details(DOCUMENTS)
+
+
+def test_reads_data_of_crawl_status_response(tmp_path):
+    path = tmp_path / "crawl.json"
+    response = {
+        "success": True,
+        "status": "completed",
+        "next": None,
+        "data": DOCUMENTS,
+        "completed": 5,
+        "total": 5.0,
+    }
+    path.write_text(json.dumps(response), encoding="utf-8")
+
+    assert list(read_dump(path)) == details(DOCUMENTS)
+
+
+@pytest.mark.parametrize("text", ["[]", " [ ] ", '{"status": "failed"}', "{}"])
+def test_reads_empty_json_dumps(tmp_path, text):
+    path = tmp_path / "crawl.json"
+    path.write_text(text, encoding="utf-8")
+
+    assert list(read_dump(path)) == []
+
+
+@pytest.mark.parametrize("read_size", [1, 3, 7, 64])
+def test_decodes_values_split_across_reads(read_size):
+    values = [12345, -0.5e3, "a, string ] with }", DOCUMENTS[0], [], True, None]
+    reader = _JSONReader(io.StringIO(json.dumps(values)), read_size=read_size)
+
+    assert list(reader.array()) == values
+    assert reader.peek() == ""
+
+
+def test_holds_only_the_current_document(tmp_path):
+    path = tmp_path / "crawl.json"
+    path.write_text(json.dumps(DOCUMENTS * 200), encoding="utf-8")
+
+    largest = 0
+    with path.open(encoding="utf-8") as file:
+        reader = _JSONReader(file, read_size=256)
+        for _ in reader.array():
+            largest = max(largest, len(reader._buffer))
+
+    assert largest < 2 * 256 + len(json.dumps(DOCUMENTS[0]))
+
+
+def test_rejects_truncated_json(tmp_path):
+    path = tmp_path / "crawl.json"
+    path.write_text(json.dumps({"data": DOCUMENTS})[:-20], encoding="utf-8")
+
+    with pytest.raises(ValueError):
+        list(read_dump(path))
+
+
+def test_stopping_an_import_closes_the_dump(tmp_path, monkeypatch):
+    path = tmp_path / "crawl.json"
+    path.write_text(json.dumps(DOCUMENTS), encoding="utf-8")
+    files = []
+
+    def recording_read_dump(path):
+        dump = read_dump(path)
+        yield next(dump)
+        files.append(dump.gi_frame.f_locals["file"])
+        try:
+            yield from dump
+        finally:
+            dump.close()
+
+    monkeypatch.setattr(importer, "read_dump", recording_read_dump)
+
+    async def run():
+        documents = LocalImporter(workers=1).documents(str(path), "https://a.dev")
+        first = await documents.__anext__()
+        second = await documents.__anext__()
+        await documents.aclose()
+        return [first, second]
+
+    assert asyncio.run(run()) == details(DOCUMENTS[:2])
+    assert files[0].closed
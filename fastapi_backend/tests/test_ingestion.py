@@ -0,0 +1,195 @@
+"""
+Tests of the ingestion pipeline: chunking, size- and time-based flushing, and the
+retries and drops of failed batches.
+"""
+
+import asyncio
+
+import pytest
+from qdrant_client.http.exceptions import UnexpectedResponse
+
+from fastapi_backend.src.db.ingestion import IngestionPipeline, chunk_id, is_transient
+
+
+class FakeStore:
+    """Records the written batches, failing the writes listed in errors."""
+
+    def __init__(self, errors=()):
+        self.errors = list(errors)
+        self.batches: list[tuple[str, list[str]]] = []
+        self.points: dict[str, str] = {}
+
+    async def add_documents(self, collection_name, documents, metadata, ids):
+        if self.errors:
+            raise self.errors.pop(0)
+        self.batches.append((collection_name, ids))
+        self.points.update(zip(ids, documents))
+
+    def write_stats(self, collection_name):
+        return {}
+
+
+def page(words: int, word: str = "word") -> str:
+    return " ".join(f"{word}{index}" for index in range(words))
+
+
+@pytest.fixture
+def pipeline(word_tokens):
+    def create(store, **kwargs):
+        kwargs = {"chunk_size": 10, "chunk_overlap": 0, **kwargs}
+        return IngestionPipeline(store, **kwargs)
+
+    return create
+
+
+def test_chunk_bounds_tokens_and_derives_ids(pipeline):
+    ingestion = pipeline(FakeStore())
+
+    chunks = ingestion.chunk(page(35), {"title": "T"}, source="https://a.dev/docs/x")
+
+    assert len(chunks) == 4
+    assert all(len(chunk.text.split()) <= 10 for chunk in chunks)
+    assert [chunk.id for chunk in chunks] == [
+        chunk_id("https://a.dev/docs/x", index) for index in range(4)
+    ]
+    metadata = chunks[0].metadata
+    assert metadata["title"] == "T"
+    assert metadata["chunk_count"] == 4
+    assert metadata["url_prefixes"] == [
+        "https://a.dev",
+        "https://a.dev/docs",
+        "https://a.dev/docs/x",
+    ]
+    assert "content_hash" in metadata
+
+
+def test_chunk_without_source_gets_random_ids(pipeline):
+    ingestion = pipeline(FakeStore())
+
+    first = ingestion.chunk(page(5), {})
+    second = ingestion.chunk(page(5), {})
+
+    assert first[0].id != second[0].id
+    assert "source" not in first[0].metadata
+
+
+def test_flushes_full_batches(pipeline):
+    store = FakeStore()
+    ingestion = pipeline(store, batch_size=3, flush_interval=60)
+
+    async def run():
+        await ingestion.add_document("docs", page(50), {}, source="https://a.dev/1")
+        assert [len(ids) for _, ids in store.batches] == [3]
+        assert ingestion.pending_chunks() == 2
+        await ingestion.flush()
+
+    asyncio.run(run())
+    assert [len(ids) for _, ids in store.batches] == [3, 2]
+    assert ingestion.pending_chunks() == 0
+
+
+def test_flushes_batches_that_waited_too_long(pipeline):
+    store = FakeStore()
+    ingestion = pipeline(store, batch_size=100, flush_interval=0.05)
+
+    async def run():
+        await ingestion.start()
+        await ingestion.add_document("docs", page(5), {}, source="https://a.dev/1")
+        assert store.batches == []
+        await asyncio.sleep(0.2)
+        await ingestion.stop()
+
+    asyncio.run(run())
+    assert store.batches == [("docs", [chunk_id("https://a.dev/1", 0)])]
+
+
+def test_retries_transient_failures(pipeline):
+    store = FakeStore(errors=[ConnectionError("down")])
+    ingestion = pipeline(store, batch_size=100, flush_interval=60)
+
+    async def run():
+        await ingestion.add_document("docs", page(5), {}, source="https://a.dev/1")
+        with pytest.raises(RuntimeError):
+            await ingestion.flush("docs")
+        assert ingestion.pending_chunks() == 1
+        await ingestion.flush("docs")
+
+    asyncio.run(run())
+    assert len(store.points) == 1
+    assert ingestion.stats()["failed_batches"] == 1
+    assert ingestion.stats()["dropped_chunks"] == 0
+
+
+def test_drops_chunks_after_max_attempts(pipeline):
+    store = FakeStore(errors=[ConnectionError("down")] * 2)
+    ingestion = pipeline(store, batch_size=100, flush_interval=60, max_attempts=2)
+
+    async def run():
+        await ingestion.add_document("docs", page(5), {}, source="https://a.dev/1")
+        for _ in range(2):
+            with pytest.raises(RuntimeError):
+                await ingestion.flush("docs")
+        await ingestion.flush("docs")
+
+    asyncio.run(run())
+    assert store.points == {}
+    assert ingestion.pending_chunks() == 0
+    assert ingestion.stats()["dropped_chunks"] == 1
+    assert ingestion.pop_dropped_sources("docs", ["https://a.dev/1", "x"]) == {
+        "https://a.dev/1"
+    }
+    assert ingestion.pop_dropped_sources("docs", ["https://a.dev/1"]) == set()
+
+
+def test_does_not_retry_errors_that_cannot_succeed(pipeline):
+    store = FakeStore(errors=[ValueError("wrong embedding model")])
+    ingestion = pipeline(store, batch_size=100, flush_interval=60)
+
+    async def run():
+        await ingestion.add_document("docs", page(5), {}, source="https://a.dev/1")
+        with pytest.raises(RuntimeError):
+            await ingestion.flush("docs")
+
+    asyncio.run(run())
+    assert ingestion.pending_chunks() == 0
+    assert ingestion.stats()["dropped_chunks"] == 1
+
+
+def test_drops_failed_batches_beyond_the_buffer_cap(pipeline):
+    store = FakeStore(errors=[ConnectionError("down")])
+    ingestion = pipeline(
+        store, batch_size=100, flush_interval=60, max_buffered_chunks=2
+    )
+
+    async def run():
+        await ingestion.add_document("docs", page(35), {}, source="https://a.dev/1")
+        with pytest.raises(RuntimeError):
+            await ingestion.flush("docs")
+
+    asyncio.run(run())
+    assert ingestion.pending_chunks() == 2
+    assert ingestion.stats()["dropped_chunks"] == 2
+
+
+def test_new_version_of_a_page_replaces_its_retried_chunks(pipeline):
+    store = FakeStore(errors=[ConnectionError("down")])
+    ingestion = pipeline(store, batch_size=100, flush_interval=60)
+
+    async def run():
+        await ingestion.add_document("docs", "old text", {}, source="https://a.dev/1")
+        with pytest.raises(RuntimeError):
+            await ingestion.flush("docs")
+        await ingestion.add_document("docs", "new text", {}, source="https://a.dev/1")
+        await ingestion.flush("docs")
+
+    asyncio.run(run())
+    assert store.points == {chunk_id("https://a.dev/1", 0): "new text"}
+    assert len(store.batches) == 1
+
+
+def test_is_transient():
+    assert is_transient(ConnectionError("down"))
+    assert is_transient(UnexpectedResponse(503, "Unavailable", b"", {}))
+    assert is_transient(UnexpectedResponse(429, "Too Many Requests", b"", {}))
+    assert not is_transient(UnexpectedResponse(400, "Bad Request", b"", {}))
+    assert not is_transient(ValueError("wrong embedding model"))
@@ -0,0 +1,164 @@
+"""
+Tests of the rerankers and of the relevance decision of the agent workflow: when the
+LLM grader is skipped, and how many times a question is rewritten.
+"""
+
+import asyncio
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+from fastapi_backend.src.askthedocs_agent.utils.edges import (
+    MAX_REWRITES,
+    count_rewrites,
+    grade_documents,
+    reranker_decision,
+    rewrite_or_generate,
+)
+from fastapi_backend.src.askthedocs_agent.utils.rerankers import (
+    CROSS_ENCODER_HIGH_CONFIDENCE,
+    NOT_RELEVANT,
+    RELEVANT,
+    LexicalReranker,
+    Reranker,
+    create_reranker,
+)
+
+
+def search(call_id: str) -> AIMessage:
+    return AIMessage(
+        "",
+        tool_calls=[{"id": call_id, "name": "search_vector_store", "args": {}}],
+    )
+
+
+def result(call_id: str, relevance) -> ToolMessage:
+    return ToolMessage(
+        "passages", tool_call_id=call_id, artifact={"relevance": relevance}
+    )
+
+
+class UnusedGrader:
+    async def ainvoke(self, inputs):
+        raise AssertionError("The LLM grader should have been skipped")
+
+
+class Models:
+    grade_chain = UnusedGrader()
+
+
+def grade(messages) -> str:
+    config = {"configurable": {"models": Models()}}
+    return asyncio.run(grade_documents({"messages": messages}, config))
+
+
+def test_reranker_needs_a_score():
+    with pytest.raises(TypeError):
+        Reranker()
+
+
+def test_decide():
+    reranker = LexicalReranker(high_confidence=0.8, low_confidence=0.1)
+
+    assert reranker.decide(None) == NOT_RELEVANT
+    assert reranker.decide(0.8) == RELEVANT
+    assert reranker.decide(0.1) == NOT_RELEVANT
+    assert reranker.decide(0.5) is None
+
+
+def test_decide_without_thresholds_leaves_scores_to_the_grader():
+    reranker = LexicalReranker()
+
+    assert reranker.decide(1.0) is None
+    assert reranker.decide(0.0) is None
+    assert reranker.decide(None) == NOT_RELEVANT
+
+
+def test_only_the_cross_encoder_skips_the_grader_by_default():
+    assert create_reranker("lexical", high_confidence=None).high_confidence is None
+    cross_encoder = create_reranker("cross-encoder", high_confidence=None)
+    assert cross_encoder.high_confidence == CROSS_ENCODER_HIGH_CONFIDENCE
+    assert create_reranker("lexical", high_confidence=0.9).high_confidence == 0.9
+    assert create_reranker("none") is None
+
+
+def test_lexical_rerank_orders_and_keeps_top_n():
+    reranker = LexicalReranker(top_n=2)
+    results = [
+        {"document": "install the client", "score": 0.9},
+        {"document": "configure the sparse model", "score": 0.1},
+        {"document": "sparse vectors", "score": 0.5},
+    ]
+
+    ranked, summary = asyncio.run(reranker.rerank("configure sparse model", results))
+
+    assert [item["document"] for item in ranked] == [
+        "configure the sparse model",
+        "sparse vectors",
+    ]
+    assert summary["top_score"] == pytest.approx(1.0)
+    # A full lexical match is not enough to skip the grader
+    assert summary["relevance"] is None
+
+
+def test_reranker_decision_of_a_single_search():
+    messages = [HumanMessage("q"), search("1"), result("1", RELEVANT)]
+
+    assert reranker_decision(messages) == RELEVANT
+
+
+@pytest.mark.parametrize(
+    "decisions, expected",
+    [
+        ((RELEVANT, RELEVANT), RELEVANT),
+        ((NOT_RELEVANT, NOT_RELEVANT), NOT_RELEVANT),
+        ((RELEVANT, NOT_RELEVANT), None),
+        ((RELEVANT, None), None),
+    ],
+)
+def test_reranker_decision_needs_every_tool_result_to_agree(decisions, expected):
+    messages = [HumanMessage("q"), search("1")]
+    messages += [result(str(index), d) for index, d in enumerate(decisions)]
+
+    assert reranker_decision(messages) == expected
+
+
+def test_reranker_decision_ignores_earlier_searches():
+    messages = [
+        HumanMessage("q"),
+        search("1"),
+        result("1", NOT_RELEVANT),
+        AIMessage("rewritten"),
+        search("2"),
+        ToolMessage("passages", tool_call_id="2"),
+    ]
+
+    assert reranker_decision(messages) is None
+
+
+def test_rewrites_are_bounded():
+    messages = [HumanMessage("q")]
+    decisions = []
+    for turn in range(MAX_REWRITES + 2):
+        messages += [search(str(turn)), result(str(turn), NOT_RELEVANT)]
+        decisions.append(grade(messages))
+
+    assert decisions == ["rewrite"] * MAX_REWRITES + ["generate"] * 2
+    assert count_rewrites(messages) == MAX_REWRITES + 1
+
+
+def test_rewrites_are_counted_per_turn():
+    earlier_turn = [HumanMessage("q1")]
+    for turn in range(MAX_REWRITES + 1):
+        earlier_turn.append(search(f"a{turn}"))
+
+    messages = [*earlier_turn, AIMessage("answer"), HumanMessage("q2"), search("b")]
+
+    assert count_rewrites(messages) == 0
+    assert rewrite_or_generate(messages) == "rewrite"
+
+
+def test_relevant_results_are_generated_from():
+    messages = [HumanMessage("q"), search("1"), result("1", RELEVANT)]
+
+    assert grade(messages) == "generate"
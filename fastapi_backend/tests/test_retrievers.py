@@ -0,0 +1,190 @@
+"""
+Tests of the fan-out retriever: collections and the web are searched concurrently,
+failing and slow sources are skipped, and the results are merged and deduped.
+"""
+
+import asyncio
+import time
+
+import pytest
+
+from fastapi_backend.src.askthedocs_agent.utils.retrievers import (
+    WEB_SOURCE,
+    FanOutRetriever,
+)
+
+
+def hit(source: str, index: int, score: float = 0.5) -> dict:
+    return {
+        "document": f"{source} chunk {index}",
+        "metadata": {"source": source, "chunk_index": index},
+        "score": score,
+    }
+
+
+class FakeRetriever:
+    """Returns fixed results per collection after a delay, or raises an error."""
+
+    def __init__(self, results: dict, delays=None, errors=None):
+        self.results = results
+        self.delays = delays or {}
+        self.errors = errors or {}
+        self.searches: list[tuple[str, str, int]] = []
+        self.in_flight = self.max_in_flight = 0
+        self.cancelled: list[str] = []
+
+    async def search(self, collection_name, query, limit=None):
+        self.searches.append((collection_name, query, limit))
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.delays.get(collection_name, 0.0))
+        except asyncio.CancelledError:
+            self.cancelled.append(collection_name)
+            raise
+        finally:
+            self.in_flight -= 1
+        if collection_name in self.errors:
+            raise self.errors[collection_name]
+        return self.results[collection_name]
+
+
+def search(fanout: FanOutRetriever, *args, **kwargs):
+    return asyncio.run(fanout.search(*args, **kwargs))
+
+
+def statuses(stats: dict) -> dict:
+    return {source: value["status"] for source, value in stats["sources"].items()}
+
+
+def test_searches_the_collections_concurrently():
+    names = ["a", "b", "c"]
+    retriever = FakeRetriever(
+        {name: [hit(name, 0)] for name in names},
+        delays={name: 0.2 for name in names},
+    )
+
+    started = time.perf_counter()
+    results, stats = search(FanOutRetriever(retriever), names, "query", limit=5)
+
+    assert time.perf_counter() - started < 0.4
+    assert retriever.max_in_flight == 3
+    assert sorted(retriever.searches) == [(name, "query", 5) for name in names]
+    assert [result["origin"] for result in results] == names
+    assert statuses(stats) == {name: "ok" for name in names}
+    assert not stats["early_return"]
+
+
+def test_searches_a_repeated_collection_once():
+    retriever = FakeRetriever({"a": [hit("a", 0)]})
+
+    results, _ = search(FanOutRetriever(retriever), ["a", "a"], "query")
+
+    assert len(retriever.searches) == 1
+    assert len(results) == 1
+
+
+def test_skips_failing_and_slow_collections():
+    retriever = FakeRetriever(
+        {"ok": [hit("ok", 0)], "broken": [], "slow": [hit("slow", 0)]},
+        delays={"slow": 5.0},
+        errors={"broken": ConnectionError("down")},
+    )
+
+    started = time.perf_counter()
+    results, stats = search(
+        FanOutRetriever(retriever, timeout=0.1), ["ok", "broken", "slow"], "query"
+    )
+
+    assert time.perf_counter() - started < 1.0
+    assert [result["origin"] for result in results] == ["ok"]
+    assert statuses(stats) == {"ok": "ok", "broken": "error", "slow": "timeout"}
+    assert stats["sources"]["slow"]["results"] == 0
+
+
+def test_merges_by_rank_and_drops_duplicates():
+    shared = hit("https://a.dev/x", 3)
+    retriever = FakeRetriever(
+        {
+            "a": [hit("a", 0), shared, hit("a", 1)],
+            # Web results without a chunk index are told apart by their text
+            "b": [{"document": "Same  TEXT"}, dict(shared)],
+            "c": [{"document": "same text"}],
+        }
+    )
+
+    results, stats = search(FanOutRetriever(retriever), ["a", "b", "c"], "query")
+
+    assert [(result["origin"], result["document"]) for result in results] == [
+        ("a", "a chunk 0"),
+        ("b", "Same  TEXT"),
+        ("a", "https://a.dev/x chunk 3"),
+        ("a", "a chunk 1"),
+    ]
+    assert stats["sources"]["b"]["results"] == 2
+
+
+def test_searches_the_web_when_asked():
+    async def web_search(query):
+        return [hit("https://web.dev", 0)]
+
+    retriever = FakeRetriever({"a": [hit("a", 0)]})
+    fanout = FanOutRetriever(retriever, web_search=web_search)
+
+    without_web, _ = search(fanout, ["a"], "query")
+    with_web, stats = search(fanout, ["a"], "query", include_web=True)
+
+    assert len(without_web) == 1
+    assert [result["origin"] for result in with_web] == ["a", WEB_SOURCE]
+    assert statuses(stats) == {"a": "ok", WEB_SOURCE: "ok"}
+
+
+def test_gives_up_on_a_slow_web_search():
+    async def web_search(query):
+        await asyncio.sleep(5.0)
+        return []
+
+    retriever = FakeRetriever({"a": [hit("a", 0)]})
+    fanout = FanOutRetriever(retriever, web_search=web_search, web_timeout=0.1)
+
+    results, stats = search(fanout, ["a"], "query", include_web=True)
+
+    assert [result["origin"] for result in results] == ["a"]
+    assert statuses(stats) == {"a": "ok", WEB_SOURCE: "timeout"}
+
+
+@pytest.mark.parametrize(
+    "min_score, early_return", [(None, True), (0.4, True), (0.9, False)]
+)
+def test_returns_once_enough_results_arrived(min_score, early_return):
+    retriever = FakeRetriever(
+        {"fast": [hit("fast", i, score=0.5) for i in range(3)], "slow": [hit("s", 0)]},
+        delays={"slow": 0.5},
+    )
+    fanout = FanOutRetriever(retriever, enough_results=3, min_score=min_score)
+
+    started = time.perf_counter()
+    results, stats = search(fanout, ["fast", "slow"], "query")
+
+    assert stats["early_return"] is early_return
+    if early_return:
+        assert time.perf_counter() - started < 0.4
+        assert statuses(stats) == {"fast": "ok", "slow": "cancelled"}
+        assert retriever.cancelled == ["slow"]
+        assert len(results) == 3
+    else:
+        assert statuses(stats) == {"fast": "ok", "slow": "ok"}
+        assert len(results) == 4
+
+
+def test_only_the_best_results_of_a_source_count():
+    retriever = FakeRetriever(
+        {"many": [hit("many", i) for i in range(10)], "other": [hit("other", 0)]},
+        delays={"other": 0.1},
+    )
+    fanout = FanOutRetriever(retriever, enough_results=4, source_top_k=3)
+
+    results, stats = search(fanout, ["many", "other"], "query")
+
+    assert not stats["early_return"]
+    assert len(results) == 11
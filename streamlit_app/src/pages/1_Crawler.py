@@ -1,10 +1,12 @@
 """
 Crawler page for Firecrawl Streamlit app.
 This page allows users to input a URL and start a crawl, displaying real-time stats and messages.
+Crawls run as background jobs on the backend, so closing the page does not stop them.
 """
 
 import streamlit as st
 import asyncio
+import requests
 import websockets
 import json
 from datetime import datetime
@@ -20,9 +22,10 @@ st.set_page_config(page_title="Firecrawl App", page_icon="🔥", layout="centere
 
 FASTAPI_BACKEND = os.getenv("FASTAPI_BACKEND")
 
+JOBS_URL = urljoin(FASTAPI_BACKEND, "firecrawl/jobs")
 # replace http or https with ws or wss
 WEBSOCKET_URL = urljoin(
-    FASTAPI_BACKEND.replace("http", "ws").replace("https", "wss"), "firecrawl/ws/crawl"
+    FASTAPI_BACKEND.replace("http", "ws").replace("https", "wss"), "firecrawl/ws/jobs/"
 )
 
 authenticate()
@@ -40,14 +43,56 @@ if st.session_state.authenticated:
         "Maximum pages to crawl", min_value=10, max_value=1000, value=500, step=10
     )
 
+    recrawl = st.checkbox(
+        "Only re-index changed pages",
+        help="Skip pages that have not changed since the last crawl and remove pages that no longer exist.",
+    )
+
+    profile = st.selectbox(
+        "Collection storage",
+        [None, "default", "scalar", "binary", "on_disk"],
+        format_func=lambda option: {
+            None: "Keep current (server default for new collections)",
+            "default": "In memory (fastest, most RAM)",
+            "scalar": "Scalar quantization (about 4x less RAM)",
+            "binary": "Binary quantization (about 32x less RAM)",
+            "on_disk": "On disk (least RAM, slowest)",
+        }[option],
+        help="How the vectors of the site's collection are stored. Quantized profiles rescore results with the original vectors.",
+    )
+
     # Button container that will be conditionally shown/hidden
     button_container = st.empty()
 
     # Only show the button if we're not currently crawling
     if not st.session_state["is_crawling"]:
         if button_container.button("Start Crawl", key="start_crawl_button") and url:
+            response = requests.post(
+                JOBS_URL,
+                json={
+                    "url": url,
+                    "limit": limit - 1,
+                    "recrawl": recrawl,
+                    "profile": profile,
+                },
+            )
+            if response.status_code != 202:
+                st.error(f"Error: {response.json().get('detail', response.text)}")
+                st.stop()
+            st.session_state["job_id"] = response.json()["id"]
             st.session_state["firecrawler_messages"] = []
-            st.session_state["stats"] = {"pages": 0, "errors": 0}
+            st.session_state["stats"] = {
+                "pages": 0,
+                "errors": 0,
+                "processed": 0,
+                "queue_depth": 0,
+                "latency": 0.0,
+                "pages_per_second": 0.0,
+                "chunks_per_second": 0.0,
+                "chunking_seconds": 0.0,
+                "embedding_seconds": 0.0,
+                "avg_upsert_seconds": 0.0,
+            }
             st.session_state["crawled_urls"] = []  # Add list to store crawled URLs
             st.session_state["is_crawling"] = True
             st.session_state["start_time"] = time.time()
@@ -55,6 +100,12 @@ if st.session_state.authenticated:
             # Clear the button once crawling starts
             button_container.empty()
 
+    elif button_container.button("Cancel Crawl", key="cancel_crawl_button"):
+        requests.delete(f"{JOBS_URL}/{st.session_state['job_id']}")
+        st.session_state["is_crawling"] = False
+        st.session_state["start_time"] = None
+        st.rerun()
+
     # Create spinner container outside the crawler logic
     spinner_container = st.empty()
 
@@ -67,12 +118,12 @@ if st.session_state.authenticated:
 
         async def crawl():
             """
-            Crawl the given URL using WebSocket connection.
+            Follow the progress of the crawl job using WebSocket connection.
             """
             try:
-                async with websockets.connect(WEBSOCKET_URL) as websocket:
-                    await websocket.send(json.dumps({"url": url, "limit": limit - 1}))
-
+                async with websockets.connect(
+                    WEBSOCKET_URL + st.session_state["job_id"]
+                ) as websocket:
                     try:
                         with st.spinner("Crawling in progress...", show_time=True):
                             while True:
@@ -86,7 +137,13 @@ if st.session_state.authenticated:
                                     data = json.loads(message)
                                     timestamp = datetime.now().strftime("%H:%M:%S")
 
-                                    if data["event"] == "document":
+                                    if data["event"] == "status":
+                                        # Resubscribed to a running job
+                                        st.session_state["stats"].update(
+                                            pages=data["documents"],
+                                            processed=data["processed"],
+                                        )
+                                    elif data["event"] == "document":
                                         st.session_state["stats"]["pages"] += 1
                                         st.session_state["firecrawler_messages"].append(
                                             {
@@ -98,6 +155,41 @@ if st.session_state.authenticated:
                                         st.session_state["crawled_urls"].append(
                                             {"url": data["url"], "time": timestamp}
                                         )
+                                    elif data["event"] == "progress":
+                                        st.session_state["stats"].update(
+                                            processed=data["processed"],
+                                            queue_depth=data["queue_depth"],
+                                            latency=data["avg_queue_wait_seconds"]
+                                            + data["avg_processing_seconds"],
+                                        )
+                                    elif data["event"] == "stats":
+                                        # Throughput and stage timings, sent
+                                        # periodically while the job runs
+                                        st.session_state["stats"].update(
+                                            pages=data["documents"],
+                                            processed=data["processed"],
+                                            queue_depth=data["queue_depth"],
+                                            errors=data["errors"]
+                                            + data["failed_documents"],
+                                            pages_per_second=data["pages_per_second"],
+                                            chunks_per_second=data["chunks_per_second"],
+                                            chunking_seconds=data["chunking_seconds"],
+                                            embedding_seconds=data["embedding_seconds"],
+                                            avg_upsert_seconds=data[
+                                                "avg_upsert_seconds"
+                                            ],
+                                        )
+                                    elif data["event"] == "backpressure":
+                                        st.session_state["stats"]["queue_depth"] = data[
+                                            "queue_depth"
+                                        ]
+                                        st.session_state["firecrawler_messages"].append(
+                                            {
+                                                "type": "backpressure",
+                                                "content": f"Ingestion queue full ({data['queue_depth']}/{data['queue_size']}), waiting",
+                                                "time": timestamp,
+                                            }
+                                        )
                                     elif data["event"] == "error":
                                         st.session_state["stats"]["errors"] += 1
                                         st.session_state["firecrawler_messages"].append(
@@ -123,16 +215,50 @@ if st.session_state.authenticated:
 
                                     # Update stats display
                                     with stats_placeholder.container():
-                                        col1, col2 = st.columns(2)
+                                        stats = st.session_state["stats"]
+                                        col1, col2, col3, col4, col5 = st.columns(5)
                                         with col1:
+                                            st.metric("Pages Crawled", stats["pages"])
+                                        with col2:
+                                            st.metric(
+                                                "Pages Ingested", stats["processed"]
+                                            )
+                                        with col3:
                                             st.metric(
-                                                "Pages Crawled",
-                                                st.session_state["stats"]["pages"],
+                                                "Queue Depth", stats["queue_depth"]
+                                            )
+                                        with col4:
+                                            st.metric(
+                                                "Avg Latency",
+                                                f"{stats['latency']:.2f}s",
+                                            )
+                                        with col5:
+                                            st.metric("Errors", stats["errors"])
+                                        col1, col2, col3, col4, col5 = st.columns(5)
+                                        with col1:
+                                            st.metric(
+                                                "Pages/s",
+                                                f"{stats['pages_per_second']:.1f}",
                                             )
                                         with col2:
                                             st.metric(
-                                                "Errors",
-                                                st.session_state["stats"]["errors"],
+                                                "Chunks/s",
+                                                f"{stats['chunks_per_second']:.1f}",
+                                            )
+                                        with col3:
+                                            st.metric(
+                                                "Chunking",
+                                                f"{stats['chunking_seconds']:.1f}s",
+                                            )
+                                        with col4:
+                                            st.metric(
+                                                "Embedding",
+                                                f"{stats['embedding_seconds']:.1f}s",
+                                            )
+                                        with col5:
+                                            st.metric(
+                                                "Upsert/batch",
+                                                f"{stats['avg_upsert_seconds']:.2f}s",
                                             )
 
                                     # Update URLs display
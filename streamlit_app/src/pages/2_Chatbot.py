@@ -9,7 +9,7 @@ import requests
 from urllib.parse import urljoin
 import os
 import uuid
-import re
+import json
 from streamlit_app.src.utils.login import authenticate
 
 load_dotenv()
@@ -76,33 +76,13 @@ if st.session_state.authenticated:
     if "thread_id" not in st.session_state:
         st.session_state.thread_id = str(uuid.uuid4())
 
-    def extract_content(chunk):
-        """
-        Extract the content from the chunk using regex.
-
-        Args:
-            chunk (str): The chunk of text to extract content from.
-
-        Returns:
-            str: The extracted content.
-        """
-        # Using regex to extract the content between content=" or content=' and the closing quote
-        pattern = r'content=(["\'])(.*?)\1 additional_kwargs='
-        match = re.search(pattern, chunk, re.DOTALL)
-
-        if match:
-            # Get the captured content (group 2 contains the content)
-            content = match.group(2)
-            # Process escape sequences to convert \n to actual newlines
-            content = content.encode().decode("unicode_escape")
-            return content
-        else:
-            # If pattern not found, return empty string or error message
-            return chunk
-
     def get_chat_response(prompt, message_placeholder):
         """Get chat response from FastAPI backend using streaming response
 
+        The backend streams typed JSON events: node_start and tool_call events
+        describe the step the agent is taking, token events carry the answer as
+        it is generated and the final event carries the complete answer.
+
         Args:
             prompt (str): The user input prompt.
             message_placeholder: Placeholder for the assistant response.
@@ -119,74 +99,65 @@ if st.session_state.authenticated:
                 "collection_name": st.session_state.selected_collection,
             }
 
-            # Initialize an empty response that we'll build up
-            full_response = ""
-            current_stage = None
+            # Initialize an empty response that we'll build up from the tokens
+            streamed_answer = ""
 
             # Display initial "thinking" message
             message_placeholder.markdown("Thinking...")
 
             # Use stream=True to get a streaming response
-            with requests.post(endpoint, json=payload, stream=True) as response:
+            with requests.post(
+                endpoint, params={"stream_mode": "events"}, json=payload, stream=True
+            ) as response:
                 response.raise_for_status()
 
                 # Process the streaming response
                 for line in response.iter_lines():
-                    if line:
-                        # Parse the SSE format "data: {value}"
-                        line_text = line.decode("utf-8")
-                        if line_text.startswith("data:"):
-                            # Extract the actual data content
-                            chunk = line_text[5:].strip()
-
-                            # Add the chunk to our full response
-                            full_response += chunk
-
-                            # Detect the current stage based on content
-                            if (
-                                "search_vector_store" in chunk
-                                and current_stage != "searching"
-                            ):
-                                current_stage = "searching"
-                                message_placeholder.markdown(
-                                    "🔍 Searching in "
-                                    + f"`{st.session_state.selected_collection}` "
-                                    + "for relevant information..."
-                                )
-                            elif (
-                                "tavily_search_results" in chunk
-                                and current_stage != "searching"
-                            ):
-                                current_stage = "searching"
-                                message_placeholder.markdown(
-                                    "🌐 Searching the web for relevant information..."
-                                )
-
-                            elif (
-                                "search_vector_store" in chunk
-                                and current_stage == "searching"
-                            ):
-                                current_stage = "processing"
-                                message_placeholder.markdown(
-                                    "📊 Processing search results..."
-                                )
-
-                            # Check if this is a final response (not a tool call or retrieved docs)
-                            elif not any(
-                                marker in chunk
-                                for marker in [
-                                    "search_vector_store",
-                                    "tavily_search_results",
-                                    "gpt-4-0125-preview",
-                                ]
-                            ):
-                                if current_stage != "answering":
-                                    current_stage = "answering"
-                                    answer = extract_content(chunk)
-                                    message_placeholder.markdown(
-                                        answer, unsafe_allow_html=True
-                                    )
-                                    return answer
+                    if not line:
+                        continue
+
+                    # Parse the SSE format "data: {json}"
+                    line_text = line.decode("utf-8")
+                    if not line_text.startswith("data:"):
+                        continue
+                    event = json.loads(line_text[5:].strip())
+
+                    if event["event"] == "node_start":
+                        # Tokens of an earlier node are not part of the answer
+                        streamed_answer = ""
+                        if event["node"] == "rewrite":
+                            message_placeholder.markdown("✏️ Refining the question...")
+                        elif event["node"] == "generate":
+                            message_placeholder.markdown(
+                                "📊 Processing search results..."
+                            )
+                    elif event["event"] == "tool_call":
+                        if event["name"] == "search_vector_store":
+                            message_placeholder.markdown(
+                                "🔍 Searching in "
+                                + f"`{st.session_state.selected_collection}` "
+                                + "for relevant information..."
+                            )
+                        else:
+                            message_placeholder.markdown(
+                                "🌐 Searching the web for relevant information..."
+                            )
+                    elif event["event"] == "token":
+                        streamed_answer += event["content"]
+                        message_placeholder.markdown(
+                            streamed_answer + "▌", unsafe_allow_html=True
+                        )
+                    elif event["event"] == "final":
+                        message_placeholder.markdown(
+                            event["content"], unsafe_allow_html=True
+                        )
+                        return event["content"]
+                    elif event["event"] == "error":
+                        error_message = f"Error from backend: {event['error']}"
+                        message_placeholder.markdown(error_message)
+                        return error_message
+
+            return streamed_answer
 
         except requests.RequestException as e:
             error_message = f"Error communicating with backend: {str(e)}"
@@ -221,10 +192,7 @@ if st.session_state.authenticated:
             message_placeholder.markdown("Thinking...")
 
             # Get response from FastAPI backend with streaming
-            response = get_chat_response(prompt, message_placeholder)
-
-            # Extract the final content from the full response
-            final_content = extract_content(response)
+            final_content = get_chat_response(prompt, message_placeholder)
 
             # Add assistant response to chat history
             st.session_state.messages.append(